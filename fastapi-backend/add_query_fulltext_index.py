@@ -0,0 +1,42 @@
+import asyncio
+
+from sqlalchemy import text
+
+from config.database import engine
+
+# Create the FULLTEXT index behind /api/queries/search on a database that
+# predates it (create_all only adds it to new tables):
+#   python add_query_fulltext_index.py
+# Does nothing when the index already exists. Restart the workers afterwards:
+# a worker that found the index missing keeps searching with LIKE.
+
+INDEX_NAME = "ftx_queries_text"
+
+
+async def add_index():
+    try:
+        async with engine.begin() as conn:
+            if conn.dialect.name != "mysql":
+                print("Not a MySQL database; search uses LIKE there")
+                return
+            result = await conn.execute(
+                text(
+                    "SELECT COUNT(*) FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE() AND table_name = 'queries' AND index_name = :name"
+                ),
+                {"name": INDEX_NAME},
+            )
+            if result.scalar():
+                print(f"{INDEX_NAME} already exists")
+                return
+            print(f"Creating {INDEX_NAME} (builds over the whole queries table)...")
+            await conn.execute(text(
+                f"ALTER TABLE queries ADD FULLTEXT {INDEX_NAME} (query, admin_remark, contact_number)"
+            ))
+            print(f"{INDEX_NAME} created")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(add_index())
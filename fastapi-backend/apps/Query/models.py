@@ -169,6 +169,10 @@ class Query(Base):
     __table_args__ = (
         Index("idx_queries_status", "status"),
         Index("idx_queries_spa_status", "spa_id", "status"),
+        # Keyset pagination: ORDER BY created_at DESC, id DESC
+        Index("idx_queries_deleted_created", "is_deleted", "created_at", "id"),
+        # Text search (MATCH ... AGAINST); a plain index on other backends
+        Index("ftx_queries_text", "query", "admin_remark", "contact_number", mysql_prefix="FULLTEXT"),
     )
 
     def __repr__(self):
@@ -4,6 +4,7 @@ API endpoints for query management
 """
 from fastapi import APIRouter, Depends, HTTPException, status, Query as FastAPIQuery
 from sqlalchemy.ext.asyncio import AsyncSession as Session
+from datetime import date
 from typing import Optional
 
 from config.database import get_db
@@ -21,6 +22,7 @@ from apps.Query.services.query_service import (
     create_query,
     get_query_by_id,
     get_queries,
+    search_queries,
     update_query,
     delete_query,
     get_query_types,
@@ -29,10 +31,13 @@ from apps.Query.services.query_service import (
     update_query_type,
     delete_query_type,
     enrich_query_with_relations,
+    query_export_query,
 )
 from core.dependencies import get_current_active_user, require_role
 from apps.users.models import User
 from core.exceptions import NotFoundError, ValidationError
+from core.export import EXPORT_FORMAT_PATTERN, export_response
+from core.response_cache import cached_response
 
 query_router = APIRouter()
 
@@ -48,6 +53,7 @@ query_router = APIRouter()
     summary="Get all query types",
     description="Get list of all active query types"
 )
+@cached_response(tags=("query_types",), ttl=600)
 async def get_query_types_endpoint(
     active_only: bool = FastAPIQuery(True, description="Return only active types"),
     db: Session = Depends(get_db),
@@ -202,6 +208,50 @@ async def  create_query_endpoint(
         )
 
 
+@query_router.get(
+    "/search",
+    response_model=QueryListResponse,
+    status_code=status.HTTP_200_OK,
+    summary="Search queries",
+    description="Full-text search over query text, admin remark and contact number. Users search only their own, Admin searches all."
+)
+async def search_queries_endpoint(
+    q: str = FastAPIQuery(..., min_length=2, max_length=200, description="Search terms (all must match)"),
+    status_filter: Optional[str] = FastAPIQuery(None, alias="status", description="Filter by status"),
+    spa_id: Optional[int] = FastAPIQuery(None, description="Filter by SPA ID"),
+    limit: int = FastAPIQuery(50, ge=1, le=100, description="Maximum results"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Search queries"""
+    try:
+        user_role = current_user.role.value if hasattr(current_user.role, 'value') else str(current_user.role)
+
+        queries = await search_queries(
+            db,
+            q,
+            user_id=current_user.id,
+            user_role=user_role,
+            status=status_filter,
+            spa_id=spa_id,
+            limit=limit,
+        )
+
+        return QueryListResponse(
+            queries=queries,
+            total=len(queries),
+            page=1,
+            page_size=limit,
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching queries: {str(e)}"
+        )
+
+
 @query_router.get(
     "/",
     response_model=QueryListResponse,
@@ -212,8 +262,10 @@ async def  create_query_endpoint(
 async def get_queries_endpoint(
     status_filter: Optional[str] = FastAPIQuery(None, alias="status", description="Filter by status"),
     spa_id: Optional[int] = FastAPIQuery(None, description="Filter by SPA ID"),
-    page: int = FastAPIQuery(1, ge=1, description="Page number"),
+    page: int = FastAPIQuery(1, ge=1, description="Page number (offset paging; prefer cursor)"),
     page_size: int = FastAPIQuery(10, ge=1, le=100, description="Items per page"),
+    cursor: Optional[str] = FastAPIQuery(None, description="next_cursor from the previous page"),
+    include_total: bool = FastAPIQuery(True, description="Count matching queries (first page only)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -222,22 +274,27 @@ async def get_queries_endpoint(
         skip = (page - 1) * page_size
         user_role = current_user.role.value if hasattr(current_user.role, 'value') else str(current_user.role)
         
-        queries, total = await get_queries(
+        queries, total, next_cursor = await get_queries(
             db,
             user_id=current_user.id,
             user_role=user_role,
             status=status_filter,
             spa_id=spa_id,
             skip=skip,
-            limit=page_size
+            limit=page_size,
+            cursor=cursor,
+            include_total=include_total,
         )
         
         return QueryListResponse(
             queries=queries,  # Already enriched list of dicts
             total=total,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            next_cursor=next_cursor,
         )
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -245,6 +302,28 @@ async def get_queries_endpoint(
         )
 
 
+@query_router.get(
+    "/export",
+    status_code=status.HTTP_200_OK,
+    summary="Export queries (Admin only)",
+    description="Stream matching queries as CSV or XLSX"
+)
+async def export_queries_endpoint(
+    file_format: str = FastAPIQuery("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    date_from: Optional[date] = FastAPIQuery(None, description="Raised on or after (UTC)"),
+    date_to: Optional[date] = FastAPIQuery(None, description="Raised on or before (UTC)"),
+    status_filter: Optional[str] = FastAPIQuery(None, alias="status", description="Filter by status"),
+    spa_id: Optional[int] = FastAPIQuery(None, description="Filter by SPA ID"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "super_admin"))
+):
+    """Export queries"""
+    # The export reads through its own cursor session; release this one now
+    await db.close()
+    stmt = query_export_query(date_from=date_from, date_to=date_to, spa_id=spa_id, status=status_filter)
+    return export_response(stmt, "queries", file_format)
+
+
 @query_router.get(
     "/{query_id}",
     response_model=QueryResponse,
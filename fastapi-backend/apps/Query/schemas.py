@@ -86,9 +86,10 @@ class QueryResponse(BaseModel):
 class QueryListResponse(BaseModel):
     """Response for list of queries"""
     queries: List[QueryResponse]
-    total: int
+    total: Optional[int] = None  # Only counted for the first page
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Pass as ?cursor= to fetch the next page
 
 
 # =====================================================
@@ -2,16 +2,27 @@
 Query Service
 Business logic for query/support ticket operations
 """
+import base64
+import json
+import logging
+import re
+from datetime import datetime
 from typing import Optional, List, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from sqlalchemy import select, and_, or_, func, desc, delete
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.dialects.mysql import match as mysql_match
 
 from apps.Query.models import Query, QueryType
 from apps.Query.schemas import QueryCreate, QueryUpdate, QueryTypeCreate, QueryTypeUpdate
 from apps.forms_app.models import SPA
 from apps.users.models import User
+from apps.analytics.services.counter_service import adjust_counters
 from core.exceptions import NotFoundError, ValidationError
+from core.response_cache import invalidate_tags
+
+logger = logging.getLogger(__name__)
 
 
 async def  create_query(
@@ -118,6 +129,31 @@ async def get_query_by_id(
     return query
 
 
+def encode_cursor(query: Query) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of ``query``."""
+    payload = json.dumps([query.created_at.isoformat(), query.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, query_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(query_id)
+    except Exception:
+        raise ValidationError("Invalid cursor")
+
+
+# Related rows for enrich_query_with_relations, loaded with one SELECT ... IN per
+# relationship and only the columns the response needs
+_RELATION_LOADERS = (
+    selectinload(Query.spa).load_only(SPA.id, SPA.name, SPA.address, SPA.city, SPA.area, SPA.state),
+    selectinload(Query.query_type).load_only(QueryType.id, QueryType.name),
+    selectinload(Query.creator).load_only(User.id, User.first_name, User.last_name),
+    selectinload(Query.editor).load_only(User.id, User.first_name, User.last_name),
+)
+
+
 async def get_queries(
     db: Session,
     user_id: Optional[int] = None,
@@ -125,9 +161,18 @@ async def get_queries(
     status: Optional[str] = None,
     spa_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
-) -> Tuple[List[Query], int]:
-    """Get list of queries with filters and pagination"""
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+) -> Tuple[List[dict], Optional[int], Optional[str]]:
+    """
+    Get list of queries with filters, newest first.
+
+    Pages by keyset on (created_at, id) when ``cursor`` is given (``skip`` is
+    then ignored). The total is only counted for the first page, and only if
+    ``include_total``; follow-up pages return ``None``. Returns
+    ``(queries, total, next_cursor)``.
+    """
     
     # Base query
     conditions = [Query.is_deleted == False]
@@ -144,33 +189,172 @@ async def get_queries(
     if spa_id:
         conditions.append(Query.spa_id == spa_id)
     
-    # Count total
-    count_stmt = select(func.count()).select_from(Query).where(and_(*conditions))
-    count_result = await db.execute(count_stmt)
-    total = count_result.scalar() or 0
-    
-    # Get queries
-    stmt = (
-        select(Query)
-        .options(
-            joinedload(Query.spa),
-            joinedload(Query.query_type),
-            joinedload(Query.creator),
-            joinedload(Query.editor)
+    total = None
+    if include_total and cursor is None:
+        count_stmt = select(func.count()).select_from(Query).where(and_(*conditions))
+        count_result = await db.execute(count_stmt)
+        total = count_result.scalar() or 0
+
+    stmt = select(Query).options(*_RELATION_LOADERS)
+    if cursor is not None:
+        created_at, last_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                Query.created_at < created_at,
+                and_(Query.created_at == created_at, Query.id < last_id),
+            )
         )
-        .where(and_(*conditions))
-        .order_by(desc(Query.created_at))
-        .offset(skip)
-        .limit(limit)
+    else:
+        stmt = stmt.offset(skip)
+
+    # Fetch one extra row to know whether another page exists
+    stmt = (
+        stmt.where(and_(*conditions))
+        .order_by(desc(Query.created_at), desc(Query.id))
+        .limit(limit + 1)
     )
     
     result = await db.execute(stmt)
-    queries = result.unique().scalars().all()
+    queries = list(result.scalars().all())
+    next_cursor = encode_cursor(queries[limit - 1]) if len(queries) > limit else None
     
     # Enrich queries with relations
-    enriched_queries = [enrich_query_with_relations(q) for q in queries]
+    enriched_queries = [enrich_query_with_relations(q) for q in queries[:limit]]
     
-    return enriched_queries, total
+    return enriched_queries, total, next_cursor
+
+
+def query_export_query(
+    date_from=None,
+    date_to=None,
+    spa_id: Optional[int] = None,
+    status: Optional[str] = None,
+):
+    """Column select of (non-deleted) queries for a streaming export, newest first"""
+    from core.export import date_range
+
+    conditions = [Query.is_deleted == False, *date_range(Query.created_at, date_from, date_to)]
+    if status:
+        conditions.append(Query.status == status)
+    if spa_id:
+        conditions.append(Query.spa_id == spa_id)
+    return (
+        select(
+            Query.id,
+            Query.spa_id,
+            SPA.name.label("spa_name"),
+            SPA.city.label("spa_city"),
+            QueryType.name.label("query_type"),
+            Query.query,
+            Query.contact_number,
+            Query.status,
+            Query.admin_remark,
+            User.username.label("created_by"),
+            Query.created_at,
+            Query.updated_at,
+        )
+        .outerjoin(SPA, SPA.id == Query.spa_id)
+        .outerjoin(QueryType, QueryType.id == Query.query_type_id)
+        .outerjoin(User, User.id == Query.created_by)
+        .where(and_(*conditions))
+        .order_by(desc(Query.created_at), desc(Query.id))
+    )
+
+
+_SEARCH_TOKEN = re.compile(r"[0-9A-Za-z]+")
+# InnoDB ignores shorter tokens (innodb_ft_min_token_size)
+_MIN_FULLTEXT_TOKEN = 3
+# "Can't find FULLTEXT index matching the column list"
+_ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+# Set once MySQL reports that ftx_queries_text is missing (databases created
+# before it; see add_query_fulltext_index.py). Reset by a restart.
+_fulltext_missing = False
+
+
+def _like_condition(token: str):
+    return or_(
+        Query.query.ilike(f"%{token}%"),
+        Query.admin_remark.ilike(f"%{token}%"),
+        Query.contact_number.ilike(f"%{token}%"),
+    )
+
+
+def _search_condition(search: str, fulltext: bool):
+    """
+    Every search term must match ``query``, ``admin_remark`` or
+    ``contact_number``. With ``fulltext`` the terms InnoDB indexes go into one
+    boolean-mode FULLTEXT match with prefix terms (``+term*``) and shorter ones
+    are LIKE conditions; otherwise a LIKE per term.
+    Returns ``(condition, relevance)``; relevance is None without FULLTEXT.
+    """
+    tokens = _SEARCH_TOKEN.findall(search)
+    if not tokens:
+        raise ValidationError("Search term must contain letters or digits")
+
+    fulltext_tokens = [token for token in tokens if len(token) >= _MIN_FULLTEXT_TOKEN]
+    if fulltext and fulltext_tokens:
+        expression = " ".join(f"+{token}*" for token in fulltext_tokens)
+        relevance = mysql_match(Query.query, Query.admin_remark, Query.contact_number, against=expression).in_boolean_mode()
+        short_tokens = [token for token in tokens if len(token) < _MIN_FULLTEXT_TOKEN]
+        return and_(relevance, *[_like_condition(token) for token in short_tokens]), relevance
+
+    return and_(*[_like_condition(token) for token in tokens]), None
+
+
+def _is_missing_fulltext(error: DBAPIError) -> bool:
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] == _ER_FT_MATCHING_KEY_NOT_FOUND
+
+
+async def search_queries(
+    db: Session,
+    search: str,
+    user_id: Optional[int] = None,
+    user_role: Optional[str] = None,
+    status: Optional[str] = None,
+    spa_id: Optional[int] = None,
+    limit: int = 50,
+) -> List[dict]:
+    """Text search over query text, admin remark and contact number, best matches first"""
+    global _fulltext_missing
+
+    conditions = [Query.is_deleted == False]
+
+    # Access control: Users can only see their own queries, Admin can see all
+    if user_role not in ['admin', 'super_admin']:
+        if user_id:
+            conditions.append(Query.created_by == user_id)
+
+    if status:
+        conditions.append(Query.status == status)
+
+    if spa_id:
+        conditions.append(Query.spa_id == spa_id)
+
+    def build(fulltext: bool):
+        condition, relevance = _search_condition(search, fulltext)
+        order_by = [desc(Query.created_at), desc(Query.id)]
+        if relevance is not None:
+            order_by.insert(0, desc(relevance))
+        return (
+            select(Query)
+            .options(*_RELATION_LOADERS)
+            .where(and_(*conditions, condition))
+            .order_by(*order_by)
+            .limit(limit)
+        )
+
+    fulltext = db.bind.dialect.name == "mysql" and not _fulltext_missing
+    try:
+        result = await db.execute(build(fulltext))
+    except DBAPIError as e:
+        if not (fulltext and _is_missing_fulltext(e)):
+            raise
+        _fulltext_missing = True
+        logger.warning("FULLTEXT index ftx_queries_text is missing; query search uses LIKE until it is created")
+        result = await db.execute(build(False))
+    return [enrich_query_with_relations(q) for q in result.scalars().all()]
 
 
 def enrich_query_with_relations(
@@ -180,7 +364,8 @@ def enrich_query_with_relations(
 
     Uses already loaded relationship objects to avoid N+1 queries. This
     function is synchronous because it operates on relationship attributes
-    that should be pre-loaded via `joinedload` in the query service.
+    that should be pre-loaded (`_RELATION_LOADERS` / `joinedload`) in the
+    query service.
     """
     return {
         'id': query.id,
@@ -280,6 +465,10 @@ async def delete_query(
         from sqlalchemy import delete
         stmt = delete(Query).where(Query.id == query_id)
         await db.execute(stmt)
+        await adjust_counters(db, {
+            "total_queries": -1,
+            "pending_queries": -1 if query.status == "pending" else 0,
+        })
     else:
         # Soft delete - mark as deleted
         query.is_deleted = True
@@ -337,6 +526,7 @@ async def  create_query_type(
     db.add(query_type)
     await db.commit()
     await db.refresh(query_type)
+    await invalidate_tags("query_types")
     
     return query_type
 
@@ -377,6 +567,7 @@ async def update_query_type(
     
     await db.commit()
     await db.refresh(query_type)
+    await invalidate_tags("query_types")
     
     return query_type
 
@@ -404,4 +595,5 @@ async def delete_query_type(
         await db.commit()
     
     await db.commit()
+    await invalidate_tags("query_types")
     return True
@@ -0,0 +1,54 @@
+"""
+Analytics Models
+Pre-aggregated counters backing the dashboards
+"""
+from sqlalchemy import Column, String, BigInteger, Integer, DateTime, Index
+from sqlalchemy.sql import func
+from config.database import Base
+
+
+class StatsCounter(Base):
+    """
+    One row per dashboard counter (``total_users``, ``certificates:id_card``, ...).
+    Maintained incrementally in the same transaction as the row changes and
+    periodically reconciled against the source tables.
+    """
+    __tablename__ = "stats_counters"
+
+    name = Column(String(150), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<StatsCounter(name='{self.name}', value={self.value})>"
+
+
+class AnalyticsRollup(Base):
+    """
+    Pre-aggregated event counts per time bucket.
+    ``granularity`` is ``hour`` or ``day``; ``bucket_start`` is the UTC start of
+    the bucket. Dimensions that do not apply to a metric are stored as NULL.
+    """
+    __tablename__ = "analytics_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    granularity = Column(String(10), nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    metric = Column(String(50), nullable=False)
+    spa_id = Column(Integer, nullable=True)
+    category = Column(String(100), nullable=True)
+    user_role = Column(String(50), nullable=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("idx_rollups_metric_bucket", "granularity", "metric", "bucket_start"),
+        Index("idx_rollups_spa_bucket", "granularity", "spa_id", "bucket_start"),
+    )
+
+
+class AnalyticsRollupState(Base):
+    """Watermarks for the incremental rollup job."""
+    __tablename__ = "analytics_rollup_state"
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
@@ -2,16 +2,29 @@
 Analytics Routers
 API endpoints for analytics and statistics
 """
-from fastapi import APIRouter, Depends, HTTPException
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from apps.users.models import User
 from core.dependencies import require_role
 from config.database import get_db
 from apps.analytics.services.analytics_service import AnalyticsService
+from apps.analytics.services.rollup_service import (
+    get_timeseries,
+    ROLLUP_METRICS,
+    GROUP_BY_DIMENSIONS,
+    GRANULARITY_HOUR,
+    _utc_naive,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on the number of buckets one timeseries request may span
+MAX_TIMESERIES_HOURS = 24 * 31
+MAX_TIMESERIES_DAYS = 366 * 2
+
 analytics_router = APIRouter()
 
 
@@ -88,3 +101,64 @@ async def get_dashboard_overview(
             detail=f"Error fetching dashboard overview: {str(e)}"
         )
 
+
+
+@analytics_router.get("/timeseries")
+async def get_analytics_timeseries(
+    metric: str = Query(..., description=f"One of: {', '.join(ROLLUP_METRICS)}"),
+    granularity: str = Query("day", pattern="^(hour|day|week)$"),
+    start: Optional[datetime] = Query(None, description="Inclusive start (UTC); defaults to 30 days before end"),
+    end: Optional[datetime] = Query(None, description="Exclusive end (UTC); defaults to now"),
+    spa_id: Optional[int] = Query(None),
+    category: Optional[str] = Query(None, description="Certificate category, login status, activity type or hiring role"),
+    user_role: Optional[str] = Query(None),
+    group_by: Optional[str] = Query(None, description=f"Split into one series per: {', '.join(GROUP_BY_DIMENSIONS)}"),
+    current_user: User = Depends(require_role("admin", "hr", "spa_manager", "super_admin")),
+    db: Session = Depends(get_db)
+):
+    """Get hourly/daily/weekly trend series from the analytics rollups"""
+    try:
+        if metric not in ROLLUP_METRICS:
+            raise HTTPException(status_code=400, detail=f"Unknown metric '{metric}'")
+        if group_by is not None and group_by not in GROUP_BY_DIMENSIONS:
+            raise HTTPException(status_code=400, detail=f"Cannot group by '{group_by}'")
+
+        # Rollups are bucketed in naive UTC; aware bounds are converted, naive ones taken as UTC
+        try:
+            end = _utc_naive(end) if end else datetime.utcnow()
+            start = _utc_naive(start) if start else end - timedelta(days=30)
+        except (OverflowError, ValueError):
+            raise HTTPException(status_code=400, detail="start/end out of range")
+        if start >= end:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if granularity == GRANULARITY_HOUR and end - start > timedelta(hours=MAX_TIMESERIES_HOURS):
+            raise HTTPException(status_code=400, detail=f"Hourly series are limited to {MAX_TIMESERIES_HOURS} hours")
+        if end - start > timedelta(days=MAX_TIMESERIES_DAYS):
+            raise HTTPException(status_code=400, detail=f"Series are limited to {MAX_TIMESERIES_DAYS} days")
+
+        # SPA managers only see their own SPA
+        role = current_user.role.value if hasattr(current_user.role, "value") else str(current_user.role)
+        if role == "spa_manager":
+            if not current_user.spa_id:
+                raise HTTPException(status_code=403, detail="No SPA is assigned to this account")
+            spa_id = current_user.spa_id
+
+        return await get_timeseries(
+            db,
+            metric=metric,
+            granularity=granularity,
+            start=start,
+            end=end,
+            spa_id=spa_id,
+            category=category,
+            user_role=user_role,
+            group_by=group_by,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in get_analytics_timeseries: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching analytics timeseries: {str(e)}"
+        )
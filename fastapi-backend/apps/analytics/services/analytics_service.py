@@ -1,126 +1,89 @@
 """
 Analytics Service
-Optimized business logic for analytics using parallel query execution.
+Optimized business logic for analytics.
+
+Dashboard numbers are served from the ``stats_counters`` table, which is kept
+up to date transactionally by ``counter_service`` and reconciled periodically,
+so every endpoint is a single small read regardless of table sizes.
 """
-import asyncio
 import logging
-from typing import Dict, Any, List
-from sqlalchemy.future import select
-from sqlalchemy import func
+from typing import Dict, Any
+
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 
-from apps.forms_app.models import Hiring_Form, SPA
-from apps.users.models import User
-from apps.Query.models import Query
-from apps.certificates.models import (
-    SpaTherapistCertificate, ManagerSalaryCertificate,
-    ExperienceLetterCertificate, AppointmentLetterCertificate,
-    InvoiceSpaBillCertificate, IDCardCertificate,
-    DailySheetCertificate, UndertakingSheet, JobformSheet,
-    GeneratedCertificate, CertificateCategory, CertificateTemplate
+from apps.analytics.services.counter_service import (
+    CERTIFICATE_COUNT_MAPPINGS,
+    GENERATED_CERTIFICATE_COUNTER,
+    certificate_counter,
+    read_counters,
+    role_breakdown,
 )
+from core.single_flight import single_flight
 
 logger = logging.getLogger(__name__)
 
+
+def _overall_from_counts(counts: Dict[str, int], total_certificates: int) -> Dict[str, Any]:
+    return {
+        "total_forms": counts["total_forms"],
+        "total_hiring_forms": counts["total_forms"], # Alias for frontend consistency
+        "total_users": counts["total_users"],
+        "active_users": counts["active_users"],
+        "total_queries": counts["total_queries"],
+        "pending_queries": counts["pending_queries"],
+        "total_spas": counts["active_spas"], # Using active spas count for "total spas" in dash if needed
+        "active_spas": counts["active_spas"],
+        "total_templates": counts["total_templates"],
+        "total_certificates": total_certificates
+    }
+
+
+def _certificate_breakdown(counts: Dict[str, int]) -> Dict[str, int]:
+    return {
+        category.value: counts[certificate_counter(category)]
+        for category, _ in CERTIFICATE_COUNT_MAPPINGS
+    }
+
+
+def _candidates_from_counts(counts: Dict[str, int]) -> Dict[str, Any]:
+    breakdown = role_breakdown(counts)
+    return {
+        "role_breakdown": breakdown,
+        "total_requirements": sum(breakdown.values())
+    }
+
+
 class AnalyticsService:
     @staticmethod
+    @single_flight("analytics.overall", distributed=True)
     async def get_overall_analytics(db: Session) -> Dict[str, Any]:
         """
         Get aggregated counts across the system.
-        Uses asyncio.gather for parallel database execution to minimize latency.
         """
         try:
-            # 1. Base statements
-            stmts = [
-                select(func.count(Hiring_Form.id)),         # 0
-                select(func.count(User.id)),                # 1
-                select(func.count(User.id)).where(User.is_active == True), # 2
-                select(func.count(Query.id)),               # 3
-                select(func.count(Query.id)).where(Query.status == "pending"), # 4
-                select(func.count(SPA.id)).where(SPA.is_active == True), # 5
-                select(func.count(CertificateTemplate.id)) # 6
-            ]
-            
-            # 2. Certificate models statements
-            cert_models = [
-                SpaTherapistCertificate, ManagerSalaryCertificate,
-                ExperienceLetterCertificate, AppointmentLetterCertificate,
-                InvoiceSpaBillCertificate, IDCardCertificate,
-                DailySheetCertificate, UndertakingSheet, JobformSheet,
-                GeneratedCertificate
-            ]
-            
-            for model in cert_models:
-                stmts.append(select(func.count(model.id)))
-            
-            # Execute all queries sequentially
-            results = []
-            for stmt in stmts:
-                results.append(await db.execute(stmt))
-            
-            # Extract results
-            counts = [r.scalar() for r in results]
-            
-            # Certificate counts start after the base statements.
-            total_certificates = sum(counts[7:])
-            
-            return {
-                "total_forms": counts[0],
-                "total_hiring_forms": counts[0], # Alias for frontend consistency
-                "total_users": counts[1],
-                "active_users": counts[2],
-                "total_queries": counts[3],
-                "pending_queries": counts[4],
-                "total_spas": counts[5], # Using active spas count for "total spas" in dash if needed
-                "active_spas": counts[5],
-                "total_templates": counts[6],
-                "total_certificates": total_certificates
-            }
+            counts = await read_counters(db)
+            total_certificates = sum(_certificate_breakdown(counts).values()) + counts[GENERATED_CERTIFICATE_COUNTER]
+            return _overall_from_counts(counts, total_certificates)
         except Exception as e:
             logger.error(f"Error in get_overall_analytics: {str(e)}", exc_info=True)
             raise
 
     @staticmethod
+    @single_flight("analytics.candidates", distributed=True)
     async def get_candidate_analytics(db: Session) -> Dict[str, Any]:
         """
         Analytics focused on hiring forms and candidate pipeline.
         """
         # For now, simple count by role
-        query = select(Hiring_Form.for_role, func.count(Hiring_Form.id)).group_by(Hiring_Form.for_role)
-        result = await db.execute(query)
-        role_breakdown = {row[0]: row[1] for row in result.all()}
-        
-        return {
-            "role_breakdown": role_breakdown,
-            "total_requirements": sum(role_breakdown.values())
-        }
+        return _candidates_from_counts(await read_counters(db))
 
     @staticmethod
+    @single_flight("analytics.certificates", distributed=True)
     async def get_certificate_analytics(db: Session) -> Dict[str, Any]:
         """
         Breakdown of generated certificates by type.
         """
-        # Since certificates are in separate tables, we use the same parallel counting approach
-        cert_mappings = [
-            (CertificateCategory.SPA_THERAPIST, SpaTherapistCertificate),
-            (CertificateCategory.MANAGER_SALARY, ManagerSalaryCertificate),
-            (CertificateCategory.EXPERIENCE_LETTER, ExperienceLetterCertificate),
-            (CertificateCategory.APPOINTMENT_LETTER, AppointmentLetterCertificate),
-            (CertificateCategory.INVOICE_SPA_BILL, InvoiceSpaBillCertificate),
-            (CertificateCategory.ID_CARD, IDCardCertificate),
-            (CertificateCategory.DAILY_SHEET, DailySheetCertificate),
-            (CertificateCategory.UNDER_TAKING_SHEET, UndertakingSheet),
-            (CertificateCategory.JOB_FORM_SHEET, JobformSheet)
-        ]
-        
-        stmts = [select(func.count(model.id)) for _, model in cert_mappings]
-        results = []
-        for stmt in stmts:
-            results.append(await db.execute(stmt))
-        
-        breakdown = {}
-        for i, (cat_label, _) in enumerate(cert_mappings):
-            breakdown[cat_label.value] = results[i].scalar()
+        breakdown = _certificate_breakdown(await read_counters(db))
             
         return {
             "breakdown": breakdown,
@@ -128,82 +91,19 @@ class AnalyticsService:
         }
 
     @staticmethod
+    @single_flight("analytics.overview", distributed=True)
     async def get_consolidated_overview(db: Session) -> Dict[str, Any]:
         """
         Get all analytics (overall, candidates, certificates) in a single response.
-        Optimized with comprehensive parallel execution.
         """
         try:
-            # 1. Base statements
-            base_stmts = [
-                select(func.count(Hiring_Form.id)),         # 0
-                select(func.count(User.id)),                # 1
-                select(func.count(User.id)).where(User.is_active == True), # 2
-                select(func.count(Query.id)),               # 3
-                select(func.count(Query.id)).where(Query.status == "pending"), # 4
-                select(func.count(SPA.id)).where(SPA.is_active == True), # 5
-                select(func.count(CertificateTemplate.id)), # 6
-                # Candidate breakdown
-                select(Hiring_Form.for_role, func.count(Hiring_Form.id)).group_by(Hiring_Form.for_role) # 7
-            ]
-            
-            # 2. Certificate mappings
-            cert_mappings = [
-                (CertificateCategory.SPA_THERAPIST, SpaTherapistCertificate),
-                (CertificateCategory.MANAGER_SALARY, ManagerSalaryCertificate),
-                (CertificateCategory.EXPERIENCE_LETTER, ExperienceLetterCertificate),
-                (CertificateCategory.APPOINTMENT_LETTER, AppointmentLetterCertificate),
-                (CertificateCategory.INVOICE_SPA_BILL, InvoiceSpaBillCertificate),
-                (CertificateCategory.ID_CARD, IDCardCertificate),
-                (CertificateCategory.DAILY_SHEET, DailySheetCertificate),
-                (CertificateCategory.UNDER_TAKING_SHEET, UndertakingSheet),
-                (CertificateCategory.JOB_FORM_SHEET, JobformSheet),
-                (None, GeneratedCertificate)
-            ]
-            
-            # Combine all statements
-            all_stmts = base_stmts + [select(func.count(model.id)) for _, model in cert_mappings]
-            
-            # Execute queries sequentially for session stability
-            results = []
-            for stmt in all_stmts:
-                results.append(await db.execute(stmt))
-            
-            # Extract data
-            candidate_idx = len(base_stmts) - 1
-            counts = [r.scalar() if i != candidate_idx else r.all() for i, r in enumerate(results)]
-            
-            # Candidate breakdown processing
-            candidate_results = counts[candidate_idx]
-            candidate_breakdown = {row[0]: row[1] for row in candidate_results}
-            
-            # Certificate breakdown processing
-            cert_start_idx = len(base_stmts)
-            cert_breakdown = {}
-            total_certificates = 0
-            for i, (cat_label, _) in enumerate(cert_mappings):
-                count = counts[cert_start_idx + i]  # Use pre-fetched count from 'counts' list
-                if cat_label:
-                    cert_breakdown[cat_label.value] = count
-                total_certificates += count
+            counts = await read_counters(db)
+            cert_breakdown = _certificate_breakdown(counts)
+            total_certificates = sum(cert_breakdown.values()) + counts[GENERATED_CERTIFICATE_COUNTER]
 
             return {
-                "overall": {
-                    "total_forms": counts[0],
-                    "total_hiring_forms": counts[0],
-                    "total_users": counts[1],
-                    "active_users": counts[2],
-                    "total_queries": counts[3],
-                    "pending_queries": counts[4],
-                    "total_spas": counts[5],
-                    "active_spas": counts[5],
-                    "total_templates": counts[6],
-                    "total_certificates": total_certificates
-                },
-                "candidates": {
-                    "role_breakdown": candidate_breakdown,
-                    "total_requirements": sum(candidate_breakdown.values())
-                },
+                "overall": _overall_from_counts(counts, total_certificates),
+                "candidates": _candidates_from_counts(counts),
                 "certificates": {
                     "breakdown": cert_breakdown,
                     "total": total_certificates
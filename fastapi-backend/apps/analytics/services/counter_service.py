@@ -0,0 +1,416 @@
+"""
+Stats Counter Service
+Incrementally maintained dashboard counters stored in ``stats_counters``.
+
+Every ORM flush that inserts, deletes or changes the status of a tracked row
+(users, SPAs, hiring forms, queries, templates, certificates) adds the matching
+``UPDATE stats_counters SET value = value + delta`` to the same transaction, so
+counters commit or roll back together with the data. Core ``DELETE`` statements
+call ``adjust_counters`` explicitly. A periodic reconciliation recomputes every
+counter with one ``UNION ALL`` of ``COUNT`` selects and corrects any drift.
+"""
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, func, insert, inspect, literal, null, select, String, text, union_all, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession as Session
+from sqlalchemy.orm import Session as SyncSession
+
+from apps.analytics.models import StatsCounter
+from apps.forms_app.models import Hiring_Form, SPA
+from apps.users.models import User
+from apps.Query.models import Query
+from apps.certificates.models import (
+    SpaTherapistCertificate, ManagerSalaryCertificate,
+    ExperienceLetterCertificate, AppointmentLetterCertificate,
+    InvoiceSpaBillCertificate, IDCardCertificate,
+    DailySheetCertificate, UndertakingSheet, JobformSheet,
+    GeneratedCertificate, CertificateCategory, CertificateTemplate
+)
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Category certificate tables shown in the breakdown. GeneratedCertificate has
+# no category of its own and only contributes to the overall total.
+CERTIFICATE_COUNT_MAPPINGS = [
+    (CertificateCategory.SPA_THERAPIST, SpaTherapistCertificate),
+    (CertificateCategory.MANAGER_SALARY, ManagerSalaryCertificate),
+    (CertificateCategory.EXPERIENCE_LETTER, ExperienceLetterCertificate),
+    (CertificateCategory.APPOINTMENT_LETTER, AppointmentLetterCertificate),
+    (CertificateCategory.INVOICE_SPA_BILL, InvoiceSpaBillCertificate),
+    (CertificateCategory.ID_CARD, IDCardCertificate),
+    (CertificateCategory.DAILY_SHEET, DailySheetCertificate),
+    (CertificateCategory.UNDER_TAKING_SHEET, UndertakingSheet),
+    (CertificateCategory.JOB_FORM_SHEET, JobformSheet),
+]
+
+GENERATED_CERTIFICATE_COUNTER = "certificates:generated"
+ROLE_COUNTER_PREFIX = "candidates:role:"
+
+_CERTIFICATE_COUNTERS = {
+    model: f"certificates:{category.value}" for category, model in CERTIFICATE_COUNT_MAPPINGS
+}
+_CERTIFICATE_COUNTERS[GeneratedCertificate] = GENERATED_CERTIFICATE_COUNTER
+
+OVERALL_COUNTERS = [
+    "total_forms",
+    "total_users",
+    "active_users",
+    "total_queries",
+    "pending_queries",
+    "active_spas",
+    "total_templates",
+]
+
+# Counters that must exist for a read to be served from the table
+REQUIRED_COUNTERS = OVERALL_COUNTERS + list(_CERTIFICATE_COUNTERS.values())
+
+_RECONCILE_LOCK_NAME = "stats_counters_reconcile"
+
+
+def certificate_counter(category: CertificateCategory) -> str:
+    return f"certificates:{category.value}"
+
+
+# =========================================================
+# SOURCE-OF-TRUTH COUNTS (reconciliation)
+# =========================================================
+
+def _labelled_count(label: str, column, *criteria):
+    """``SELECT 'label', NULL, COUNT(column) [WHERE ...]`` as one UNION ALL member."""
+    stmt = select(
+        literal(label, String).label("metric"),
+        null().cast(String).label("bucket"),
+        func.count(column).label("total"),
+    )
+    if criteria:
+        stmt = stmt.where(*criteria)
+    return stmt
+
+
+def _source_count_selects() -> List:
+    stmts = [
+        _labelled_count("total_forms", Hiring_Form.id),
+        _labelled_count("total_users", User.id),
+        _labelled_count("active_users", User.id, User.is_active == True),
+        _labelled_count("total_queries", Query.id),
+        _labelled_count("pending_queries", Query.id, Query.status == "pending"),
+        _labelled_count("active_spas", SPA.id, SPA.is_active == True),
+        _labelled_count("total_templates", CertificateTemplate.id),
+    ]
+    stmts.extend(_labelled_count(label, model.id) for model, label in _CERTIFICATE_COUNTERS.items())
+    stmts.append(
+        select(
+            literal(ROLE_COUNTER_PREFIX, String).label("metric"),
+            Hiring_Form.for_role.label("bucket"),
+            func.count(Hiring_Form.id).label("total"),
+        ).group_by(Hiring_Form.for_role)
+    )
+    return stmts
+
+
+async def compute_source_counts(db: Session) -> Dict[str, int]:
+    """Count every tracked counter from the source tables in one round-trip."""
+    result = await db.execute(union_all(*_source_count_selects()))
+    counts: Dict[str, int] = {}
+    for metric, bucket, total in result.all():
+        if metric == ROLE_COUNTER_PREFIX:
+            counts[f"{ROLE_COUNTER_PREFIX}{bucket}"] = total
+        else:
+            counts[metric] = total
+    return counts
+
+
+# =========================================================
+# INCREMENTAL MAINTENANCE
+# =========================================================
+
+_increment_stmt = (
+    update(StatsCounter)
+    .where(StatsCounter.name == bindparam("counter_name"))
+    .values(value=StatsCounter.value + bindparam("delta"))
+)
+
+
+def _changed(obj, attr: str) -> Optional[Tuple[object, object]]:
+    """Return (old, new) for an attribute changed in this flush, else None."""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _row_deltas(obj, sign: int, deltas: Counter):
+    """Counter contributions of one inserted (+1) or deleted (-1) row."""
+    model = type(obj)
+    if model is User:
+        deltas["total_users"] += sign
+        if obj.is_active:
+            deltas["active_users"] += sign
+    elif model is Hiring_Form:
+        deltas["total_forms"] += sign
+        deltas[f"{ROLE_COUNTER_PREFIX}{obj.for_role}"] += sign
+    elif model is Query:
+        deltas["total_queries"] += sign
+        if obj.status == "pending":
+            deltas["pending_queries"] += sign
+    elif model is SPA:
+        if obj.is_active:
+            deltas["active_spas"] += sign
+    elif model is CertificateTemplate:
+        deltas["total_templates"] += sign
+    elif model in _CERTIFICATE_COUNTERS:
+        deltas[_CERTIFICATE_COUNTERS[model]] += sign
+
+
+def _status_deltas(obj, deltas: Counter):
+    """Counter contributions of status changes on an updated row."""
+    model = type(obj)
+    if model is User:
+        change = _changed(obj, "is_active")
+        if change and bool(change[0]) != bool(change[1]):
+            deltas["active_users"] += 1 if change[1] else -1
+    elif model is SPA:
+        change = _changed(obj, "is_active")
+        if change and bool(change[0]) != bool(change[1]):
+            deltas["active_spas"] += 1 if change[1] else -1
+    elif model is Query:
+        change = _changed(obj, "status")
+        if change and (change[0] == "pending") != (change[1] == "pending"):
+            deltas["pending_queries"] += 1 if change[1] == "pending" else -1
+    elif model is Hiring_Form:
+        change = _changed(obj, "for_role")
+        if change and change[0] != change[1]:
+            deltas[f"{ROLE_COUNTER_PREFIX}{change[0]}"] -= 1
+            deltas[f"{ROLE_COUNTER_PREFIX}{change[1]}"] += 1
+
+
+def _counter_statements(deltas: Dict[str, int], dialect_name: str) -> List[Tuple[object, List[Dict[str, object]]]]:
+    """
+    Build (statement, params) pairs for a set of deltas. Fixed counters are
+    plain UPDATEs (their rows are seeded by reconciliation); per-role counters
+    are upserted on MySQL because a new role has no row yet.
+    """
+    fixed = [
+        {"counter_name": name, "delta": delta}
+        for name, delta in deltas.items()
+        if delta and not name.startswith(ROLE_COUNTER_PREFIX)
+    ]
+    roles = {
+        name: delta for name, delta in deltas.items()
+        if delta and name.startswith(ROLE_COUNTER_PREFIX)
+    }
+
+    statements = []
+    if fixed:
+        statements.append((_increment_stmt, fixed))
+    if roles:
+        if dialect_name == "mysql":
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+            upsert = mysql_insert(StatsCounter)
+            upsert = upsert.on_duplicate_key_update(value=StatsCounter.value + upsert.inserted.value)
+            statements.append((upsert, [{"name": name, "value": delta} for name, delta in roles.items()]))
+        else:
+            # New roles appear on the next reconciliation
+            statements.append((_increment_stmt, [{"counter_name": name, "delta": delta} for name, delta in roles.items()]))
+    return statements
+
+
+@event.listens_for(SyncSession, "after_flush")
+def _track_counter_changes(session, flush_context):
+    """Add counter updates for this flush to the session's current transaction."""
+    deltas: Counter = Counter()
+    for obj in session.new:
+        _row_deltas(obj, 1, deltas)
+    for obj in session.deleted:
+        _row_deltas(obj, -1, deltas)
+    for obj in session.dirty:
+        _status_deltas(obj, deltas)
+
+    if not any(deltas.values()):
+        return
+    connection = session.connection()
+    for stmt, params in _counter_statements(deltas, connection.dialect.name):
+        connection.execute(stmt, params)
+
+
+async def adjust_counters(db: Session, deltas: Dict[str, int]):
+    """
+    Apply counter deltas in the caller's transaction, for changes made with Core
+    ``DELETE``/``UPDATE`` statements that bypass the ORM flush hook.
+    """
+    if not any(deltas.values()):
+        return
+    # Core execution, like the flush hook: the ORM refuses executemany UPDATEs with WHERE criteria
+    connection = await db.connection()
+    for stmt, params in _counter_statements(deltas, db.bind.dialect.name):
+        await connection.execute(stmt, params)
+
+
+# =========================================================
+# READS
+# =========================================================
+
+async def read_counters(db: Session) -> Dict[str, int]:
+    """
+    Return all counters from ``stats_counters`` (a handful of rows).
+    Seeds missing counters from the source tables the first time it is read.
+    """
+    result = await db.execute(select(StatsCounter.name, StatsCounter.value))
+    counters = {name: value for name, value in result.all()}
+    if any(name not in counters for name in REQUIRED_COUNTERS):
+        logger.info("Stats counters missing; seeding from source tables")
+        counters = await seed_counters()
+    return counters
+
+
+def role_breakdown(counters: Dict[str, int]) -> Dict[str, int]:
+    """Hiring-form counts per role, omitting roles with no forms (like GROUP BY)."""
+    return {
+        name[len(ROLE_COUNTER_PREFIX):]: value
+        for name, value in counters.items()
+        if name.startswith(ROLE_COUNTER_PREFIX) and value > 0
+    }
+
+
+# =========================================================
+# RECONCILIATION
+# =========================================================
+
+def _insert_missing_stmt(dialect_name: str):
+    """INSERT of counter rows that leaves rows another worker already inserted alone."""
+    if dialect_name == "mysql":
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+        return mysql_insert(StatsCounter).on_duplicate_key_update(value=StatsCounter.value)
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+        return sqlite_insert(StatsCounter).on_conflict_do_nothing()
+    return insert(StatsCounter)
+
+
+async def _insert_missing(db: Session, counts: Dict[str, int]):
+    if counts:
+        connection = await db.connection()
+        await connection.execute(
+            _insert_missing_stmt(connection.dialect.name),
+            [{"name": name, "value": value} for name, value in counts.items()],
+        )
+
+
+async def seed_counters() -> Dict[str, int]:
+    """
+    Insert missing counters from the source tables in a session of their own.
+    Safe to run from several workers at once: the first row inserted wins.
+    """
+    from config.database import async_session_maker
+
+    async with async_session_maker() as db:
+        counts = await compute_source_counts(db)
+        result = await db.execute(select(StatsCounter.name))
+        stored = set(result.scalars().all())
+        await _insert_missing(db, {name: value for name, value in counts.items() if name not in stored})
+        await db.commit()
+        result = await db.execute(select(StatsCounter.name, StatsCounter.value))
+        return {name: value for name, value in result.all()}
+
+
+async def reconcile_counters(db: Session) -> Dict[str, int]:
+    """Recompute every counter from the source tables, fix drift and commit."""
+    counts = await compute_source_counts(db)
+
+    result = await db.execute(select(StatsCounter.name, StatsCounter.value))
+    stored = {name: value for name, value in result.all()}
+
+    # Roles that no longer have any form are reset to zero
+    for name in stored:
+        if name.startswith(ROLE_COUNTER_PREFIX) and name not in counts:
+            counts[name] = 0
+
+    drifted = {name: (stored[name], value) for name, value in counts.items() if name in stored and stored[name] != value}
+    if drifted:
+        logger.warning(f"Stats counter drift corrected: {drifted}")
+
+    if drifted:
+        # Apply the difference rather than the snapshot value, so increments
+        # committed since ``compute_source_counts`` are kept
+        connection = await db.connection()
+        await connection.execute(
+            update(StatsCounter)
+            .where(StatsCounter.name == bindparam("counter_name"))
+            .values(value=StatsCounter.value + bindparam("delta")),
+            [{"counter_name": name, "delta": counts[name] - stored[name]} for name in drifted],
+        )
+    await _insert_missing(db, {name: value for name, value in counts.items() if name not in stored})
+
+    await db.commit()
+    return counts
+
+
+async def _try_reconcile_lock(connection: AsyncConnection) -> bool:
+    """Let only one worker reconcile at a time (MySQL advisory lock)."""
+    if connection.dialect.name != "mysql":
+        return True
+    result = await connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": _RECONCILE_LOCK_NAME})
+    return result.scalar() == 1
+
+
+async def _release_reconcile_lock(connection: AsyncConnection):
+    if connection.dialect.name == "mysql":
+        await connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _RECONCILE_LOCK_NAME})
+
+
+async def run_reconciliation():
+    """One reconciliation pass in its own session."""
+    from config.database import async_session_maker, engine
+
+    # GET_LOCK belongs to a connection: hold it on one that no commit hands back to the pool
+    async with engine.connect() as lock_connection:
+        if not await _try_reconcile_lock(lock_connection):
+            logger.debug("Stats counter reconciliation running in another worker")
+            return
+        try:
+            async with async_session_maker() as db:
+                await reconcile_counters(db)
+        finally:
+            await _release_reconcile_lock(lock_connection)
+
+
+_reconcile_task: Optional[asyncio.Task] = None
+
+
+async def _reconciliation_loop():
+    while True:
+        try:
+            await run_reconciliation()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stats counter reconciliation failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.STATS_COUNTER_RECONCILE_SECONDS)
+
+
+def start_counter_reconciliation():
+    """Start the periodic reconciliation task (called from the app lifespan)."""
+    global _reconcile_task
+    if settings.STATS_COUNTER_RECONCILE_SECONDS <= 0 or _reconcile_task is not None:
+        return
+    _reconcile_task = asyncio.create_task(_reconciliation_loop(), name="stats-counter-reconcile")
+
+
+async def stop_counter_reconciliation():
+    global _reconcile_task
+    if _reconcile_task is not None:
+        _reconcile_task.cancel()
+        try:
+            await _reconcile_task
+        except asyncio.CancelledError:
+            pass
+        _reconcile_task = None
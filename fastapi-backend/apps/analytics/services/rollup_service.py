@@ -0,0 +1,456 @@
+"""
+Analytics Rollup Service
+Hourly and daily event counts per (SPA, category, user role) in ``analytics_rollups``.
+
+Rollups are recomputed per window rather than incremented: the hourly buckets
+in ``[start, end)`` are deleted and re-inserted from one ``UNION ALL`` of
+``GROUP BY`` selects over the source tables, then the daily buckets covering
+the window are re-derived from the hourly rows. Re-running a window is
+therefore idempotent, which makes backfills and the incremental scheduler the
+same operation. The scheduler re-scans ``ROLLUP_LATE_DATA_MINUTES`` before its
+watermark so late commits are picked up.
+
+Login history and user activities are read from the hot table ``UNION ALL``
+its archive, so re-running a window older than the retention cutoff rebuilds
+the same counts rather than zeros.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import String, and_, delete, func, insert, inspect, literal, null, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession as Session
+
+from apps.analytics.models import AnalyticsRollup, AnalyticsRollupState
+from apps.analytics.services.counter_service import CERTIFICATE_COUNT_MAPPINGS
+from apps.forms_app.models import Hiring_Form
+from apps.users.models import User, LoginHistory, UserActivity
+from apps.Query.models import Query
+from apps.certificates.models import GeneratedCertificate
+from apps.notifications.services.retention import select_retained
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+GRANULARITY_HOUR = "hour"
+GRANULARITY_DAY = "day"
+GRANULARITY_WEEK = "week"  # served from daily rows, not stored
+
+ROLLUP_METRICS = ("certificates", "logins", "queries", "hiring_forms", "activities")
+GROUP_BY_DIMENSIONS = ("spa_id", "category", "user_role")
+
+_STATE_NAME = "hourly"
+_ROLLUP_LOCK_NAME = "infodocs:analytics_rollups"
+_INSERT_CHUNK = 1000
+
+
+# =========================================================
+# Bucketing helpers
+# =========================================================
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def floor_week(value: datetime) -> datetime:
+    """Monday 00:00 of the ISO week containing ``value``."""
+    return floor_day(value) - timedelta(days=value.weekday())
+
+
+def _utc_naive(value: datetime) -> datetime:
+    """Rollup buckets are stored as naive UTC."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _bucket_expr(column, dialect_name: str, granularity: str):
+    """SQL expression truncating ``column`` to the start of its hour/day, as text."""
+    fmt = "%Y-%m-%d %H:00:00" if granularity == GRANULARITY_HOUR else "%Y-%m-%d 00:00:00"
+    if dialect_name == "mysql":
+        return func.date_format(column, fmt)
+    return func.strftime(fmt, column)
+
+
+def _parse_bucket(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(str(value)[:19], "%Y-%m-%d %H:%M:%S")
+
+
+# =========================================================
+# Source aggregation
+# =========================================================
+
+def _event_select(metric: str, created_col, dialect_name: str, user_col, category=None, spa_col=None, *criteria, source=None):
+    """
+    ``SELECT metric, hour, spa_id, category, role, COUNT(*)`` for one source table
+    (or ``source``, when the columns belong to a subquery).
+    The acting user supplies the role and, when the row has no SPA of its own,
+    the SPA.
+    """
+    bucket = _bucket_expr(created_col, dialect_name, GRANULARITY_HOUR)
+    spa = func.coalesce(spa_col, User.spa_id) if spa_col is not None else User.spa_id
+    category_col = category if category is not None else null().cast(String)
+    return (
+        select(
+            literal(metric, String).label("metric"),
+            bucket.label("bucket"),
+            spa.label("spa_id"),
+            category_col.label("category"),
+            User.role.label("user_role"),
+            func.count().label("total"),
+        )
+        .select_from(source if source is not None else created_col.table)
+        .outerjoin(User, User.id == user_col)
+        .where(*criteria)
+        .group_by(bucket, spa, category_col, User.role)
+    )
+
+
+def _retained(model, criteria, columns):
+    """``model`` rows matching ``criteria`` in the hot table and its archive, as an aliased entity."""
+    _, entity = select_retained(model, criteria, include_archived=True, columns=columns)
+    return entity
+
+
+def _source_selects(dialect_name: str, start: datetime, end: datetime) -> List:
+    def window(column):
+        return and_(column >= start, column < end)
+
+    stmts = []
+    for category, model in CERTIFICATE_COUNT_MAPPINGS:
+        stmts.append(_event_select(
+            "certificates", model.generated_at, dialect_name, model.created_by,
+            literal(category.value, String), getattr(model, "spa_id", None),
+            window(model.generated_at),
+        ))
+    stmts.append(_event_select(
+        "certificates", GeneratedCertificate.generated_at, dialect_name, GeneratedCertificate.created_by,
+        literal("generated", String), None,
+        window(GeneratedCertificate.generated_at),
+    ))
+    logins = _retained(
+        LoginHistory, lambda c: [c.created_at >= start, c.created_at < end],
+        ("user_id", "login_status", "created_at"),
+    )
+    stmts.append(_event_select(
+        "logins", logins.created_at, dialect_name, logins.user_id,
+        logins.login_status, None,
+        source=inspect(logins).selectable,
+    ))
+    stmts.append(_event_select(
+        "queries", Query.created_at, dialect_name, Query.created_by,
+        None, Query.spa_id,
+        window(Query.created_at),
+    ))
+    stmts.append(_event_select(
+        "hiring_forms", Hiring_Form.created_at, dialect_name, Hiring_Form.created_by,
+        Hiring_Form.for_role, Hiring_Form.spa_id,
+        window(Hiring_Form.created_at),
+    ))
+    activities = _retained(
+        UserActivity, lambda c: [c.created_at >= start, c.created_at < end, c.is_deleted == False],
+        ("user_id", "activity_type", "created_at"),
+    )
+    stmts.append(_event_select(
+        "activities", activities.created_at, dialect_name, activities.user_id,
+        activities.activity_type, None,
+        source=inspect(activities).selectable,
+    ))
+    return stmts
+
+
+def _role_value(role) -> Optional[str]:
+    return getattr(role, "value", role)
+
+
+# =========================================================
+# Recompute
+# =========================================================
+
+async def recompute_window(db: Session, start: datetime, end: datetime) -> int:
+    """
+    Rebuild hourly rollups for ``[start, end)`` and the daily rollups of every
+    day the window touches. Commits and returns the number of hourly rows written.
+    """
+    start = floor_hour(_utc_naive(start))
+    end = _utc_naive(end)
+    if end > floor_hour(end):
+        end = floor_hour(end) + timedelta(hours=1)
+    if end <= start:
+        return 0
+
+    dialect_name = db.bind.dialect.name
+    result = await db.execute(union_all(*_source_selects(dialect_name, start, end)))
+
+    hourly: Dict[Tuple, int] = defaultdict(int)
+    for metric, bucket, spa_id, category, role, total in result.all():
+        hourly[(metric, _parse_bucket(bucket), spa_id, category, _role_value(role))] += total
+
+    await db.execute(
+        delete(AnalyticsRollup).where(
+            AnalyticsRollup.granularity == GRANULARITY_HOUR,
+            AnalyticsRollup.bucket_start >= start,
+            AnalyticsRollup.bucket_start < end,
+        )
+    )
+    rows = [
+        {
+            "granularity": GRANULARITY_HOUR,
+            "bucket_start": bucket,
+            "metric": metric,
+            "spa_id": spa_id,
+            "category": category,
+            "user_role": role,
+            "value": total,
+        }
+        for (metric, bucket, spa_id, category, role), total in hourly.items()
+    ]
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await db.execute(insert(AnalyticsRollup), rows[i:i + _INSERT_CHUNK])
+
+    await _rebuild_daily(db, floor_day(start), floor_day(end - timedelta(microseconds=1)) + timedelta(days=1))
+    await db.commit()
+    return len(rows)
+
+
+async def _rebuild_daily(db: Session, day_start: datetime, day_end: datetime):
+    """Re-derive daily rows for ``[day_start, day_end)`` from the hourly rows."""
+    dialect_name = db.bind.dialect.name
+    day = _bucket_expr(AnalyticsRollup.bucket_start, dialect_name, GRANULARITY_DAY)
+    result = await db.execute(
+        select(
+            day.label("bucket"),
+            AnalyticsRollup.metric,
+            AnalyticsRollup.spa_id,
+            AnalyticsRollup.category,
+            AnalyticsRollup.user_role,
+            func.sum(AnalyticsRollup.value),
+        )
+        .where(
+            AnalyticsRollup.granularity == GRANULARITY_HOUR,
+            AnalyticsRollup.bucket_start >= day_start,
+            AnalyticsRollup.bucket_start < day_end,
+        )
+        .group_by(day, AnalyticsRollup.metric, AnalyticsRollup.spa_id,
+                  AnalyticsRollup.category, AnalyticsRollup.user_role)
+    )
+    rows = [
+        {
+            "granularity": GRANULARITY_DAY,
+            "bucket_start": _parse_bucket(bucket),
+            "metric": metric,
+            "spa_id": spa_id,
+            "category": category,
+            "user_role": role,
+            "value": int(total or 0),
+        }
+        for bucket, metric, spa_id, category, role, total in result.all()
+    ]
+
+    await db.execute(
+        delete(AnalyticsRollup).where(
+            AnalyticsRollup.granularity == GRANULARITY_DAY,
+            AnalyticsRollup.bucket_start >= day_start,
+            AnalyticsRollup.bucket_start < day_end,
+        )
+    )
+    for i in range(0, len(rows), _INSERT_CHUNK):
+        await db.execute(insert(AnalyticsRollup), rows[i:i + _INSERT_CHUNK])
+
+
+async def backfill_rollups(db: Session, start: datetime, end: datetime, step_days: int = 7) -> int:
+    """Recompute ``[start, end)`` in ``step_days`` windows (one transaction each)."""
+    start = floor_day(_utc_naive(start))
+    end = _utc_naive(end)
+    written = 0
+    cursor = start
+    while cursor < end:
+        window_end = min(cursor + timedelta(days=step_days), end)
+        written += await recompute_window(db, cursor, window_end)
+        logger.info(f"Analytics rollups backfilled {cursor:%Y-%m-%d} .. {window_end:%Y-%m-%d %H:%M}")
+        cursor = window_end
+    return written
+
+
+async def _get_watermark(db: Session) -> Optional[datetime]:
+    result = await db.execute(
+        select(AnalyticsRollupState.watermark).where(AnalyticsRollupState.name == _STATE_NAME)
+    )
+    return result.scalar_one_or_none()
+
+
+async def _set_watermark(db: Session, watermark: datetime):
+    state = await db.get(AnalyticsRollupState, _STATE_NAME)
+    if state is None:
+        db.add(AnalyticsRollupState(name=_STATE_NAME, watermark=watermark))
+    else:
+        state.watermark = watermark
+    await db.commit()
+
+
+async def update_rollups(db: Session) -> int:
+    """Incremental pass: recompute from the watermark (minus the late-data window) to now."""
+    now = datetime.utcnow()
+    watermark = await _get_watermark(db)
+    if watermark is None:
+        start = floor_day(now - timedelta(days=settings.ROLLUP_INITIAL_BACKFILL_DAYS))
+        written = await backfill_rollups(db, start, now)
+    else:
+        start = watermark - timedelta(minutes=settings.ROLLUP_LATE_DATA_MINUTES)
+        written = await recompute_window(db, start, now)
+    await _set_watermark(db, now)
+    return written
+
+
+# =========================================================
+# Scheduler
+# =========================================================
+
+async def _try_rollup_lock(connection: AsyncConnection) -> bool:
+    """Let only one worker roll up at a time (MySQL advisory lock)."""
+    if connection.dialect.name != "mysql":
+        return True
+    result = await connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": _ROLLUP_LOCK_NAME})
+    return result.scalar() == 1
+
+
+async def _release_rollup_lock(connection: AsyncConnection):
+    if connection.dialect.name == "mysql":
+        await connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _ROLLUP_LOCK_NAME})
+
+
+async def run_rollups():
+    """One incremental rollup pass in its own session."""
+    from config.database import async_session_maker, engine
+
+    # update_rollups commits as it goes; keep the lock on a connection those commits don't release
+    async with engine.connect() as lock_connection:
+        if not await _try_rollup_lock(lock_connection):
+            logger.debug("Analytics rollup running in another worker")
+            return
+        try:
+            async with async_session_maker() as db:
+                written = await update_rollups(db)
+            logger.debug(f"Analytics rollups updated ({written} hourly rows)")
+        finally:
+            await _release_rollup_lock(lock_connection)
+
+
+_rollup_task: Optional[asyncio.Task] = None
+
+
+async def _rollup_loop():
+    while True:
+        try:
+            await run_rollups()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Analytics rollup failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.ROLLUP_INTERVAL_SECONDS)
+
+
+def start_rollup_scheduler():
+    """Start the periodic rollup task (called from the app lifespan)."""
+    global _rollup_task
+    if settings.ROLLUP_INTERVAL_SECONDS <= 0 or _rollup_task is not None:
+        return
+    _rollup_task = asyncio.create_task(_rollup_loop(), name="analytics-rollups")
+
+
+async def stop_rollup_scheduler():
+    global _rollup_task
+    if _rollup_task is not None:
+        _rollup_task.cancel()
+        try:
+            await _rollup_task
+        except asyncio.CancelledError:
+            pass
+        _rollup_task = None
+
+
+# =========================================================
+# Read side
+# =========================================================
+
+async def get_timeseries(
+    db: Session,
+    metric: str,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    spa_id: Optional[int] = None,
+    category: Optional[str] = None,
+    user_role: Optional[str] = None,
+    group_by: Optional[str] = None,
+) -> Dict:
+    """
+    Return ``{"metric", "granularity", "start", "end", "group_by", "series"}``
+    where ``series`` is a list of ``{"key", "points": [{"bucket", "value"}]}``.
+    Weekly series are summed from the daily rows (ISO weeks, Monday start).
+    """
+    stored = GRANULARITY_HOUR if granularity == GRANULARITY_HOUR else GRANULARITY_DAY
+    floor = {GRANULARITY_HOUR: floor_hour, GRANULARITY_DAY: floor_day, GRANULARITY_WEEK: floor_week}[granularity]
+    start = floor(_utc_naive(start))
+    end = _utc_naive(end)
+
+    criteria = [
+        AnalyticsRollup.granularity == stored,
+        AnalyticsRollup.metric == metric,
+        AnalyticsRollup.bucket_start >= start,
+        AnalyticsRollup.bucket_start < end,
+    ]
+    if spa_id is not None:
+        criteria.append(AnalyticsRollup.spa_id == spa_id)
+    if category is not None:
+        criteria.append(AnalyticsRollup.category == category)
+    if user_role is not None:
+        criteria.append(AnalyticsRollup.user_role == user_role)
+
+    group_cols = [AnalyticsRollup.bucket_start]
+    if group_by:
+        group_cols.append(getattr(AnalyticsRollup, group_by))
+    series_key = group_cols[1] if group_by else null()
+    result = await db.execute(
+        select(
+            AnalyticsRollup.bucket_start,
+            series_key.label("series_key"),
+            func.sum(AnalyticsRollup.value),
+        )
+        .where(*criteria)
+        .group_by(*group_cols)
+        .order_by(AnalyticsRollup.bucket_start)
+    )
+
+    series: Dict[object, Dict[datetime, int]] = defaultdict(lambda: defaultdict(int))
+    for bucket, key, total in result.all():
+        bucket = _parse_bucket(bucket)
+        if granularity == GRANULARITY_WEEK:
+            bucket = floor_week(bucket)
+        series[key][bucket] += int(total or 0)
+
+    return {
+        "metric": metric,
+        "granularity": granularity,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "series": [
+            {
+                "key": key,
+                "points": [
+                    {"bucket": bucket.isoformat(), "value": value}
+                    for bucket, value in sorted(points.items())
+                ],
+            }
+            for key, points in series.items()
+        ],
+    }
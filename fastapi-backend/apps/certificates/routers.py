@@ -3,7 +3,7 @@ Certificate Routers
 API endpoints for certificate management
 """
 from typing import List, Optional, Dict
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query, UploadFile, File, Form
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession as Session
@@ -17,6 +17,11 @@ from config.database import get_db
 from config.settings import settings
 from apps.users.models import User
 from core.dependencies import require_role, get_current_active_user, get_optional_current_user
+from core.bulk import unique_ids
+from core.export import EXPORT_FORMAT_PATTERN, export_response
+from core.rate_limiter import rate_limit
+from core.response_cache import cached_response
+from apps.forms_app.services.spa_service import get_spa_by_id
 from apps.certificates.models import CertificateCategory, TemplateType
 from apps.certificates.schemas import (
     PublicCertificateCreate,
@@ -43,7 +48,9 @@ from apps.certificates.services.certificate_service import (
     get_certificate_statistics,
     prepare_certificate_data,
     delete_certificate,
+    delete_certificates,
     get_certificate_model,
+    certificate_export_query,
 )
 from apps.certificates.services.pdf_generator import (
     render_html_template, 
@@ -91,7 +98,7 @@ async def  background_removal_status():
     }
 
 
-@certificates_router.post("/remove-background")
+@certificates_router.post("/remove-background", dependencies=[Depends(rate_limit("background_removal"))])
 async def  remove_background_endpoint(
     file: UploadFile = File(..., description="Image file to remove background from"),
     output_format: str = Form("PNG", description="Output format: PNG, JPEG, etc.")
@@ -172,7 +179,7 @@ async def  remove_background_endpoint(
         )
 
 
-@certificates_router.post("/remove-background-base64")
+@certificates_router.post("/remove-background-base64", dependencies=[Depends(rate_limit("background_removal"))])
 async def  remove_background_base64_endpoint(
     image: str = Form(..., description="Base64-encoded image string (with or without data URL prefix)"),
     output_format: str = Form("PNG", description="Output format: PNG, JPEG, etc.")
@@ -225,6 +232,7 @@ async def  remove_background_base64_endpoint(
 
 
 @certificates_router.get("/templates", response_model=List[CertificateTemplateResponse])
+@cached_response(tags=("templates",), ttl=300)
 async def  list_public_templates(
     category: Optional[str] = Query(None, description="Filter by certificate category"),
     variant: Optional[str] = Query(None, description="Filter by template variant/UI type"),
@@ -263,6 +271,7 @@ async def  list_public_templates(
 
 
 @certificates_router.get("/templates/by-category/{category}", response_model=Dict[str, List[CertificateTemplateResponse]])
+@cached_response(tags=("templates",), ttl=300)
 async def  _templates_by_category_endpoint(
     category: str,
     db: Session = Depends(get_db)
@@ -310,7 +319,7 @@ async def  _public_template(template_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Failed to retrieve template: {str(e)}")
 
 
-@certificates_router.post("/preview")
+@certificates_router.post("/preview", dependencies=[Depends(rate_limit("pdf_render", cost=2))])
 async def  preview_certificate(
     certificate_data: PublicCertificateCreate,
     request: Request,
@@ -330,11 +339,7 @@ async def  preview_certificate(
     # Load SPA data from database if spa_id is provided
     # Always load from database to ensure logo is included, even if spa object is provided
     if certificate_data.spa_id:
-        from apps.forms_app.models import SPA
-        from sqlalchemy import select
-        spa_stmt = select(SPA).where(SPA.id == certificate_data.spa_id)
-        spa_result = await db.execute(spa_stmt)
-        spa_obj = spa_result.scalar_one_or_none()
+        spa_obj = await get_spa_by_id(db, certificate_data.spa_id)
         if spa_obj:
             # If spa object already exists, merge logo from database
             # Otherwise, create full spa object from database
@@ -485,7 +490,7 @@ async def generate_pdf_background_task(
                 exc_info=True
             )
 
-@certificates_router.post("/generate/async")
+@certificates_router.post("/generate/async", dependencies=[Depends(rate_limit("pdf_render"))])
 async def  generate_certificate_async(
     certificate_data: PublicCertificateCreate,
     background_tasks: BackgroundTasks,
@@ -550,7 +555,7 @@ async def  generate_certificate_async(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@certificates_router.post("/generate")
+@certificates_router.post("/generate", dependencies=[Depends(rate_limit("pdf_render"))])
 async def  generate_certificate(
     certificate_data: PublicCertificateCreate,
     background_tasks: BackgroundTasks,
@@ -843,7 +848,7 @@ async def  _certificate(
     return await convert_certificate_to_response(certificate)
 
 
-@certificates_router.get("/generated/{certificate_id}/download/pdf")
+@certificates_router.get("/generated/{certificate_id}/download/pdf", dependencies=[Depends(rate_limit("pdf_render", cost=2))])
 async def  download_certificate_pdf(
     certificate_id: int, 
     db: Session = Depends(get_db),
@@ -961,11 +966,7 @@ async def  download_certificate_pdf(
     
     # Always load SPA from database if spa_id exists to ensure logo is included
     if hasattr(certificate, 'spa_id') and certificate.spa_id:
-        from apps.forms_app.models import SPA
-        from sqlalchemy import select
-        spa_stmt = select(SPA).where(SPA.id == certificate.spa_id)
-        spa_result = await db.execute(spa_stmt)
-        spa_obj = spa_result.scalar_one_or_none()
+        spa_obj = await get_spa_by_id(db, certificate.spa_id)
         if spa_obj:
             # If spa object already exists, merge logo from database
             # Otherwise, create full spa object from database
@@ -1151,6 +1152,23 @@ async def  _certificate_statistics_endpoint(
         raise HTTPException(status_code=500, detail=f"Failed to retrieve statistics: {str(e)}")
 
 
+@certificates_router.get("/admin/export")
+async def  export_certificates_admin(
+    file_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    date_from: Optional[date] = Query(None, description="Generated on or after (UTC)"),
+    date_to: Optional[date] = Query(None, description="Generated on or before (UTC)"),
+    spa_id: Optional[int] = None,
+    category: Optional[CertificateCategory] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "super_admin"))
+):
+    """Stream every matching certificate as CSV or XLSX (admin only)"""
+    # The export reads through its own cursor session; release this one now
+    await db.close()
+    stmt = certificate_export_query(date_from=date_from, date_to=date_to, spa_id=spa_id, category=category)
+    return export_response(stmt, "certificates", file_format)
+
+
 @certificates_router.get("/admin/all", response_model=List[GeneratedCertificateResponse])
 async def  _all_certificates_admin(
     skip: int = 0,
@@ -1221,24 +1239,16 @@ async def  bulk_delete_certificates_admin(
 ):
     """Delete multiple certificates (admin only)"""
     try:
-        deleted_count = 0
-        failed_ids = []
-        
-        for cert_id in request.certificate_ids:
-            try:
-                deleted = await delete_certificate(db, cert_id, None)
-                if deleted:
-                    deleted_count += 1
-                else:
-                    failed_ids.append(cert_id)
-            except Exception as e:
-                logger.error(f"Error deleting certificate {cert_id}: {e}")
-                failed_ids.append(cert_id)
+        requested = unique_ids(request.certificate_ids)
+        deleted = await delete_certificates(db, requested)
+        failed_ids = [cert_id for cert_id in requested if cert_id not in deleted]
+        deleted_count = len(deleted)
         
         return {
             "deleted_count": deleted_count,
             "failed_count": len(failed_ids),
             "failed_ids": failed_ids,
+            "deleted": deleted,
             "message": f"Successfully deleted {deleted_count} certificate(s)"
         }
     except Exception as e:
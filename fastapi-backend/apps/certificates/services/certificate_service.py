@@ -11,7 +11,7 @@ import logging
 from pathlib import Path
 
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy import select, and_, delete, func
+from sqlalchemy import String, select, and_, case, delete, false, func, literal, null, type_coerce, union_all
 from sqlalchemy.orm import joinedload, selectinload, defer
 from sqlalchemy.orm.attributes import flag_modified
 
@@ -37,7 +37,12 @@ from apps.certificates.services.pdf_generator import (
     save_base64_image
 )
 from apps.forms_app.services.spa_service import get_spa_by_id
+from apps.analytics.services.counter_service import adjust_counters, read_counters, certificate_counter, GENERATED_CERTIFICATE_COUNTER
+from core.bulk import chunked, delete_by_ids, unique_ids
 from core.exceptions import NotFoundError, ValidationError
+from core.file_cleanup import queue_file_deletion
+from core.single_flight import single_flight
+from core.response_cache import invalidate_tags
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -127,6 +132,9 @@ async def _invalidate_template_cache(template_id: Optional[int] = None):
         _template_list_cache = None
         logger.debug("Invalidated all template caches")
 
+    # Cached template list responses embed every template
+    await invalidate_tags("templates")
+
 async def _get_static_path():
     """Get static file base path (cached)"""
     global _STATIC_PATH_CACHE
@@ -407,6 +415,7 @@ async def  delete_template(db: Session, template_id: int) -> bool:
 
     stmt = delete(CertificateTemplate).where(CertificateTemplate.id == template_id)
     await db.execute(stmt)
+    await adjust_counters(db, {"total_templates": -1})
     await db.commit()
     
     # Invalidate cache for deleted template and list cache
@@ -1466,102 +1475,204 @@ async def  _all_certificates_with_users(db: Session, skip: int = 0, limit: int =
 
 
 
-async def  delete_certificate(
+# Lookup order when deleting by id alone: an id present in several tables
+# resolves to the first of them
+_DELETE_ORDER = [
+    (SpaTherapistCertificate, CertificateCategory.SPA_THERAPIST),
+    (ManagerSalaryCertificate, CertificateCategory.MANAGER_SALARY),
+    (ExperienceLetterCertificate, CertificateCategory.EXPERIENCE_LETTER),
+    (AppointmentLetterCertificate, CertificateCategory.APPOINTMENT_LETTER),
+    (InvoiceSpaBillCertificate, CertificateCategory.INVOICE_SPA_BILL),
+    (IDCardCertificate, CertificateCategory.ID_CARD),
+    (DailySheetCertificate, CertificateCategory.DAILY_SHEET),
+    (UndertakingSheet, CertificateCategory.UNDER_TAKING_SHEET),
+    (JobformSheet, CertificateCategory.JOB_FORM_SHEET),
+    (GeneratedCertificate, None),
+]
+
+# Columns holding either inline data or a file under UPLOAD_DIR ("certificates/...")
+CERTIFICATE_FILE_COLUMNS = (
+    "certificate_pdf",
+    "passport_size_photo",
+    "candidate_signature",
+    "candidate_photo",
+    "employee_photo",
+    "employee_signature",
+    "manager_signature",
+)
+
+
+def _stored_file(model, name: str):
+    """The column's value if it is a stored file path, else NULL (never ships base64 blobs)."""
+    column = getattr(model, name, None)
+    if column is None:
+        return null().label(name)
+    return case((column.like("certificates/%"), column), else_=null()).label(name)
+
+
+async def _locate_certificates(db: Session, certificate_ids: List[int], models: List) -> Dict[int, tuple]:
+    """``id -> (model, file paths)`` for every id found, with one UNION ALL query per chunk."""
+    located: Dict[int, tuple] = {}
+    for chunk in chunked(certificate_ids):
+        stmt = union_all(*[
+            select(
+                literal(index).label("model_index"),
+                model.id.label("certificate_id"),
+                *[_stored_file(model, name) for name in CERTIFICATE_FILE_COLUMNS],
+            ).where(model.id.in_(chunk))
+            for index, model in enumerate(models)
+        ])
+        rows = sorted((await db.execute(stmt)).all(), key=lambda row: row.model_index, reverse=True)
+        for row in rows:
+            # Later rows win, so after the reverse sort the first model in order does
+            files = [row[2 + position] for position in range(len(CERTIFICATE_FILE_COLUMNS))]
+            located[row.certificate_id] = (models[row.model_index], [path for path in files if path])
+    return located
+
+
+async def  delete_certificates(
     db: Session,
-    certificate_id: int,
+    certificate_ids: List[int],
     category: Optional[CertificateCategory] = None
-) -> bool:
+) -> Dict[int, str]:
+    """
+    Delete certificates by id with one ``DELETE ... WHERE id IN (...)`` per
+    table (and chunk); returns ``id -> table`` for the ids actually deleted.
+    Their PDFs and images are queued for deletion once the rows are gone.
+    """
+    if category:
+        models = [model for model, model_category in _DELETE_ORDER if model_category == category]
+    else:
+        models = [model for model, _ in _DELETE_ORDER]
+    if not models:
+        return {}
 
-    models = [
-        (SpaTherapistCertificate, CertificateCategory.SPA_THERAPIST),
-        (ManagerSalaryCertificate, CertificateCategory.MANAGER_SALARY),
-        (ExperienceLetterCertificate, CertificateCategory.EXPERIENCE_LETTER),
-        (AppointmentLetterCertificate, CertificateCategory.APPOINTMENT_LETTER),
-        (InvoiceSpaBillCertificate, CertificateCategory.INVOICE_SPA_BILL),
-        (IDCardCertificate, CertificateCategory.ID_CARD),
-        (DailySheetCertificate, CertificateCategory.DAILY_SHEET),
-        (UndertakingSheet, CertificateCategory.UNDER_TAKING_SHEET),
-        (JobformSheet, CertificateCategory.JOB_FORM_SHEET),
-        (GeneratedCertificate, None),
-    ]
+    certificate_ids = unique_ids(certificate_ids)
+    located = await _locate_certificates(db, certificate_ids, models)
+
+    by_model: Dict[Any, List[int]] = {}
+    for certificate_id, (model, _) in located.items():
+        by_model.setdefault(model, []).append(certificate_id)
+
+    deleted: Dict[int, str] = {}
+    deltas: Dict[str, int] = {}
+    for model, ids in by_model.items():
+        removed = await delete_by_ids(db, model, ids)
+        deleted.update({certificate_id: model.__tablename__ for certificate_id in removed})
+        model_category = dict(_DELETE_ORDER)[model]
+        counter = GENERATED_CERTIFICATE_COUNTER if model_category is None else certificate_counter(model_category)
+        deltas[counter] = deltas.get(counter, 0) - len(removed)
+    await adjust_counters(db, deltas)
+    await db.commit()
 
-    async def  delete_record(model):
-        # 1. Fetch record
-        result = await db.execute(
-            select(model).where(model.id == certificate_id)
-        )
-        certificate = result.scalar_one_or_none()
+    await queue_file_deletion(
+        path for certificate_id in deleted for path in located[certificate_id][1]
+    )
+    return deleted
 
-        if not certificate:
-            return False
 
-        # 2. Delete file (VERY IMPORTANT)
-        file_path = getattr(certificate, "file_path", None)
+async def  delete_certificate(
+    db: Session,
+    certificate_id: int,
+    category: Optional[CertificateCategory] = None
+) -> bool:
+    return bool(await delete_certificates(db, [certificate_id], category))
 
-        if file_path:
-            path = Path(file_path)
 
-            if not path.is_absolute():
-                path = Path.cwd() / path
+_EXPORT_NAME_COLUMNS = ("candidate_name", "manager_name", "employee_name", "customer_name")
 
-            if path.exists():
-                path.unlink()
-                print(f"Deleted file: {path}")
-            else:
-                print(f"File not found: {path}")
 
-        # 3. Delete DB record
-        await db.delete(certificate)
-        await db.commit()
+def _export_name(model):
+    """The certificate holder's name, as ``get_certificate_name`` picks it."""
+    columns = [getattr(model, name) for name in _EXPORT_NAME_COLUMNS if hasattr(model, name)]
+    if hasattr(model, "first_name"):
+        columns.append(func.coalesce(model.first_name, "") + " " + func.coalesce(model.last_name, ""))
+    if not columns:
+        return null()
+    return columns[0] if len(columns) == 1 else func.coalesce(*columns)
 
-        return True
 
-    # 👉 If category provided
-    if category:
-        model_map = {
-            CertificateCategory.SPA_THERAPIST: SpaTherapistCertificate,
-            CertificateCategory.MANAGER_SALARY: ManagerSalaryCertificate,
-            CertificateCategory.EXPERIENCE_LETTER: ExperienceLetterCertificate,
-            CertificateCategory.APPOINTMENT_LETTER: AppointmentLetterCertificate,
-            CertificateCategory.INVOICE_SPA_BILL: InvoiceSpaBillCertificate,
-            CertificateCategory.ID_CARD: IDCardCertificate,
-            CertificateCategory.DAILY_SHEET: DailySheetCertificate,
-            CertificateCategory.UNDER_TAKING_SHEET: UndertakingSheet,
-            CertificateCategory.JOB_FORM_SHEET: JobformSheet
-        }
+def _export_part(model, model_category: Optional[CertificateCategory], conditions: List):
+    if model_category is None:
+        # Legacy rows store the enum name; report the same value as the typed tables
+        category = case(
+            {member.name: member.value for member in CertificateCategory},
+            value=type_coerce(model.category, String),
+        )
+    else:
+        category = literal(model_category.value)
+    return select(
+        category.label("category"),
+        model.id.label("id"),
+        _export_name(model).label("name"),
+        (model.spa_id if hasattr(model, "spa_id") else null()).label("spa_id"),
+        model.created_by.label("created_by"),
+        model.is_public.label("is_public"),
+        model.generated_at.label("generated_at"),
+    ).where(*conditions)
+
+
+def certificate_export_query(
+    date_from=None,
+    date_to=None,
+    spa_id: Optional[int] = None,
+    category: Optional[CertificateCategory] = None,
+):
+    """Column select over every certificate table for a streaming export, newest first."""
+    from apps.forms_app.models import SPA
+    from apps.users.models import User
+    from core.export import date_range
 
-        model = model_map.get(category)
-        if model:
-            return await delete_record(model)
+    parts = []
+    for model, model_category in _DELETE_ORDER:
+        if spa_id is not None and not hasattr(model, "spa_id"):
+            continue
+        if category is not None and model_category not in (None, category):
+            continue
+        conditions = date_range(model.generated_at, date_from, date_to)
+        if spa_id is not None:
+            conditions.append(model.spa_id == spa_id)
+        if model_category is None and category is not None:
+            conditions.append(model.category == category)
+        parts.append(_export_part(model, model_category, conditions))
+    if not parts:
+        parts.append(_export_part(GeneratedCertificate, None, [false()]))
+
+    rows = (union_all(*parts) if len(parts) > 1 else parts[0]).subquery()
+    return (
+        select(
+            rows.c.category,
+            rows.c.id,
+            rows.c.name,
+            rows.c.spa_id,
+            SPA.name.label("spa_name"),
+            User.username.label("created_by"),
+            User.email.label("created_by_email"),
+            rows.c.is_public,
+            rows.c.generated_at,
+        )
+        .outerjoin(SPA, SPA.id == rows.c.spa_id)
+        .outerjoin(User, User.id == rows.c.created_by)
+        .order_by(rows.c.generated_at.desc())
+    )
 
-        return False
+# Certificate statistics are served stale-while-revalidate: a snapshot older
+# than the freshness window is still returned immediately while one background
+# task recomputes it. Only the very first request (no snapshot anywhere) waits.
+_STATISTICS_CACHE_KEY = "certificate_statistics:v2"  # {computed_at, stats}; v1 held bare stats
+_STATISTICS_FRESH_SECONDS = 600
+_STATISTICS_MAX_AGE_SECONDS = 86400
+_TOP_CONTRIBUTORS = 50
 
-    # 👉 If no category → search all models
-    for model, _ in models:
-        deleted = await delete_record(model)
-        if deleted:
-            return True
+_statistics_snapshot: Optional[Dict[str, Any]] = None
+_statistics_refresh_task = None
 
-    return False
 
-async def  _certificate_statistics(db: Session):
-    """Get certificate statistics: total, by user, by category (Optimized with parallel queries & Redis caching)"""
-    import asyncio
-    import json
-    from sqlalchemy import func, select
+@single_flight("certificates.statistics", distributed=True)
+async def _compute_certificate_statistics(db: Session) -> Dict[str, Any]:
+    """Totals from stats_counters plus the top contributors in one UNION ALL query."""
+    from sqlalchemy import union_all
     from apps.users.models import User
-    from config.redis import get_redis
-
-    # Try to get from cache first
-    try:
-        redis = await get_redis()
-        if redis:
-            cached_stats = await redis.get("certificate_statistics")
-            if cached_stats:
-                logger.info("Returning cached certificate statistics")
-                return json.loads(cached_stats)
-    except Exception as e:
-        logger.warning(f"Redis cache error: {e}")
 
     models = [
         (SpaTherapistCertificate, CertificateCategory.SPA_THERAPIST),
@@ -1575,96 +1686,120 @@ async def  _certificate_statistics(db: Session):
         (JobformSheet, CertificateCategory.JOB_FORM_SHEET),
         (GeneratedCertificate, None),
     ]
-    
-    # Helper to fetch stats for a single model
-    async def  fetch_model_stats(model, category):
-        try:
-            count_stmt = select(func.count(model.id))
-            user_stmt = select(model.created_by, func.count(model.id)).group_by(model.created_by)
-            
-            count_res = await db.execute(count_stmt)
-            user_res = await db.execute(user_stmt)
-            
-            # Handle potential errors in parallel execution
-            count = 0
-            if not isinstance(count_res, Exception):
-                count = count_res.scalar() or 0
-                
-            user_counts = {}
-            if not isinstance(user_res, Exception):
-                user_counts = {str(uid): c for uid, c in user_res.all() if uid}
-            
-            return {
-                "count": count,
-                "category": category.value if category else None,
-                "user_counts": user_counts
-            }
-        except Exception as e:
-            logger.warning(f"Error fetching stats for {model.__tablename__}: {e}")
-            return {"count": 0, "category": category.value if category else None, "user_counts": {}}
 
-    # Execute all model queries concurrently
-    results = await asyncio.gather(*[fetch_model_stats(m, c) for m, c in models])
-    
-    # Aggregate results
-    total_count = 0
-    category_counts = {}
-    aggregated_user_counts = {}
-    
-    for res in results:
-        count = res["count"]
-        cat = res["category"]
-        u_counts = res["user_counts"]
-        
-        total_count += count
-        if cat:
-            category_counts[cat] = count
-            
-        for uid, c in u_counts.items():
-            try:
-                uid_int = int(uid)
-                aggregated_user_counts[uid_int] = aggregated_user_counts.get(uid_int, 0) + c
-            except ValueError:
-                pass
-
-    # Optimized: Get user details for TOP 50 contributors only
-    user_ids = sorted(aggregated_user_counts.keys(), key=lambda x: aggregated_user_counts[x], reverse=True)[:50]
-    user_details = []
-    
-    if user_ids:
-        from sqlalchemy.orm import load_only
-        # Optimized: Load only required columns
-        user_stmt = select(User).options(
-            load_only(User.id, User.first_name, User.last_name, User.email)
-        ).where(User.id.in_(user_ids))
-        
-        user_result = await db.execute(user_stmt)
-        for user in user_result.scalars().all():
-            user_details.append({
-                "id": user.id,
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "email": user.email,
-                "count": aggregated_user_counts.get(user.id, 0)
-            })
-            
-    # Final sort of top contributors
-    sorted_users = sorted(user_details, key=lambda x: x["count"], reverse=True)
-    
-    stats = {
+    # Totals come from the incrementally maintained stats_counters table
+    counters = await read_counters(db)
+    category_counts = {
+        category.value: counters[certificate_counter(category)]
+        for _, category in models
+        if category
+    }
+    total_count = sum(category_counts.values()) + counters[GENERATED_CERTIFICATE_COUNTER]
+
+    # Top contributors: count creators across every certificate table in SQL
+    creators = union_all(*[
+        select(model.created_by.label("user_id")).where(model.created_by.isnot(None))
+        for model, _ in models
+    ]).subquery()
+    contributions = func.count().label("count")
+    top_stmt = (
+        select(User.id, User.first_name, User.last_name, User.email, contributions)
+        .join(creators, creators.c.user_id == User.id)
+        .group_by(User.id, User.first_name, User.last_name, User.email)
+        .order_by(contributions.desc(), User.id)
+        .limit(_TOP_CONTRIBUTORS)
+    )
+    top_result = await db.execute(top_stmt)
+    by_user = [
+        {
+            "id": user_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "count": count,
+        }
+        for user_id, first_name, last_name, email, count in top_result.all()
+    ]
+
+    return {
         "total_certificates": total_count,
         "by_category": category_counts,
-        "by_user": sorted_users,
+        "by_user": by_user,
     }
 
-    # Cache the result for 10 minutes (600 seconds)
+
+async def _load_statistics_snapshot() -> Optional[Dict[str, Any]]:
+    import json
+    from config.redis import get_redis
+
     try:
         redis = await get_redis()
         if redis:
-            await redis.set("certificate_statistics", json.dumps(stats), ex=600)
+            cached = await redis.get(_STATISTICS_CACHE_KEY)
+            if cached:
+                snapshot = json.loads(cached)
+                # Anything else (an older format) counts as missing
+                if isinstance(snapshot, dict) and "computed_at" in snapshot and "stats" in snapshot:
+                    return snapshot
+    except Exception as e:
+        logger.warning(f"Redis cache error: {e}")
+    return _statistics_snapshot
+
+
+async def _store_statistics_snapshot(stats: Dict[str, Any]):
+    import json
+    import time
+    from config.redis import get_redis
+
+    global _statistics_snapshot
+    _statistics_snapshot = {"computed_at": time.time(), "stats": stats}
+    try:
+        redis = await get_redis()
+        if redis:
+            await redis.set(_STATISTICS_CACHE_KEY, json.dumps(_statistics_snapshot), ex=_STATISTICS_MAX_AGE_SECONDS)
     except Exception as e:
         logger.warning(f"Error saving to Redis: {e}")
 
+
+async def refresh_certificate_statistics(only_if_missing: bool = False):
+    """Recompute the statistics snapshot in its own session."""
+    from config.database import async_session_maker
+
+    try:
+        if only_if_missing and await _load_statistics_snapshot() is not None:
+            return
+        async with async_session_maker() as db:
+            stats = await _compute_certificate_statistics(db)
+        await _store_statistics_snapshot(stats)
+    except Exception as e:
+        logger.error(f"Certificate statistics refresh failed: {e}", exc_info=True)
+
+
+def schedule_certificate_statistics_refresh(only_if_missing: bool = False):
+    """Start a background refresh unless one is already running in this worker."""
+    import asyncio
+
+    global _statistics_refresh_task
+    if _statistics_refresh_task is not None and not _statistics_refresh_task.done():
+        return
+    _statistics_refresh_task = asyncio.create_task(
+        refresh_certificate_statistics(only_if_missing), name="certificate-statistics-refresh"
+    )
+
+
+async def  _certificate_statistics(db: Session):
+    """Get certificate statistics: total, by user, by category (stale-while-revalidate cached)"""
+    import time
+
+    snapshot = await _load_statistics_snapshot()
+    if snapshot:
+        if time.time() - snapshot["computed_at"] > _STATISTICS_FRESH_SECONDS:
+            schedule_certificate_statistics_refresh()
+        return snapshot["stats"]
+
+    # Cold cache: nothing to serve yet
+    stats = await _compute_certificate_statistics(db)
+    await _store_statistics_snapshot(stats)
     return stats
 
 
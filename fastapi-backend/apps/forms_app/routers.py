@@ -2,8 +2,9 @@
 Forms Routers
 API endpoints for form submissions and SPA management
 """
+from datetime import date
 from typing import List, Optional, Union
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Query
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from pydantic import EmailStr
@@ -40,9 +41,12 @@ from apps.forms_app.services.hiring_form_service import (
     update_hiring_form,
     delete_hiring_form,
     get_forms_statistics,
+    hiring_form_export_query,
 )
 
 from core.exceptions import NotFoundError, ValidationError
+from core.export import EXPORT_FORMAT_PATTERN, export_response
+from core.response_cache import cached_response
 import os
 import uuid
 from pathlib import Path
@@ -88,6 +92,7 @@ async def save_uploaded_file(file: UploadFile, subdirectory: str = "") -> str:
 
 
 @forms_router.get("/spas", response_model=List[Union[SPAResponse, SPASelectionResponse]])
+@cached_response(tags=("spas",), ttl=300)
 async def list_spas(minimal: bool = True, db: Session = Depends(get_db)):
     """List all active SPAs/locations (Optional minimal data for public forms)"""
     spas = await get_all_spas(db, active_only=True, minimal=minimal)
@@ -694,3 +699,19 @@ async def get_all_hiring_forms_admin(
     """Get all hiring forms with user information (admin only)"""
     forms = await get_all_hiring_forms_with_users(db, skip=skip, limit=limit)
     return forms
+
+
+@forms_router.get("/admin/hiring-forms/export")
+async def export_hiring_forms_admin(
+    file_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    date_from: Optional[date] = Query(None, description="Submitted on or after (UTC)"),
+    date_to: Optional[date] = Query(None, description="Submitted on or before (UTC)"),
+    spa_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "super_admin"))
+):
+    """Stream every matching hiring form as CSV or XLSX (admin only)"""
+    # The export reads through its own cursor session; release this one now
+    await db.close()
+    stmt = hiring_form_export_query(date_from=date_from, date_to=date_to, spa_id=spa_id)
+    return export_response(stmt, "hiring-forms", file_format)
@@ -7,6 +7,7 @@ from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from sqlalchemy import select
 from apps.forms_app.models import Hiring_Form
+from apps.analytics.services.counter_service import adjust_counters, ROLE_COUNTER_PREFIX
 from core.exceptions import NotFoundError
 
 
@@ -133,6 +134,7 @@ async def delete_hiring_form(db: Session, form_id: int) -> bool:
     
     stmt = delete(Hiring_Form).where(Hiring_Form.id == form_id)
     await db.execute(stmt)
+    await adjust_counters(db, {"total_forms": -1, f"{ROLE_COUNTER_PREFIX}{form.for_role}": -1})
     await db.commit()
     return True
 
@@ -160,6 +162,37 @@ async def get_all_hiring_forms_with_users(db: Session, skip: int = 0, limit: int
     
     return forms
 
+
+def hiring_form_export_query(date_from=None, date_to=None, spa_id: Optional[int] = None):
+    """Column select of hiring forms with SPA and submitter for a streaming export, newest first"""
+    from apps.forms_app.models import SPA
+    from apps.users.models import User
+    from core.export import date_range
+
+    conditions = date_range(Hiring_Form.created_at, date_from, date_to)
+    if spa_id is not None:
+        conditions.append(Hiring_Form.spa_id == spa_id)
+    return (
+        select(
+            Hiring_Form.id,
+            Hiring_Form.spa_id,
+            SPA.name.label("spa_name"),
+            SPA.city.label("spa_city"),
+            Hiring_Form.for_role,
+            Hiring_Form.description,
+            Hiring_Form.required_experience,
+            Hiring_Form.required_education,
+            Hiring_Form.required_skills,
+            User.username.label("created_by"),
+            User.email.label("created_by_email"),
+            Hiring_Form.created_at,
+        )
+        .outerjoin(SPA, SPA.id == Hiring_Form.spa_id)
+        .outerjoin(User, User.id == Hiring_Form.created_by)
+        .where(*conditions)
+        .order_by(Hiring_Form.created_at.desc())
+    )
+
 async def get_forms_statistics(db: Session):
     """Get forms statistics: total, by SPA, by user"""
     from sqlalchemy import func
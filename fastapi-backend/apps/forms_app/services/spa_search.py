@@ -0,0 +1,271 @@
+"""
+SPA Search
+In-process inverted index over SPA text fields with prefix and typo-tolerant matching
+
+The index maps normalized tokens (lowercased, accents stripped, split on
+non-alphanumerics) to the SPAs containing them, weighted by field. Each query
+term matches tokens exactly, by prefix (sorted token list + bisect) or, for
+non-numeric terms of three or more characters that match too few SPAs that
+way, by trigram similarity with a bounded edit distance. An SPA must match
+every term; results are ranked by summed score.
+
+The index is built with one narrow SELECT and rebuilt lazily after SPA
+mutations (``invalidate_search_index``) or once it is older than
+``SPA_SEARCH_INDEX_TTL_SECONDS``.
+"""
+import asyncio
+import logging
+import re
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from apps.forms_app.models import SPA
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Field weights: a hit in the name or code outranks one in the address
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "code": 3.0,
+    "area": 2.0,
+    "city": 2.0,
+    "state": 1.5,
+    "pincode": 1.5,
+    "address": 1.0,
+    "email": 1.0,
+    "phone_number": 1.0,
+    "alternate_number": 1.0,
+    "gst_number": 1.0,
+}
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.7
+FUZZY_SCORE = 0.4
+MIN_TRIGRAM_SIMILARITY = 0.3
+MAX_PREFIX_EXPANSIONS = 5000
+# Typo-tolerant matching only kicks in when exact/prefix hits are this scarce
+FUZZY_FALLBACK_HITS = 20
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text) -> str:
+    if text is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.lower()).strip()
+
+
+def tokenize(text) -> List[str]:
+    return normalize(text).split()
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _max_typos(term: str) -> int:
+    return 1 if len(term) <= 5 else 2
+
+
+def _within_distance(a: str, b: str, limit: int) -> bool:
+    """Levenshtein distance <= limit (banded, early exit)."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j, cb in enumerate(b, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ca != cb),
+            )
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+class SpaSearchIndex:
+    """Immutable snapshot of the SPA table for ranked search."""
+
+    def __init__(self, rows: Iterable[Tuple]):
+        # token -> {spa_id: best field weight}
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.trigram_tokens: Dict[str, Set[str]] = defaultdict(set)
+        # spa_id -> (is_active, normalized city, normalized state, normalized name)
+        self.docs: Dict[int, Tuple[bool, str, str, str]] = {}
+
+        fields = list(FIELD_WEIGHTS)
+        for row in rows:
+            spa_id, is_active = row[0], bool(row[1])
+            values = dict(zip(fields, row[2:]))
+            self.docs[spa_id] = (
+                is_active,
+                normalize(values["city"]),
+                normalize(values["state"]),
+                normalize(values["name"]),
+            )
+            for field, value in values.items():
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(value):
+                    if self.postings[token].get(spa_id, 0) < weight:
+                        self.postings[token][spa_id] = weight
+
+        self.tokens: List[str] = sorted(self.postings)
+        for token in self.tokens:
+            # Numbers (phones, pincodes, codes) are matched exactly or by prefix only
+            if len(token) >= 3 and not token.isdigit():
+                for gram in trigrams(token):
+                    self.trigram_tokens[gram].add(token)
+        self.built_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Matching
+    # ------------------------------------------------------------------
+
+    def _prefix_tokens(self, term: str) -> List[str]:
+        start = bisect_left(self.tokens, term)
+        matched = []
+        for token in self.tokens[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not token.startswith(term):
+                break
+            matched.append(token)
+        return matched
+
+    def _fuzzy_tokens(self, term: str) -> List[Tuple[str, float]]:
+        term_grams = trigrams(term)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in term_grams:
+            for token in self.trigram_tokens.get(gram, ()):
+                shared[token] += 1
+
+        limit = _max_typos(term)
+        # One edit changes at most three trigrams
+        min_common = len(term_grams) - 3 * limit
+        matched = []
+        for token, common in shared.items():
+            if common < min_common:
+                continue
+            similarity = common / (len(term_grams) + len(trigrams(token)) - common)
+            if similarity >= MIN_TRIGRAM_SIMILARITY and _within_distance(term, token, limit):
+                matched.append((token, similarity))
+        return matched
+
+    def _term_scores(self, term: str) -> Dict[int, float]:
+        scores: Dict[int, float] = {}
+
+        def add(token: str, factor: float):
+            for spa_id, weight in self.postings[token].items():
+                score = weight * factor
+                if score > scores.get(spa_id, 0):
+                    scores[spa_id] = score
+
+        for token in self._prefix_tokens(term):
+            add(token, EXACT_SCORE if token == term else PREFIX_SCORE)
+        if len(term) >= 3 and not term.isdigit() and len(scores) < FUZZY_FALLBACK_HITS:
+            for token, similarity in self._fuzzy_tokens(term):
+                if not token.startswith(term):
+                    add(token, FUZZY_SCORE * similarity)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        is_active: Optional[bool] = None,
+        city: Optional[str] = None,
+        state: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """Return SPA ids matching every term of ``query``, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        totals: Optional[Dict[int, float]] = None
+        # Most selective terms first so the intersection shrinks quickly
+        for scores in sorted((self._term_scores(term) for term in terms), key=len):
+            if totals is None:
+                totals = dict(scores)
+            else:
+                totals = {spa_id: total + scores[spa_id] for spa_id, total in totals.items() if spa_id in scores}
+            if not totals:
+                return []
+
+        city = normalize(city) if city else None
+        state = normalize(state) if state else None
+        ranked = []
+        for spa_id, score in totals.items():
+            active, doc_city, doc_state, name = self.docs[spa_id]
+            if is_active is not None and active != is_active:
+                continue
+            if city and doc_city != city:
+                continue
+            if state and doc_state != state:
+                continue
+            ranked.append((-score, name, spa_id))
+        ranked.sort()
+        if limit:
+            ranked = ranked[:limit]
+        return [spa_id for _, _, spa_id in ranked]
+
+
+# =========================================================
+# Process-wide index
+# =========================================================
+
+_index: Optional[SpaSearchIndex] = None
+_index_stale = True
+_index_lock = asyncio.Lock()
+
+
+def invalidate_search_index():
+    """Mark the index for rebuild on the next search (called on SPA mutations)."""
+    global _index_stale
+    _index_stale = True
+
+
+async def _load_rows(db: Session) -> List[Tuple]:
+    columns = [getattr(SPA, field) for field in FIELD_WEIGHTS]
+    result = await db.execute(select(SPA.id, SPA.is_active, *columns))
+    return result.all()
+
+
+async def get_search_index(db: Session) -> SpaSearchIndex:
+    global _index, _index_stale
+    ttl = settings.SPA_SEARCH_INDEX_TTL_SECONDS
+    if _index is not None and not _index_stale and time.monotonic() - _index.built_at < ttl:
+        return _index
+
+    async with _index_lock:
+        if _index is not None and not _index_stale and time.monotonic() - _index.built_at < ttl:
+            return _index
+        _index_stale = False
+        rows = await _load_rows(db)
+        # Tokenizing thousands of rows would stall the event loop; build off-thread
+        _index = await asyncio.to_thread(SpaSearchIndex, rows)
+        logger.debug(f"SPA search index rebuilt: {len(_index.docs)} SPAs, {len(_index.tokens)} tokens")
+        return _index
+
+
+async def search_spa_ids(
+    db: Session,
+    query: str,
+    is_active: Optional[bool] = None,
+    city: Optional[str] = None,
+    state: Optional[str] = None,
+) -> List[int]:
+    index = await get_search_index(db)
+    return index.search(query, is_active=is_active, city=city, state=state, limit=settings.SPA_SEARCH_MAX_RESULTS)
@@ -4,17 +4,114 @@ Business logic for SPA operations
 """
 from typing import Optional, List
 from datetime import datetime, timezone
+from collections import OrderedDict
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy import String, cast, or_, select, func
+from sqlalchemy import select, func, inspect as sa_inspect
 from sqlalchemy.orm import load_only
 from apps.forms_app.models import SPA
 from apps.forms_app.schemas import SPACreate, SPAUpdate
+from apps.forms_app.services.spa_search import search_spa_ids, invalidate_search_index
+from config.settings import settings
 from core.exceptions import NotFoundError, ValidationError
-import asyncio
+from core.single_flight import single_flight
+from core.response_cache import invalidate_tags
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+_VERSION_KEY = "spa_cache:version"
+
+
+class SpaSnapshotCache:
+    """
+    Size-bounded LRU with TTL holding detached SPA snapshots.
+
+    Entries are plain transient ``SPA`` copies, safe to share across sessions.
+    A version counter in Redis (bumped by ``clear_spa_cache``) is checked at
+    most every ``SPA_CACHE_VERSION_CHECK_SECONDS``; when another worker has
+    bumped it, the local entries and search index are dropped.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+
+    async def _sync_version(self):
+        now = time.monotonic()
+        if now - self._version_checked_at < settings.SPA_CACHE_VERSION_CHECK_SECONDS:
+            return
+        self._version_checked_at = now
+        redis = await _redis()
+        if redis is None:
+            return
+        try:
+            version = int(await redis.get(_VERSION_KEY) or 0)
+        except Exception as e:
+            logger.warning(f"SPA cache version check failed: {e}")
+            return
+        if self._version is not None and version != self._version:
+            self.clear()
+            invalidate_search_index()
+        self._version = version
+
+    async def get(self, key: tuple):
+        await self._sync_version()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: tuple, value):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    async def bump_version(self):
+        self.clear()
+        redis = await _redis()
+        if redis is None:
+            return
+        try:
+            self._version = int(await redis.incr(_VERSION_KEY))
+            self._version_checked_at = time.monotonic()
+        except Exception as e:
+            logger.warning(f"SPA cache version bump failed: {e}")
+
+
+async def _redis():
+    from config.redis import get_redis
+
+    try:
+        return await get_redis()
+    except Exception:
+        return None
+
+
+def _snapshot(spa: SPA) -> SPA:
+    """Detached copy of the loaded column attributes of ``spa``."""
+    unloaded = sa_inspect(spa).unloaded
+    return SPA(**{
+        attr.key: getattr(spa, attr.key)
+        for attr in SPA.__mapper__.column_attrs
+        if attr.key not in unloaded
+    })
+
+
+_spa_cache = SpaSnapshotCache(settings.SPA_CACHE_MAX_ENTRIES, settings.SPA_CACHE_TTL_SECONDS)
 
-# Thread-safe in-memory cache for SPA lists
-_SPA_CACHE = {}
-_CACHE_LOCK = asyncio.Lock()
 
 def _normalize_filter(value: Optional[str]) -> Optional[str]:
     if value is None:
@@ -24,13 +121,18 @@ def _normalize_filter(value: Optional[str]) -> Optional[str]:
     return value or None
 
 
-def _get_cache_key(active_only, minimal, search, city, state, status):
-    return f"{active_only}:{minimal}:{search}:{city}:{state}:{status}"
-
 async def clear_spa_cache():
-    """Clear the SPA list cache"""
-    async with _CACHE_LOCK:
-        _SPA_CACHE.clear()
+    """Invalidate cached SPA lists/snapshots and the search index in every worker"""
+    await _spa_cache.bump_version()
+    invalidate_search_index()
+    await invalidate_tags("spas")
+
+
+async def _get_spa_for_update(db: Session, spa_id: int) -> Optional[SPA]:
+    """Session-attached SPA for mutations (never served from the cache)."""
+    stmt = select(SPA).where(SPA.id == spa_id)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
 
 
 async def  create_spa(db: Session, spa_data: SPACreate, created_by: Optional[int] = None) -> SPA:
@@ -66,11 +168,21 @@ async def  create_spa(db: Session, spa_data: SPACreate, created_by: Optional[int
 
 
 async def get_spa_by_id(db: Session, spa_id: int) -> Optional[SPA]:
-    stmt = select(SPA).where(SPA.id == spa_id)
-    result = await db.execute(stmt)
-    return result.scalar_one_or_none()
+    """Read-only SPA snapshot (cached); use the returned object for display/rendering only"""
+    cache_key = ("id", spa_id)
+    cached = await _spa_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    spa = await _get_spa_for_update(db, spa_id)
+    if spa is None:
+        return None
+    snapshot = _snapshot(spa)
+    _spa_cache.set(cache_key, snapshot)
+    return snapshot
 
 
+@single_flight("spas.list")
 async def get_all_spas(
     db: Session,
     active_only: bool = True,
@@ -87,42 +199,39 @@ async def get_all_spas(
     status = _normalize_filter(status)
     if status:
         status = status.lower()
+    # status filter overrides active_only flag
+    if status == "active":
+        is_active = True
+    elif status == "inactive":
+        is_active = False
+    else:
+        is_active = True if active_only else None
+
+    if search:
+        # Ranked, typo-tolerant search served by the in-process index
+        spa_ids = await search_spa_ids(db, search, is_active=is_active, city=city, state=state)
+        if not spa_ids:
+            return []
+        stmt = select(SPA).where(SPA.id.in_(spa_ids))
+        if minimal:
+            stmt = stmt.options(load_only(SPA.id, SPA.name, SPA.code, SPA.area, SPA.city))
+        result = await db.execute(stmt)
+        rank = {spa_id: position for position, spa_id in enumerate(spa_ids)}
+        return sorted((_snapshot(spa) for spa in result.scalars().all()), key=lambda spa: rank[spa.id])
+
     # 🚀 Performance Optimization: Cache Check
-    cache_key = _get_cache_key(active_only, minimal, search, city, state, status)
-    async with _CACHE_LOCK:
-        if cache_key in _SPA_CACHE:
-            return _SPA_CACHE[cache_key]
+    cache_key = ("list", minimal, is_active, city and city.lower(), state and state.lower())
+    cached = await _spa_cache.get(cache_key)
+    if cached is not None:
+        return cached
 
     stmt = select(SPA)
 
     if minimal:
         stmt = stmt.options(load_only(SPA.id, SPA.name, SPA.code, SPA.area, SPA.city))
 
-    # status filter overrides active_only flag
-    if status == "active":
-        stmt = stmt.where(SPA.is_active == True)
-    elif status == "inactive":
-        stmt = stmt.where(SPA.is_active == False)
-    elif active_only:
-        stmt = stmt.where(SPA.is_active == True)
-
-    if search:
-        term = f"%{search}%"
-        stmt = stmt.where(
-            or_(
-                SPA.name.ilike(term),
-                cast(SPA.code, String).ilike(term),
-                SPA.address.ilike(term),
-                SPA.area.ilike(term),
-                SPA.city.ilike(term),
-                SPA.state.ilike(term),
-                SPA.email.ilike(term),
-                SPA.phone_number.ilike(term),
-                SPA.alternate_number.ilike(term),
-                SPA.gst_number.ilike(term),
-                SPA.pincode.ilike(term),
-            )
-        )
+    if is_active is not None:
+        stmt = stmt.where(SPA.is_active == is_active)
 
     if city:
         stmt = stmt.where(func.lower(func.trim(SPA.city)) == city.lower())
@@ -132,17 +241,16 @@ async def get_all_spas(
 
     stmt = stmt.order_by(SPA.name)
     result = await db.execute(stmt)
-    spas = list(result.scalars().all())
+    spas = [_snapshot(spa) for spa in result.scalars().all()]
 
     # Store in cache
-    async with _CACHE_LOCK:
-        _SPA_CACHE[cache_key] = spas
+    _spa_cache.set(cache_key, spas)
 
     return spas
 
 
 async def update_spa(db: Session, spa_id: int, update_data: SPAUpdate) -> SPA:
-    spa = await get_spa_by_id(db, spa_id)
+    spa = await _get_spa_for_update(db, spa_id)
     if not spa:
         raise NotFoundError("SPA not found")
 
@@ -180,7 +288,7 @@ async def delete_spa(db: Session, spa_id: int) -> bool:
     This is the default behaviour used for non super-admin roles so that
     historical data and relationships remain intact.
     """
-    spa = await get_spa_by_id(db, spa_id)
+    spa = await _get_spa_for_update(db, spa_id)
     if not spa:
         raise NotFoundError("SPA not found")
 
@@ -202,7 +310,7 @@ async def hard_delete_spa(db: Session, spa_id: int) -> bool:
     This should only be called from routes that enforce super_admin role,
     as it will remove the record entirely instead of performing a soft delete.
     """
-    spa = await get_spa_by_id(db, spa_id)
+    spa = await _get_spa_for_update(db, spa_id)
     if not spa:
         raise NotFoundError("SPA not found")
 
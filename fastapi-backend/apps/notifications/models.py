@@ -1,8 +1,116 @@
 """
 Notification Models
-Re-export models from users app for convenience
+Re-export models from users app for convenience, plus the email and SMS outboxes
+and the archive tables of the audit tables
 """
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index, Table
+from sqlalchemy.sql import func
+
+from config.database import Base
 from apps.users.models import Notification, LoginHistory, UserActivity
 
-__all__ = ["Notification", "LoginHistory", "UserActivity"]
 
+class OutboxStatus:
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    EXPIRED = "expired"  # Not delivered before its deadline
+
+
+class EmailOutbox(Base):
+    """
+    Outgoing email, written in the caller's transaction and delivered by the
+    outbox worker. ``status`` moves pending -> sending -> sent, or back to
+    pending with a later ``next_attempt_at`` after a failure, until
+    ``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached (failed).
+    """
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    html_body = Column(Text, nullable=True)
+    recipients = Column(JSON, nullable=False)  # List of addresses
+
+    status = Column(String(20), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Claim lease while sending
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("idx_email_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox(id={self.id}, status='{self.status}', attempts={self.attempts})>"
+
+
+class SmsOutbox(Base):
+    """
+    Outgoing SMS, queued in the caller's transaction and delivered by the SMS
+    outbox worker. Retried with backoff until sent, ``SMS_OUTBOX_MAX_ATTEMPTS``
+    is reached (failed) or ``deadline_at`` passes (expired) - an OTP that
+    arrives after it stopped being useful is not worth sending.
+    """
+    __tablename__ = "sms_outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    phone_number = Column(String(20), nullable=False)
+    message = Column(Text, nullable=False)
+
+    status = Column(String(20), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    locked_until = Column(DateTime(timezone=True), nullable=True)  # Claim lease while sending
+    deadline_at = Column(DateTime(timezone=True), nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("idx_sms_outbox_status_next", "status", "next_attempt_at"),
+    )
+
+    def __repr__(self):
+        return f"<SmsOutbox(id={self.id}, status='{self.status}', attempts={self.attempts})>"
+
+
+def _archive_table(source: Table) -> Table:
+    """
+    ``<source>_archive``: the columns of ``source`` without its foreign keys,
+    compressed, keyed by (id, created_at) so MySQL can range-partition it by
+    month (see the retention service).
+    """
+    columns = [
+        Column(
+            column.name,
+            column.type,
+            primary_key=column.name in ("id", "created_at"),
+            autoincrement=False,
+            nullable=column.nullable,
+        )
+        for column in source.columns
+    ]
+    return Table(
+        f"{source.name}_archive",
+        Base.metadata,
+        *columns,
+        Index(f"idx_{source.name}_archive_user_created", "user_id", "created_at"),
+        mysql_row_format="COMPRESSED",
+    )
+
+
+user_activities_archive = _archive_table(UserActivity.__table__)
+login_history_archive = _archive_table(LoginHistory.__table__)
+notifications_archive = _archive_table(Notification.__table__)
+
+
+__all__ = ["Notification", "LoginHistory", "UserActivity", "EmailOutbox", "SmsOutbox", "OutboxStatus",
+    "user_activities_archive", "login_history_archive", "notifications_archive",
+]
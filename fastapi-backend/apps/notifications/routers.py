@@ -4,22 +4,27 @@ API endpoints for notifications
 """
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from config.database import get_db
 from apps.users.models import User
+from core.bulk import unique_ids
 from core.dependencies import get_current_active_user
 from apps.notifications.services.notification_service import (
     get_user_notifications,
     mark_notification_read,
     mark_all_notifications_read,
     get_unread_count,
-    delete_notification
+    delete_notification,
+    delete_notifications
 )
+from apps.notifications.services.unread_counter import unread_events
 from apps.notifications.services.activity_service import (
     get_user_activities,
     get_login_history,
-    delete_activity
+    delete_activity,
+    delete_activities
 )
 
 notifications_router = APIRouter()
@@ -73,6 +78,23 @@ async def get_unread_notifications_count(
     return {"unread_count": count}
 
 
+@notifications_router.get("/stream")
+async def stream_unread_notifications_count(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Server-sent events: an ``unread`` event with the unread count on connect and on every change"""
+    is_admin = current_user.role in ["admin", "super_admin"]
+    user_id = current_user.id
+    # The stream opens its own short sessions; don't hold this one's connection for its lifetime
+    await db.close()
+    return StreamingResponse(
+        unread_events(user_id, is_admin=is_admin),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @notifications_router.patch("/{notification_id}/read")
 async def mark_notification_as_read(
     notification_id: int,
@@ -123,6 +145,7 @@ async def delete_notification_endpoint(
 async def list_user_activities(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    include_archived: bool = Query(False, description="Also read rows moved out of the hot window"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -133,7 +156,8 @@ async def list_user_activities(
         user_id=current_user.id,
         skip=skip,
         limit=limit,
-        is_admin=is_admin
+        is_admin=is_admin,
+        include_archived=include_archived
     )
     
     # Convert to dict format for JSON response
@@ -160,6 +184,7 @@ async def list_user_activities(
 async def list_login_history(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    include_archived: bool = Query(False, description="Also read rows moved out of the hot window"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
@@ -168,7 +193,8 @@ async def list_login_history(
         db=db,
         user_id=current_user.id,
         skip=skip,
-        limit=limit
+        limit=limit,
+        include_archived=include_archived
     )
     
     # Convert to dict format for JSON response
@@ -226,37 +252,36 @@ async def bulk_delete_notifications(
     failed_notifications = []
     failed_activities = []
     
+    # One statement per chunk of ids; anything not deleted is reported as failed
     if request.notification_ids:
-        for notif_id in request.notification_ids:
-            try:
-                success =  await delete_notification(
-                    db=db,
-                    notification_id=notif_id,
-                    user_id=current_user.id,
-                    is_admin=is_admin
-                )
-                if success:
-                    deleted_notifications += 1
-                else:
-                    failed_notifications.append(notif_id)
-            except Exception as e:
-                failed_notifications.append(notif_id)
+        requested = unique_ids(request.notification_ids)
+        try:
+            deleted = set(await delete_notifications(
+                db=db,
+                notification_ids=requested,
+                user_id=current_user.id,
+                is_admin=is_admin
+            ))
+        except Exception as e:
+            await db.rollback()
+            deleted = set()
+        deleted_notifications = len(deleted)
+        failed_notifications = [notif_id for notif_id in requested if notif_id not in deleted]
     
     if request.activity_ids:
-        for activity_id in request.activity_ids:
-            try:
-                success =  await delete_activity(
-                    db=db,
-                    activity_id=activity_id,
-                    user_id=current_user.id,
-                    is_admin=is_admin
-                )
-                if success:
-                    deleted_activities += 1
-                else:
-                    failed_activities.append(activity_id)
-            except Exception as e:
-                failed_activities.append(activity_id)
+        requested = unique_ids(request.activity_ids)
+        try:
+            deleted = set(await delete_activities(
+                db=db,
+                activity_ids=requested,
+                user_id=current_user.id,
+                is_admin=is_admin
+            ))
+        except Exception as e:
+            await db.rollback()
+            deleted = set()
+        deleted_activities = len(deleted)
+        failed_activities = [activity_id for activity_id in requested if activity_id not in deleted]
     
     return {
         "deleted_notifications": deleted_notifications,
@@ -4,10 +4,13 @@ Handles user activity tracking
 """
 from typing import Optional, List, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy import select, desc, and_
+from sqlalchemy import desc
 from datetime import datetime, timezone
 
 from apps.users.models import UserActivity, LoginHistory
+from apps.notifications.services.event_buffer import record_event
+from apps.notifications.services.retention import select_retained
+from core.bulk import delete_by_ids, update_by_ids
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,9 +26,9 @@ async def log_activity(
     metadata: Optional[Dict[str, Any]] = None,
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None
-) -> UserActivity:
-    """Log a user activity"""
-    activity = UserActivity(
+) -> None:
+    """Log a user activity (written by the event buffer's next batch)"""
+    await record_event(db, UserActivity, dict(
         user_id=user_id,
         activity_type=activity_type,
         activity_description=activity_description,
@@ -34,11 +37,7 @@ async def log_activity(
         meta_data=metadata or {},
         ip_address=ip_address,
         user_agent=user_agent
-    )
-    db.add(activity)
-    await db.commit()
-    await db.refresh(activity)
-    return activity
+    ))
 
 
 async def log_login_activity(
@@ -48,19 +47,15 @@ async def log_login_activity(
     user_agent: Optional[str] = None,
     status: str = "success",
     failure_reason: Optional[str] = None
-) -> LoginHistory:
-    """Log a login activity"""
-    login_history = LoginHistory(
+) -> None:
+    """Log a login activity (written by the event buffer's next batch)"""
+    await record_event(db, LoginHistory, dict(
         user_id=user_id,
         ip_address=ip_address,
         user_agent=user_agent,
         login_status=status,
         failure_reason=failure_reason
-    )
-    db.add(login_history)
-    await db.commit()
-    await db.refresh(login_history)
-    return login_history
+    ))
 
 
 async def get_user_activities(
@@ -68,7 +63,8 @@ async def get_user_activities(
     user_id: Optional[int] = None,
     skip: int = 0,
     limit: int = 100,
-    is_admin: bool = False
+    is_admin: bool = False,
+    include_archived: bool = False
 ) -> List[UserActivity]:
     """Get user activities
     
@@ -78,80 +74,82 @@ async def get_user_activities(
         skip: Skip records
         limit: Limit records
         is_admin: If True, show all activities including deleted ones
+        include_archived: If True, also read activities moved out of the hot window
     """
-    stmt = select(UserActivity)
-    
-    if is_admin:
-        # Admin can see all activities (including deleted ones)
-        if user_id:
-            stmt = stmt.where(UserActivity.user_id == user_id)
-    else:
+    if not is_admin and not user_id:
+        # Non-admin without user_id should not see anything
+        return []
+
+    def criteria(c):
+        if is_admin:
+            # Admin can see all activities (including deleted ones)
+            return [c.user_id == user_id] if user_id else []
         # Non-admin users only see their own non-deleted activities
-        if user_id:
-            stmt = stmt.where(
-                and_(
-                    UserActivity.user_id == user_id,
-                    UserActivity.is_deleted.is_(False)  # Exclude soft-deleted
-                )
-            )
-        else:
-            # Non-admin without user_id should not see anything
-            stmt = stmt.where(UserActivity.id == -1)  # Return empty result
-    
-    stmt = stmt.order_by(desc(UserActivity.created_at)).offset(skip).limit(limit)
+        return [c.user_id == user_id, c.is_deleted.is_(False)]
+
+    stmt, activity = select_retained(UserActivity, criteria, include_archived)
+    stmt = stmt.order_by(desc(activity.created_at)).offset(skip).limit(limit)
     result = await db.execute(stmt)
     return list(result.scalars().all())
 
 
-async def delete_activity(
+async def delete_activities(
     db: Session,
-    activity_id: int,
+    activity_ids: List[int],
     user_id: int,
     is_admin: bool = False
-) -> bool:
-    """Delete an activity
+) -> List[int]:
+    """Delete many activities in chunked set-based statements
     
     Args:
         db: Database session
-        activity_id: Activity ID to delete
+        activity_ids: Activity IDs to delete
         user_id: User ID requesting deletion
-        is_admin: If True, permanently delete; if False, soft delete
+        is_admin: If True, permanently delete; if False, soft delete own activities
     
     Returns:
-        True if deleted successfully, False otherwise
+        The IDs actually deleted
     """
-    activity = await db.get(UserActivity, activity_id)
-    if not activity:
-        return False
-    
-    # Non-admin can only delete their own activities
-    if not is_admin:
-        if activity.user_id != user_id:
-            return False
-        # Soft delete for non-admin
-        activity.is_deleted = True
-        activity.deleted_at = datetime.now(timezone.utc)
+    if is_admin:
+        deleted = await delete_by_ids(db, UserActivity, activity_ids)
     else:
-        # Hard delete for admin
-        await db.delete(activity)
-    
+        deleted = await update_by_ids(
+            db,
+            UserActivity,
+            activity_ids,
+            {"is_deleted": True, "deleted_at": datetime.now(timezone.utc)},
+            condition=UserActivity.user_id == user_id,
+        )
     await db.commit()
-    return True
+    return deleted
+
+
+async def delete_activity(
+    db: Session,
+    activity_id: int,
+    user_id: int,
+    is_admin: bool = False
+) -> bool:
+    """Delete an activity (soft delete for non-admin, hard delete for admin)
+    
+    Returns:
+        True if deleted successfully, False otherwise
+    """
+    return bool(await delete_activities(db, [activity_id], user_id, is_admin))
 
 
 async def get_login_history(
     db: Session,
     user_id: Optional[int] = None,
     skip: int = 0,
-    limit: int = 100
+    limit: int = 100,
+    include_archived: bool = False
 ) -> List[LoginHistory]:
     """Get login history (all users if user_id is None - admin only)"""
-    stmt = select(LoginHistory)
-    
-    if user_id:
-        stmt = stmt.where(LoginHistory.user_id == user_id)
-    
-    stmt = stmt.order_by(desc(LoginHistory.created_at)).offset(skip).limit(limit)
+    def criteria(c):
+        return [c.user_id == user_id] if user_id else []
+
+    stmt, history = select_retained(LoginHistory, criteria, include_archived)
+    stmt = stmt.order_by(desc(history.created_at)).offset(skip).limit(limit)
     result = await db.execute(stmt)
     return list(result.scalars().all())
-
@@ -0,0 +1,206 @@
+"""
+Email Outbox
+Transactional queue of outgoing email delivered by a background sender
+
+``queue_email(db, ...)`` adds an ``email_outbox`` row to the caller's session,
+so the email is only sent if the surrounding transaction commits. The sender
+task in every worker claims due rows (``FOR UPDATE SKIP LOCKED``, then a
+``sending`` lease of ``EMAIL_OUTBOX_LEASE_SECONDS``), delivers them over the
+pooled SMTP connections and records the outcome. Failed sends are retried
+with exponential backoff; permanent SMTP rejections (5xx) and the last of
+``EMAIL_OUTBOX_MAX_ATTEMPTS`` attempts mark the row ``failed``. Rows left in
+``sending`` by a dead worker are picked up again once their lease expires.
+
+The sender polls every ``EMAIL_OUTBOX_POLL_SECONDS`` and is woken immediately
+when this worker commits a new email.
+"""
+import asyncio
+import logging
+import smtplib
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Union
+
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from apps.notifications.models import EmailOutbox, OutboxStatus
+from config.database import async_session_maker
+from config.settings import settings
+from core.smtp_pool import close_smtp_pool, get_smtp_pool
+from core.utils import build_email_message, validate_smtp_settings
+
+logger = logging.getLogger(__name__)
+
+_wakeup: Optional[asyncio.Event] = None
+_sender_task: Optional[asyncio.Task] = None
+
+
+def _wake():
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def queue_email(
+    db: Session,
+    subject: str,
+    body: str,
+    recipients: Union[str, Iterable[str]],
+    html_body: Optional[str] = None,
+    commit: bool = True,
+) -> Optional[EmailOutbox]:
+    """
+    Queue an email for delivery.
+
+    With ``commit=False`` the row is only added to ``db`` and goes out once the
+    caller commits its own transaction.
+    """
+    recipient_list = [recipients] if isinstance(recipients, str) else list(recipients)
+    if not recipient_list:
+        raise ValueError("At least one recipient email is required")
+
+    if settings.SKIP_EMAIL:
+        logger.info("SKIP_EMAIL is enabled. Email '%s' to %s not queued.", subject, recipient_list)
+        return None
+
+    email = EmailOutbox(
+        subject=str(subject)[:255],
+        body=str(body),
+        html_body=str(html_body) if html_body is not None else None,
+        recipients=recipient_list,
+        status=OutboxStatus.PENDING,
+        attempts=0,
+        next_attempt_at=datetime.now(timezone.utc),
+    )
+    db.add(email)
+    if commit:
+        await db.commit()
+        _wake()
+    else:
+        event.listen(db.sync_session, "after_commit", lambda session: _wake(), once=True)
+    return email
+
+
+# =========================================================
+# Sender
+# =========================================================
+
+def _backoff(attempts: int) -> timedelta:
+    seconds = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1))
+    return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+def _is_permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    code = getattr(exc, "smtp_code", None)
+    return isinstance(code, int) and 500 <= code < 600
+
+
+async def _claim(db: Session) -> List[EmailOutbox]:
+    now = datetime.now(timezone.utc)
+    due = or_(
+        and_(EmailOutbox.status == OutboxStatus.PENDING, EmailOutbox.next_attempt_at <= now),
+        # Lease expired: the worker sending it died
+        and_(EmailOutbox.status == OutboxStatus.SENDING, EmailOutbox.locked_until < now),
+    )
+    result = await db.execute(
+        select(EmailOutbox)
+        .where(due)
+        .order_by(EmailOutbox.id)
+        .limit(settings.EMAIL_OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    emails = list(result.scalars().all())
+    if emails:
+        await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_([email.id for email in emails]))
+            .values(
+                status=OutboxStatus.SENDING,
+                attempts=EmailOutbox.attempts + 1,
+                locked_until=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS),
+            )
+            # Keep the loaded objects at their pre-claim attempt count
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return emails
+
+
+async def _deliver(email: EmailOutbox) -> dict:
+    """Send one email; returns the column values recording the outcome."""
+    attempts = email.attempts + 1
+    try:
+        from_email, message = build_email_message(email.subject, email.body, email.recipients, email.html_body)
+        await get_smtp_pool().send(from_email, email.recipients, message)
+    except Exception as e:
+        if _is_permanent(e) or attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"Email {email.id} to {email.recipients} failed permanently after {attempts} attempts: {e}")
+            return {"status": OutboxStatus.FAILED, "last_error": str(e)[:2000], "locked_until": None}
+        logger.warning(f"Email {email.id} attempt {attempts} failed, retrying: {e}")
+        return {
+            "status": OutboxStatus.PENDING,
+            "last_error": str(e)[:2000],
+            "next_attempt_at": datetime.now(timezone.utc) + _backoff(attempts),
+            "locked_until": None,
+        }
+    return {"status": OutboxStatus.SENT, "sent_at": datetime.now(timezone.utc), "locked_until": None}
+
+
+async def process_outbox() -> int:
+    """Deliver the due emails in batches until none are left; returns the number handled."""
+    is_valid, error_msg = validate_smtp_settings()
+    if not is_valid:
+        logger.error("SMTP configuration error, outbox not processed: %s", error_msg)
+        return 0
+
+    handled = 0
+    while True:
+        async with async_session_maker() as db:
+            emails = await _claim(db)
+            if not emails:
+                return handled
+
+            # At most SMTP_POOL_SIZE of these are on the wire at once
+            outcomes = await asyncio.gather(*(_deliver(email) for email in emails))
+            for email, values in zip(emails, outcomes):
+                await db.execute(update(EmailOutbox).where(EmailOutbox.id == email.id).values(**values))
+            await db.commit()
+            handled += len(emails)
+
+
+async def _sender_loop():
+    while True:
+        try:
+            await process_outbox()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Email outbox processing failed: {e}", exc_info=True)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.EMAIL_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_email_outbox():
+    """Start the sender task (called from the app lifespan)."""
+    global _wakeup, _sender_task
+    if settings.SKIP_EMAIL or _sender_task is not None:
+        return
+    _wakeup = asyncio.Event()
+    _sender_task = asyncio.create_task(_sender_loop(), name="email-outbox")
+
+
+async def stop_email_outbox():
+    global _wakeup, _sender_task
+    if _sender_task is not None:
+        _sender_task.cancel()
+        try:
+            await _sender_task
+        except asyncio.CancelledError:
+            pass
+        _sender_task = None
+        _wakeup = None
+    await close_smtp_pool()
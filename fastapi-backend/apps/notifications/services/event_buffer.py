@@ -0,0 +1,237 @@
+"""
+Event Buffer
+Write-behind buffer for activity, login history and notification rows
+
+``record_event(db, Model, values)`` queues a row instead of committing it on
+the caller's session. A background task drains the queue every
+``EVENT_BUFFER_FLUSH_MS`` (or as soon as ``EVENT_BUFFER_BATCH_SIZE`` rows are
+waiting) and writes each table's rows with one multi-row ``INSERT`` in its own
+session. The queue is bounded by ``EVENT_BUFFER_MAX_SIZE``; producers wait for
+room when it is full. ``stop_event_buffer`` flushes everything still queued.
+
+When the buffer is not running (disabled, scripts, before startup) rows are
+written directly on the caller's session as before.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import Table, insert
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from config.database import async_session_maker
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+_queue: Optional[asyncio.Queue] = None
+_batch_ready: Optional[asyncio.Event] = None
+_writing: Optional[asyncio.Lock] = None  # Held by the flush loop from taking a row until it is written
+_flush_task: Optional[asyncio.Task] = None
+_running = False
+
+
+def _row_values(table: Table, values: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Complete a row to every column of ``table`` so all rows of a multi-row
+    INSERT have the same keys: given values, then column defaults, then NULL.
+    The autoincrement key and server-side defaults are left to the database
+    unless given.
+    """
+    unknown = set(values) - set(table.c.keys())
+    if unknown:
+        raise ValueError(f"Unknown {table.name} columns: {', '.join(sorted(unknown))}")
+
+    row = {}
+    for column in table.columns:
+        if column.key in values:
+            row[column.key] = values[column.key]
+        elif column.default is not None and column.default.is_scalar:
+            row[column.key] = column.default.arg
+        elif column.default is not None and column.default.is_callable:
+            row[column.key] = column.default.arg(None)
+        elif column.default is not None and column.default.is_clause_element:
+            row[column.key] = column.default.arg
+        elif column is table.autoincrement_column or column.server_default is not None:
+            continue
+        else:
+            row[column.key] = None
+    if "created_at" in table.c and row.get("created_at") is None:
+        # Event time, not flush time
+        row["created_at"] = datetime.now(timezone.utc)
+    return row
+
+
+def _group_rows(batch: List[Tuple[Table, Dict[str, Any]]]) -> Dict[Tuple[Table, Tuple[str, ...]], List[Dict[str, Any]]]:
+    """Rows by table and key set, one multi-row INSERT each (keys differ only for database-generated columns)."""
+    groups: Dict[Tuple[Table, Tuple[str, ...]], List[Dict[str, Any]]] = defaultdict(list)
+    for table, row in batch:
+        groups[(table, tuple(row))].append(row)
+    return groups
+
+
+def _flush_threshold() -> int:
+    return min(settings.EVENT_BUFFER_BATCH_SIZE, settings.EVENT_BUFFER_MAX_SIZE)
+
+
+async def record_event(db: Session, model, values: Dict[str, Any]) -> None:
+    """Queue a row of ``model`` for the next batch insert (direct write when not buffering)."""
+    if not _running:
+        db.add(model(**values))
+        await db.commit()
+        return
+
+    table = model.__table__
+    if _queue.qsize() + 1 >= _flush_threshold():
+        _batch_ready.set()
+    # Waits when the buffer is full (backpressure)
+    await _queue.put((table, _row_values(table, values)))
+
+
+async def record_events(db: Session, model, rows: List[Dict[str, Any]]) -> None:
+    """Queue many rows of ``model`` at once (one multi-row INSERT when not buffering)."""
+    if not rows:
+        return
+    table = model.__table__
+    if not _running:
+        for group in _group_rows([(table, _row_values(table, values)) for values in rows]).values():
+            await db.execute(insert(table).values(group))
+        await db.commit()
+        return
+
+    for values in rows:
+        if _queue.qsize() + 1 >= _flush_threshold():
+            _batch_ready.set()
+        await _queue.put((table, _row_values(table, values)))
+
+
+# =========================================================
+# Flushing
+# =========================================================
+
+async def _insert_rows(table: Table, rows: List[Dict[str, Any]]):
+    async with async_session_maker() as db:
+        try:
+            await db.execute(insert(table).values(rows))
+            await db.commit()
+            metrics.record_event_buffer(table.name, "written", len(rows))
+            return
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Batch insert of {len(rows)} {table.name} rows failed, retrying one by one: {e}")
+
+        # Isolate bad rows (e.g. a user deleted meanwhile) instead of losing the batch
+        for row in rows:
+            try:
+                await db.execute(insert(table).values(row))
+                await db.commit()
+                metrics.record_event_buffer(table.name, "written", 1)
+            except Exception as e:
+                await db.rollback()
+                metrics.record_event_buffer(table.name, "dropped", 1)
+                logger.error(f"Dropped buffered {table.name} row: {e}")
+
+
+async def _write_batch(batch: List[Tuple[Table, Dict[str, Any]]]):
+    size = settings.EVENT_BUFFER_BATCH_SIZE
+    for (table, _), rows in _group_rows(batch).items():
+        for start in range(0, len(rows), size):
+            chunk = rows[start:start + size]
+            try:
+                await _insert_rows(table, chunk)
+            except Exception as e:
+                metrics.record_event_buffer(table.name, "dropped", len(chunk))
+                logger.error(f"Failed to flush {len(chunk)} buffered {table.name} rows: {e}", exc_info=True)
+
+
+def _drain(first, limit: int) -> Tuple[List[Tuple[Table, Dict[str, Any]]], bool]:
+    batch, stop = [], False
+    item = first
+    while True:
+        if item is _STOP:
+            stop = True
+        else:
+            batch.append(item)
+        if len(batch) >= limit or _queue.empty():
+            return batch, stop
+        item = _queue.get_nowait()
+
+
+async def _flush_loop():
+    interval = settings.EVENT_BUFFER_FLUSH_MS / 1000
+    batch_size = settings.EVENT_BUFFER_BATCH_SIZE
+    while True:
+        first = await _queue.get()
+        async with _writing:
+            if first is not _STOP and _queue.qsize() + 1 < _flush_threshold():
+                # Give the batch time to fill unless it already has
+                _batch_ready.clear()
+                try:
+                    await asyncio.wait_for(_batch_ready.wait(), interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch, stop = _drain(first, batch_size)
+            if batch:
+                await _write_batch(batch)
+        if stop:
+            return
+
+
+async def flush_event_buffer():
+    """Write the rows queued in this worker now, for readers that need them in the table."""
+    if not _running:
+        return
+    # Cut short the loop's batch window and wait for the rows it holds
+    _batch_ready.set()
+    async with _writing:
+        batch = []
+        while not _queue.empty():
+            item = _queue.get_nowait()
+            if item is _STOP:
+                # Leave the stop marker for the flush loop
+                _queue.put_nowait(item)
+                break
+            batch.append(item)
+        if batch:
+            await _write_batch(batch)
+
+
+def start_event_buffer():
+    """Start the flush task (called from the app lifespan)."""
+    global _queue, _batch_ready, _writing, _flush_task, _running
+    if not settings.EVENT_BUFFER_ENABLED or _flush_task is not None:
+        return
+    _queue = asyncio.Queue(maxsize=settings.EVENT_BUFFER_MAX_SIZE)
+    _batch_ready = asyncio.Event()
+    _writing = asyncio.Lock()
+    _flush_task = asyncio.create_task(_flush_loop(), name="event-buffer-flush")
+    _running = True
+
+
+async def stop_event_buffer():
+    """Stop accepting rows and flush everything still queued."""
+    global _flush_task, _running
+    if _flush_task is None:
+        return
+    _running = False
+    try:
+        if not _flush_task.done():
+            await _queue.put(_STOP)
+            await _flush_task
+        # Producers that were waiting for room when the buffer stopped
+        leftover = []
+        while not _queue.empty():
+            item = _queue.get_nowait()
+            if item is not _STOP:
+                leftover.append(item)
+        if leftover:
+            await _write_batch(leftover)
+    except Exception as e:
+        logger.error(f"Event buffer shutdown flush failed: {e}", exc_info=True)
+    finally:
+        _flush_task = None
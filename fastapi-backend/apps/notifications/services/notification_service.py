@@ -8,10 +8,20 @@ from datetime import datetime, timezone
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy import and_, func, or_, desc, select
+from sqlalchemy import and_, func, or_, desc, select, update
 
-from apps.users.models import Notification, User
+from apps.users.models import Notification, User, UserRole
 from config.database import async_session_maker
+from apps.notifications.services.event_buffer import record_event, record_events
+from apps.notifications.services.unread_counter import (
+    adjust_unread,
+    clear_unread,
+    count_new,
+    get_cached_unread,
+)
+from apps.notifications.services.retention import hot_window_conditions, in_hot_window
+from config.settings import settings
+from core.bulk import chunked, delete_by_ids, unique_ids, update_by_ids
 
 logger = logging.getLogger(__name__)
 
@@ -23,19 +33,16 @@ async def create_notification(
     message: str,
     notification_type: str,
     metadata: Optional[Dict[str, Any]] = None,
-) -> Notification:
-    notification = Notification(
+) -> None:
+    # Written by the event buffer's next batch, not on this session
+    await record_event(db, Notification, dict(
         user_id=user_id,
         title=title,
         message=message,
         notification_type=notification_type,
         meta_data=metadata or {},
-    )
-
-    db.add(notification)
-    await db.commit()
-    await db.refresh(notification)
-    return notification
+    ))
+    await count_new([user_id])
 
 
 async def create_login_notification(
@@ -44,7 +51,7 @@ async def create_login_notification(
     ip_address: Optional[str] = None,
     user_agent: Optional[str] = None,
     send_admin_email: bool = True,
-) -> Notification:
+) -> None:
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
@@ -70,7 +77,7 @@ async def create_otp_notification(
     purpose: str,
     status: str,
     ip_address: Optional[str] = None,
-) -> Notification:
+) -> None:
     user = await db.get(User, user_id)
     user_name = f"{user.first_name} {user.last_name}" if user else "User"
     purpose_map = {
@@ -109,7 +116,7 @@ async def create_password_reset_notification(
     user_id: int,
     status: str,
     ip_address: Optional[str] = None,
-) -> Notification:
+) -> None:
     user = await db.get(User, user_id)
     user_name = f"{user.first_name} {user.last_name}" if user else "User"
     if status == "requested":
@@ -142,7 +149,7 @@ async def create_certificate_notification(
     certificate_id: int,
     certificate_type: str,
     candidate_name: str,
-) -> Notification:
+) -> None:
     user = await db.get(User, user_id)
     user_name = f"{user.first_name} {user.last_name}" if user else "User"
 
@@ -161,6 +168,29 @@ async def create_certificate_notification(
     )
 
 
+async def notify_users(
+    db: Session,
+    user_ids: List[int],
+    title: str,
+    message: str,
+    notification_type: str,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> int:
+    """Fan one notification out to many users with a single multi-row insert"""
+    await record_events(db, Notification, [
+        dict(
+            user_id=user_id,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            meta_data=metadata or {},
+        )
+        for user_id in user_ids
+    ])
+    await count_new(user_ids)
+    return len(user_ids)
+
+
 async def create_query_notification(
     db: Session,
     query_id: int,
@@ -170,47 +200,45 @@ async def create_query_notification(
     query_type_name: Optional[str] = None,
     contact_number: Optional[str] = None,
     send_admin_email: bool = True,
-) -> List[Notification]:
+) -> int:
+    from apps.users.services.user_service import get_users_by_role
+
     user = await db.get(User, created_by)
     user_name = f"{user.first_name} {user.last_name}" if user else "User"
     user_email = user.email if user else "Unknown"
     user_role = str(user.role) if user and hasattr(user, "role") else "Unknown"
 
-    result = await db.execute(select(User).where(User.role.in_(["admin", "super_admin"])))
-    admin_users = result.scalars().all()
+    admins = await get_users_by_role(db, [UserRole.ADMIN, UserRole.SUPER_ADMIN])
 
-    if not admin_users:
+    if not admins:
         logger.warning("No admin users found to notify about new query")
-        return []
+        return 0
 
-    notifications = []
     query_preview = query_text[:100] + "..." if len(query_text) > 100 else query_text
 
-    for admin in admin_users:
-        notification = await create_notification(
-            db=db,
-            user_id=admin.id,
-            title="New Query Submitted",
-            message=f"{user_name} ({user_role}) submitted a new query: {query_preview}",
-            notification_type="query_submitted",
-            metadata={
-                "query_id": query_id,
-                "created_by": created_by,
-                "created_by_name": user_name,
-                "created_by_email": user_email,
-                "created_by_role": user_role,
-                "spa_name": spa_name,
-                "query_type_name": query_type_name,
-                "contact_number": contact_number,
-                "query_preview": query_preview,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            },
-        )
-        notifications.append(notification)
+    notified = await notify_users(
+        db,
+        [admin_id for admin_id, _ in admins],
+        title="New Query Submitted",
+        message=f"{user_name} ({user_role}) submitted a new query: {query_preview}",
+        notification_type="query_submitted",
+        metadata={
+            "query_id": query_id,
+            "created_by": created_by,
+            "created_by_name": user_name,
+            "created_by_email": user_email,
+            "created_by_role": user_role,
+            "spa_name": spa_name,
+            "query_type_name": query_type_name,
+            "contact_number": contact_number,
+            "query_preview": query_preview,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+    )
 
     if send_admin_email:
         try:
-            from core.utils import send_email
+            from apps.notifications.services.email_outbox import queue_email
             from config.settings import settings
 
             if not settings.SKIP_EMAIL:
@@ -227,13 +255,14 @@ async def create_query_notification(
                     f"Submitted At: {query_time}\n\n"
                     f"Query:\n{query_text}\n"
                 )
-                admin_emails = [admin.email for admin in admin_users if admin.email]
+                admin_emails = [email for _, email in admins if email]
                 if admin_emails:
-                    await send_email(subject, body, admin_emails)
+                    # Delivered by the outbox sender; query creation does not wait for SMTP
+                    await queue_email(db, subject, body, admin_emails)
         except Exception as e:
-            logger.error(f"Failed to send query notification email to admin: {e}", exc_info=True)
+            logger.error(f"Failed to queue query notification email to admin: {e}", exc_info=True)
 
-    return notifications
+    return notified
 
 
 async def handle_login_tracking_task(
@@ -319,6 +348,9 @@ async def get_user_notifications(
     if unread_only:
         stmt = stmt.where(Notification.is_read.is_(False))
 
+    # Older notifications have been (or are about to be) archived
+    stmt = stmt.where(*hot_window_conditions(Notification))
+
     result = await db.execute(
         stmt.order_by(desc(Notification.created_at)).offset(skip).limit(limit)
     )
@@ -341,8 +373,13 @@ async def mark_notification_read(
     if notification.user_id != user_id and notification.user_id is not None:
         return False
 
+    # Unread counts only cover the hot window the list shows
+    was_unread = not notification.is_read and in_hot_window(Notification, notification.created_at)
+    recipient, was_deleted = notification.user_id, notification.is_deleted
     notification.is_read = True
     await db.commit()
+    if was_unread:
+        await adjust_unread({} if was_deleted else {recipient: -1}, total=-1)
     return True
 
 
@@ -350,24 +387,26 @@ async def mark_all_notifications_read(
     db: Session,
     user_id: int,
 ) -> int:
-    result = await db.execute(
-        select(Notification).where(
-            and_(
-                or_(
-                    Notification.user_id == user_id,
-                    Notification.user_id.is_(None),
-                ),
-                Notification.is_read.is_(False),
-            )
-        )
+    unread = and_(
+        or_(
+            Notification.user_id == user_id,
+            Notification.user_id.is_(None),
+        ),
+        Notification.is_read.is_(False),
     )
-    notifications = list(result.scalars().all())
-
-    for notification in notifications:
-        notification.is_read = True
-
+    marked = []
+    # Hot-window rows first: only those are in the unread counters
+    for conditions in (hot_window_conditions(Notification), []):
+        result = await db.execute(
+            update(Notification)
+            .where(unread, *conditions)
+            .values(is_read=True)
+            .execution_options(synchronize_session=False)
+        )
+        marked.append(result.rowcount)
     await db.commit()
-    return len(notifications)
+    await clear_unread(user_id, marked[0])
+    return sum(marked)
 
 
 async def get_unread_count(
@@ -375,8 +414,13 @@ async def get_unread_count(
     user_id: int,
     is_admin: bool = False,
 ) -> int:
+    cached = await get_cached_unread(user_id, is_admin=is_admin)
+    if cached is not None:
+        return cached
+
     stmt = select(func.count()).select_from(Notification).where(
-        Notification.is_read.is_(False)
+        Notification.is_read.is_(False),
+        *hot_window_conditions(Notification),
     )
 
     if not is_admin:
@@ -394,28 +438,67 @@ async def get_unread_count(
     return result.scalar_one()
 
 
-async def delete_notification(
+async def _unread_states(db: Session, notification_ids: List[int]) -> Dict[int, tuple]:
+    """``id -> (user_id, is_deleted)`` for the counted (unread, hot-window) ones, to adjust the counters after a delete."""
+    if not settings.NOTIFICATION_COUNTERS_ENABLED:
+        return {}
+    states = {}
+    for chunk in chunked(notification_ids):
+        result = await db.execute(
+            select(Notification.id, Notification.user_id, Notification.is_deleted).where(
+                and_(Notification.id.in_(chunk), Notification.is_read.is_(False)),
+                *hot_window_conditions(Notification),
+            )
+        )
+        states.update({row.id: (row.user_id, row.is_deleted) for row in result})
+    return states
+
+
+async def delete_notifications(
     db: Session,
-    notification_id: int,
+    notification_ids: List[int],
     user_id: int,
     is_admin: bool = False,
-) -> bool:
-    result = await db.execute(
-        select(Notification).where(Notification.id == notification_id)
-    )
-    notification = result.scalar_one_or_none()
-
-    if not notification:
-        return False
+) -> List[int]:
+    """
+    Delete many notifications in chunked set-based statements (soft delete for
+    non-admin, hard delete for admin); returns the ids actually deleted.
+    """
+    notification_ids = unique_ids(notification_ids)
+    unread = await _unread_states(db, notification_ids)
+    if is_admin:
+        deleted = await delete_by_ids(db, Notification, notification_ids)
+    else:
+        deleted = await update_by_ids(
+            db,
+            Notification,
+            notification_ids,
+            {"is_deleted": True, "deleted_at": datetime.now(timezone.utc)},
+            condition=or_(
+                Notification.user_id == user_id,
+                Notification.user_id.is_(None),
+            ),
+        )
+    await db.commit()
 
-    if not is_admin:
-        if notification.user_id != user_id and notification.user_id is not None:
-            return False
+    deltas: Dict[Optional[int], int] = {}
+    total = 0
+    for notification_id in deleted:
+        if notification_id not in unread:
+            continue
+        recipient, was_deleted = unread[notification_id]
+        if not was_deleted:
+            deltas[recipient] = deltas.get(recipient, 0) - 1
+        if is_admin:
+            total -= 1
+    await adjust_unread(deltas, total=total)
+    return deleted
 
-        notification.is_deleted = True
-        notification.deleted_at = datetime.now(timezone.utc)
-    else:
-        await db.delete(notification)
 
-    await db.commit()
-    return True
+async def delete_notification(
+    db: Session,
+    notification_id: int,
+    user_id: int,
+    is_admin: bool = False,
+) -> bool:
+    return bool(await delete_notifications(db, [notification_id], user_id, is_admin))
@@ -0,0 +1,294 @@
+"""
+Audit Retention
+Hot-window retention and archival for user_activities, login_history and notifications
+
+Each audit table keeps a hot window of ``*_RETENTION_DAYS``. Older rows are
+moved to ``<table>_archive`` (compressed, no foreign keys) by a background job
+that only works between ``RETENTION_WINDOW_START_HOUR`` and
+``RETENTION_WINDOW_END_HOUR`` (UTC), ``RETENTION_BATCH_SIZE`` rows per
+``INSERT ... SELECT`` + ``DELETE`` transaction with a short pause in between.
+One worker runs it at a time (MySQL advisory lock).
+
+On MySQL the archive tables are range-partitioned by month: the job converts
+an unpartitioned archive on its first run, keeps
+``RETENTION_PARTITION_MONTHS_AHEAD`` empty months ahead of the current one, and
+drops whole partitions older than ``ARCHIVE_RETENTION_MONTHS`` when set.
+
+Reads go through ``select_retained``, which limits a query to the hot window,
+or with ``include_archived=True`` unions the hot table with its archive.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+from sqlalchemy.orm import aliased
+
+from apps.notifications.models import (
+    LoginHistory,
+    Notification,
+    UserActivity,
+    login_history_archive,
+    notifications_archive,
+    user_activities_archive,
+)
+from config.database import async_session_maker
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_RETENTION_LOCK_NAME = "audit_retention"
+
+# model -> (archive table, retention days setting)
+RETAINED = {
+    UserActivity: (user_activities_archive, "ACTIVITY_RETENTION_DAYS"),
+    LoginHistory: (login_history_archive, "LOGIN_HISTORY_RETENTION_DAYS"),
+    Notification: (notifications_archive, "NOTIFICATION_RETENTION_DAYS"),
+}
+
+
+def hot_window_start(model) -> Optional[datetime]:
+    """Oldest ``created_at`` in the hot window, or None when ``model`` is kept whole."""
+    if not settings.RETENTION_ENABLED:
+        return None
+    days = getattr(settings, RETAINED[model][1])
+    if days <= 0:
+        return None
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+def hot_window_conditions(model) -> List:
+    """``[created_at >= window start]`` for queries over the hot table, or ``[]``."""
+    start = hot_window_start(model)
+    return [] if start is None else [model.__table__.c.created_at >= start]
+
+
+def in_hot_window(model, created_at: Optional[datetime]) -> bool:
+    start = hot_window_start(model)
+    if start is None or created_at is None:
+        return True
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at >= start
+
+
+def select_retained(
+    model, criteria: Callable, include_archived: bool = False, columns: Optional[Sequence[str]] = None
+) -> Tuple:
+    """
+    ``(stmt, entity)`` selecting ``model`` rows that match ``criteria``.
+
+    ``criteria(columns)`` returns a list of conditions over a table's column
+    collection; it is applied to the hot table and, with ``include_archived``,
+    to the archive as well. Order and paginate on ``entity``'s columns.
+    ``columns`` narrows the archived union to those column names (aggregates
+    that only need a few of them).
+    """
+    table = model.__table__
+    if not include_archived:
+        conditions = [*criteria(table.c), *hot_window_conditions(model)]
+        return select(model).where(*conditions), model
+
+    archive = RETAINED[model][0]
+    names = list(columns) if columns is not None else [column.name for column in table.c]
+    rows = union_all(
+        select(*[table.c[name] for name in names]).where(*criteria(table.c)),
+        select(*[archive.c[name] for name in names]).where(*criteria(archive.c)),
+    ).subquery()
+    entity = aliased(model, rows)
+    return select(entity), entity
+
+
+# =========================================================
+# Archival
+# =========================================================
+
+async def archive_batch(db: Session, model, cutoff: datetime) -> int:
+    """Move up to ``RETENTION_BATCH_SIZE`` rows older than ``cutoff``; returns the number moved."""
+    table = model.__table__
+    archive = RETAINED[model][0]
+    result = await db.execute(
+        select(table.c.id)
+        .where(table.c.created_at < cutoff)
+        .order_by(table.c.created_at)
+        .limit(settings.RETENTION_BATCH_SIZE)
+    )
+    ids = list(result.scalars().all())
+    if not ids:
+        return 0
+
+    names = [column.name for column in table.c]
+    await db.execute(
+        insert(archive).from_select(names, select(*table.c).where(table.c.id.in_(ids)))
+    )
+    await db.execute(delete(table).where(table.c.id.in_(ids)))
+    await db.commit()
+    metrics.record_retention_archived(table.name, len(ids))
+    return len(ids)
+
+
+def in_retention_window(now: Optional[datetime] = None) -> bool:
+    hour = (now or datetime.now(timezone.utc)).hour
+    start, end = settings.RETENTION_WINDOW_START_HOUR, settings.RETENTION_WINDOW_END_HOUR
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end  # Window wraps midnight
+
+
+async def archive_model(model, force: bool = False) -> int:
+    """Archive every row of ``model`` outside its hot window, stopping if the off-hours window closes."""
+    cutoff = hot_window_start(model)
+    if cutoff is None:
+        return 0
+    moved = 0
+    while force or in_retention_window():
+        async with async_session_maker() as db:
+            count = await archive_batch(db, model, cutoff)
+        moved += count
+        if count < settings.RETENTION_BATCH_SIZE:
+            break
+        await asyncio.sleep(settings.RETENTION_BATCH_PAUSE_MS / 1000)
+    return moved
+
+
+# =========================================================
+# Monthly partitions (MySQL archive tables)
+# =========================================================
+
+def _add_months(month: date, months: int) -> date:
+    years, index = divmod(month.month - 1 + months, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def _partition_name(month: date) -> str:
+    return f"p{month:%Y%m}"
+
+
+def _partition_month(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name[1:], "%Y%m").date()
+    except ValueError:
+        return None
+
+
+def _partition_definition(month: date) -> str:
+    return f"PARTITION {_partition_name(month)} VALUES LESS THAN (TO_DAYS('{_add_months(month, 1).isoformat()}'))"
+
+
+async def ensure_archive_partitions(db: Session, archive) -> None:
+    """Partition ``archive`` by month if needed, add upcoming months and drop expired ones."""
+    result = await db.execute(
+        text(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name AND PARTITION_NAME IS NOT NULL"
+        ),
+        {"name": archive.name},
+    )
+    months = sorted(filter(None, (_partition_month(row[0]) for row in result)))
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    last_wanted = _add_months(this_month, settings.RETENTION_PARTITION_MONTHS_AHEAD)
+
+    if not months:
+        oldest = (await db.execute(select(func.min(archive.c.created_at)))).scalar()
+        month = oldest.date().replace(day=1) if oldest else this_month
+        definitions = []
+        while month <= last_wanted:
+            definitions.append(_partition_definition(month))
+            month = _add_months(month, 1)
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        await db.execute(text(
+            f"ALTER TABLE {archive.name} PARTITION BY RANGE (TO_DAYS(created_at)) ({', '.join(definitions)})"
+        ))
+        logger.info(f"Partitioned {archive.name} into {len(definitions)} monthly partitions")
+        return
+
+    upcoming = []
+    month = _add_months(months[-1], 1)
+    while month <= last_wanted:
+        upcoming.append(_partition_definition(month))
+        month = _add_months(month, 1)
+    if upcoming:
+        upcoming.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        await db.execute(text(
+            f"ALTER TABLE {archive.name} REORGANIZE PARTITION pmax INTO ({', '.join(upcoming)})"
+        ))
+
+    if settings.ARCHIVE_RETENTION_MONTHS > 0:
+        expired_before = _add_months(this_month, -settings.ARCHIVE_RETENTION_MONTHS)
+        expired = [_partition_name(month) for month in months if month < expired_before]
+        if expired:
+            await db.execute(text(f"ALTER TABLE {archive.name} DROP PARTITION {', '.join(expired)}"))
+            logger.info(f"Dropped expired archive partitions of {archive.name}: {expired}")
+
+
+# =========================================================
+# Job
+# =========================================================
+
+async def _try_retention_lock(db: Session) -> bool:
+    if db.bind.dialect.name != "mysql":
+        return True
+    result = await db.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": _RETENTION_LOCK_NAME})
+    return result.scalar() == 1
+
+
+async def _release_retention_lock(db: Session):
+    if db.bind.dialect.name == "mysql":
+        await db.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": _RETENTION_LOCK_NAME})
+
+
+async def run_retention(force: bool = False) -> Dict[str, int]:
+    """One retention pass; returns the rows archived per table."""
+    moved: Dict[str, int] = {}
+    async with async_session_maker() as lock_db:
+        if not await _try_retention_lock(lock_db):
+            logger.debug("Audit retention running in another worker")
+            return moved
+        try:
+            for model, (archive, _) in RETAINED.items():
+                count = await archive_model(model, force=force)
+                if count:
+                    moved[model.__tablename__] = count
+                    logger.info(f"Archived {count} {model.__tablename__} rows into {archive.name}")
+                if settings.RETENTION_PARTITION_ARCHIVES and lock_db.bind.dialect.name == "mysql":
+                    await ensure_archive_partitions(lock_db, archive)
+        finally:
+            await _release_retention_lock(lock_db)
+    return moved
+
+
+_retention_task: Optional[asyncio.Task] = None
+
+
+async def _retention_loop():
+    while True:
+        if in_retention_window():
+            try:
+                await run_retention()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Audit retention failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.RETENTION_CHECK_SECONDS)
+
+
+def start_retention():
+    """Start the off-hours archival task (called from the app lifespan)."""
+    global _retention_task
+    if not settings.RETENTION_ENABLED or _retention_task is not None:
+        return
+    _retention_task = asyncio.create_task(_retention_loop(), name="audit-retention")
+
+
+async def stop_retention():
+    global _retention_task
+    if _retention_task is not None:
+        _retention_task.cancel()
+        try:
+            await _retention_task
+        except asyncio.CancelledError:
+            pass
+        _retention_task = None
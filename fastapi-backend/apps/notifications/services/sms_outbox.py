@@ -0,0 +1,221 @@
+"""
+SMS Outbox
+Transactional queue of outgoing SMS delivered by a background sender
+
+``queue_sms(db, ...)`` adds an ``sms_outbox`` row to the caller's session, so
+request handlers return as soon as the message is durably queued instead of
+waiting on the provider. The sender task in every worker claims due rows the
+same way as the email outbox and sends each with a single provider request
+bounded by the time left before the message's ``deadline_at``
+(``SMS_SEND_DEADLINE_SECONDS`` by default). Failures are retried with backoff
+until the deadline, after which the row is ``expired``.
+
+While the provider's circuit breaker is open, claimed rows are put back
+without spending an attempt and retried once the breaker half-opens.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, event, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from apps.notifications.models import SmsOutbox, OutboxStatus
+from config.database import async_session_maker
+from config.settings import settings
+from core.circuit_breaker import CircuitOpenError
+from core.utils import send_sms, validate_sms_settings
+
+logger = logging.getLogger(__name__)
+
+_wakeup: Optional[asyncio.Event] = None
+_sender_task: Optional[asyncio.Task] = None
+
+
+def _wake():
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+async def queue_sms(
+    db: Session,
+    phone_number: str,
+    message: str,
+    deadline_seconds: Optional[float] = None,
+    commit: bool = True,
+) -> Optional[SmsOutbox]:
+    """
+    Queue an SMS for delivery within ``deadline_seconds``.
+
+    With ``commit=False`` the row is only added to ``db`` and goes out once the
+    caller commits its own transaction.
+    """
+    phone_number = str(phone_number).strip()
+    if not phone_number:
+        raise ValueError("Phone number is required")
+
+    if settings.SKIP_SMS:
+        logger.info("SKIP_SMS is enabled. SMS not queued.")
+        return None
+
+    now = datetime.now(timezone.utc)
+    deadline = settings.SMS_SEND_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    sms = SmsOutbox(
+        phone_number=phone_number,
+        message=str(message),
+        status=OutboxStatus.PENDING,
+        attempts=0,
+        next_attempt_at=now,
+        deadline_at=now + timedelta(seconds=deadline),
+    )
+    db.add(sms)
+    if commit:
+        await db.commit()
+        _wake()
+    else:
+        event.listen(db.sync_session, "after_commit", lambda session: _wake(), once=True)
+    return sms
+
+
+# =========================================================
+# Sender
+# =========================================================
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=settings.SMS_OUTBOX_RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+
+
+async def _claim(db: Session) -> List[SmsOutbox]:
+    now = datetime.now(timezone.utc)
+    due = or_(
+        and_(SmsOutbox.status == OutboxStatus.PENDING, SmsOutbox.next_attempt_at <= now),
+        # Lease expired: the worker sending it died
+        and_(SmsOutbox.status == OutboxStatus.SENDING, SmsOutbox.locked_until < now),
+    )
+    result = await db.execute(
+        select(SmsOutbox)
+        .where(due)
+        .order_by(SmsOutbox.id)
+        .limit(settings.SMS_OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    messages = list(result.scalars().all())
+    if messages:
+        await db.execute(
+            update(SmsOutbox)
+            .where(SmsOutbox.id.in_([sms.id for sms in messages]))
+            .values(
+                status=OutboxStatus.SENDING,
+                attempts=SmsOutbox.attempts + 1,
+                locked_until=now + timedelta(seconds=settings.SMS_OUTBOX_LEASE_SECONDS),
+            )
+            # Keep the loaded objects at their pre-claim attempt count
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+    return messages
+
+
+async def _deliver(sms: SmsOutbox) -> dict:
+    """Send one SMS; returns the column values recording the outcome."""
+    attempts = sms.attempts + 1
+    deadline = _as_utc(sms.deadline_at)
+    remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        logger.warning(f"SMS {sms.id} expired before it could be sent")
+        return {"status": OutboxStatus.EXPIRED, "locked_until": None}
+
+    try:
+        await send_sms(
+            sms.phone_number,
+            sms.message,
+            max_retries=0,
+            timeout=min(remaining, settings.SMS_TIMEOUT_SECONDS),
+        )
+    except CircuitOpenError as e:
+        # Not the message's fault: put it back without spending an attempt
+        return {
+            "status": OutboxStatus.PENDING,
+            "attempts": sms.attempts,
+            "last_error": str(e),
+            "next_attempt_at": datetime.now(timezone.utc) + timedelta(seconds=e.retry_after),
+            "locked_until": None,
+        }
+    except Exception as e:
+        next_attempt = datetime.now(timezone.utc) + _backoff(attempts)
+        if attempts >= settings.SMS_OUTBOX_MAX_ATTEMPTS:
+            logger.error(f"SMS {sms.id} failed after {attempts} attempts: {e}")
+            return {"status": OutboxStatus.FAILED, "last_error": str(e)[:2000], "locked_until": None}
+        if next_attempt >= deadline:
+            logger.error(f"SMS {sms.id} expired after {attempts} attempts: {e}")
+            return {"status": OutboxStatus.EXPIRED, "last_error": str(e)[:2000], "locked_until": None}
+        logger.warning(f"SMS {sms.id} attempt {attempts} failed, retrying: {e}")
+        return {
+            "status": OutboxStatus.PENDING,
+            "last_error": str(e)[:2000],
+            "next_attempt_at": next_attempt,
+            "locked_until": None,
+        }
+    return {"status": OutboxStatus.SENT, "sent_at": datetime.now(timezone.utc), "locked_until": None}
+
+
+async def process_outbox() -> int:
+    """Deliver the due SMS in batches until none are left; returns the number handled."""
+    is_valid, error_msg = validate_sms_settings()
+    if not is_valid:
+        logger.error("SMS configuration error, outbox not processed: %s", error_msg)
+        return 0
+
+    handled = 0
+    while True:
+        async with async_session_maker() as db:
+            messages = await _claim(db)
+            if not messages:
+                return handled
+
+            outcomes = await asyncio.gather(*(_deliver(sms) for sms in messages))
+            for sms, values in zip(messages, outcomes):
+                await db.execute(update(SmsOutbox).where(SmsOutbox.id == sms.id).values(**values))
+            await db.commit()
+            handled += len(messages)
+
+
+async def _sender_loop():
+    while True:
+        try:
+            await process_outbox()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"SMS outbox processing failed: {e}", exc_info=True)
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.SMS_OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_sms_outbox():
+    """Start the sender task (called from the app lifespan)."""
+    global _wakeup, _sender_task
+    if settings.SKIP_SMS or _sender_task is not None:
+        return
+    _wakeup = asyncio.Event()
+    _sender_task = asyncio.create_task(_sender_loop(), name="sms-outbox")
+
+
+async def stop_sms_outbox():
+    global _wakeup, _sender_task
+    if _sender_task is not None:
+        _sender_task.cancel()
+        try:
+            await _sender_task
+        except asyncio.CancelledError:
+            pass
+        _sender_task = None
+        _wakeup = None
@@ -0,0 +1,284 @@
+"""
+Unread Notification Counters
+Cached unread counts, pushed to clients over server-sent events
+
+Counts live in one Redis hash (``notif:unread``): a field per user for their
+own unread, non-deleted notifications, ``broadcast`` for unread notifications
+sent to everyone (``user_id`` NULL) and ``total`` for the admin view (every
+unread row), all limited to the retention hot window the notification list
+shows. The notification service adjusts them as it creates, reads and
+deletes notifications, and every ``NOTIFICATION_COUNTER_RECONCILE_SECONDS`` one
+worker rebuilds the hash from a single ``GROUP BY`` over ``notifications``,
+correcting any drift (including unread rows that have aged out of the hot
+window since the last rebuild). Until the first rebuild, or without Redis,
+counts come from ``COUNT(*)`` as before.
+
+A rebuild is a snapshot. A change whose counter update lands between the
+``GROUP BY`` and the swap is lost. So is a notification still in another
+worker's event buffer (up to ``EVENT_BUFFER_FLUSH_MS``). The rebuilding
+worker flushes its own buffer first. Such drift lasts until the next rebuild.
+
+Each change is published on a Redis channel and relayed by every worker to its
+open ``/stream`` connections, which then send the new count. Without Redis
+only the streams of the worker that made the change are woken; every stream
+also re-checks its count at each heartbeat.
+"""
+import asyncio
+import json
+import logging
+from collections import Counter
+from typing import AsyncIterator, Dict, Iterable, Optional, Set
+
+from sqlalchemy import func, select
+
+from apps.notifications.services.event_buffer import flush_event_buffer
+from apps.notifications.services.retention import hot_window_conditions
+from apps.users.models import Notification
+from config.database import async_session_maker
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_HASH_KEY = "notif:unread"
+_REBUILD_KEY = "notif:unread:rebuild"
+_CHANNEL = "notif:unread:changed"
+_LOCK_KEY = "notif:unread:reconcile-lock"
+_READY = "ready"  # Set by a full rebuild; without it the hash is not trusted
+_BROADCAST = "broadcast"
+_TOTAL = "total"
+_LISTEN_RETRY_SECONDS = 5
+
+
+def _field(user_id: Optional[int]) -> str:
+    return _BROADCAST if user_id is None else f"u:{user_id}"
+
+
+async def _redis():
+    if not settings.NOTIFICATION_COUNTERS_ENABLED:
+        return None
+    from config.redis import get_redis
+
+    try:
+        return await get_redis()
+    except Exception:
+        return None
+
+
+# =========================================================
+# Counters
+# =========================================================
+
+async def adjust_unread(deltas: Dict[Optional[int], int], total: int = 0):
+    """Apply count changes per recipient (``None`` = broadcast) and to the admin ``total``."""
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas and not total:
+        return
+    redis = await _redis()
+    if redis is not None:
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                for user_id, delta in deltas.items():
+                    pipe.hincrby(_HASH_KEY, _field(user_id), delta)
+                if total:
+                    pipe.hincrby(_HASH_KEY, _TOTAL, total)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Unread counter update failed: {e}")
+    await _publish(deltas.keys())
+
+
+async def count_new(user_ids: Iterable[Optional[int]]):
+    """Count freshly created (unread) notifications for ``user_ids``."""
+    deltas = Counter(user_ids)
+    await adjust_unread(deltas, total=sum(deltas.values()))
+
+
+async def clear_unread(user_id: int, marked_read: int):
+    """After a mark-all-read: the user's own and the broadcast counts drop to zero."""
+    redis = await _redis()
+    if redis is not None:
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.hset(_HASH_KEY, mapping={_field(user_id): 0, _BROADCAST: 0})
+                if marked_read:
+                    pipe.hincrby(_HASH_KEY, _TOTAL, -marked_read)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Unread counter update failed: {e}")
+    await _publish([user_id, None])
+
+
+async def get_cached_unread(user_id: int, is_admin: bool = False) -> Optional[int]:
+    """The cached count, or None when it has to be counted from the table."""
+    redis = await _redis()
+    if redis is None:
+        return None
+    try:
+        if is_admin:
+            ready, total = await redis.hmget(_HASH_KEY, [_READY, _TOTAL])
+            return max(0, int(total or 0)) if ready else None
+        ready, own, broadcast = await redis.hmget(_HASH_KEY, [_READY, _field(user_id), _BROADCAST])
+    except Exception as e:
+        logger.warning(f"Unread counter read failed: {e}")
+        return None
+    if not ready:
+        return None
+    return max(0, int(own or 0)) + max(0, int(broadcast or 0))
+
+
+async def reconcile_unread_counters() -> bool:
+    """Rebuild the hash from the table; False if skipped (no Redis, or another worker has it)."""
+    redis = await _redis()
+    if redis is None:
+        return False
+    interval = settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS
+    if not await redis.set(_LOCK_KEY, 1, nx=True, ex=max(1, int(interval * 0.9))):
+        return False
+
+    # Rows this worker has counted but not yet written must be in the snapshot
+    await flush_event_buffer()
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(Notification.user_id, Notification.is_deleted, func.count())
+            .where(Notification.is_read.is_(False), *hot_window_conditions(Notification))
+            .group_by(Notification.user_id, Notification.is_deleted)
+        )
+        rows = result.all()
+
+    fields = {_READY: 1, _TOTAL: 0, _BROADCAST: 0}
+    for user_id, is_deleted, count in rows:
+        fields[_TOTAL] += count
+        if not is_deleted:
+            fields[_field(user_id)] = count
+
+    # Build aside and swap in with RENAME: readers never see a partial hash
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.delete(_REBUILD_KEY)
+        pipe.hset(_REBUILD_KEY, mapping=fields)
+        # Fall back to COUNT(*) if reconciliation stops running
+        pipe.expire(_REBUILD_KEY, max(600, interval * 3))
+        pipe.rename(_REBUILD_KEY, _HASH_KEY)
+        await pipe.execute()
+    await _publish([None])
+    return True
+
+
+# =========================================================
+# Push (server-sent events)
+# =========================================================
+
+class _Subscriber:
+    def __init__(self, user_id: int, is_admin: bool):
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.wakeup = asyncio.Event()
+
+
+_subscribers: Set[_Subscriber] = set()
+
+
+def _dispatch(user_ids: Set[int], everyone: bool):
+    for subscriber in _subscribers:
+        if everyone or subscriber.is_admin or subscriber.user_id in user_ids:
+            subscriber.wakeup.set()
+
+
+async def _publish(user_ids: Iterable[Optional[int]]):
+    user_ids = list(user_ids)
+    everyone = None in user_ids
+    users = sorted({user_id for user_id in user_ids if user_id is not None})
+    redis = await _redis()
+    if redis is not None:
+        try:
+            # Every worker's listener, this one included, relays it to its streams
+            await redis.publish(_CHANNEL, json.dumps({"users": users, "all": everyone}))
+            return
+        except Exception as e:
+            logger.warning(f"Unread counter publish failed: {e}")
+    _dispatch(set(users), everyone)
+
+
+async def _current_count(user_id: int, is_admin: bool) -> int:
+    from apps.notifications.services.notification_service import get_unread_count
+
+    # Own short session: a stream must not hold a pooled connection while idle
+    async with async_session_maker() as db:
+        return await get_unread_count(db, user_id, is_admin=is_admin)
+
+
+async def unread_events(user_id: int, is_admin: bool = False) -> AsyncIterator[str]:
+    """SSE stream: the unread count on connect and whenever it changes."""
+    subscriber = _Subscriber(user_id, is_admin)
+    _subscribers.add(subscriber)
+    last_count = None
+    try:
+        yield f"retry: {settings.NOTIFICATION_SSE_RETRY_MS}\n\n"
+        while True:
+            subscriber.wakeup.clear()
+            count = await _current_count(user_id, is_admin)
+            if count != last_count:
+                last_count = count
+                yield f"event: unread\ndata: {json.dumps({'unread_count': count})}\n\n"
+            try:
+                await asyncio.wait_for(subscriber.wakeup.wait(), settings.NOTIFICATION_SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        _subscribers.discard(subscriber)
+
+
+async def _listen_loop():
+    while True:
+        redis = await _redis()
+        if redis is None:
+            await asyncio.sleep(_LISTEN_RETRY_SECONDS)
+            continue
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(_CHANNEL)
+            try:
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    _dispatch(set(payload.get("users") or ()), bool(payload.get("all")))
+            finally:
+                await pubsub.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Unread counter listener failed, retrying: {e}")
+            await asyncio.sleep(_LISTEN_RETRY_SECONDS)
+
+
+async def _reconcile_loop():
+    while True:
+        try:
+            await reconcile_unread_counters()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Unread counter reconciliation failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS)
+
+
+_tasks: list = []
+
+
+def start_unread_counters():
+    """Start reconciliation and the change listener (called from the app lifespan)."""
+    if not settings.NOTIFICATION_COUNTERS_ENABLED or _tasks:
+        return
+    _tasks.append(asyncio.create_task(_listen_loop(), name="unread-counter-listener"))
+    if settings.NOTIFICATION_COUNTER_RECONCILE_SECONDS > 0:
+        _tasks.append(asyncio.create_task(_reconcile_loop(), name="unread-counter-reconcile"))
+
+
+async def stop_unread_counters():
+    while _tasks:
+        task = _tasks.pop()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -11,6 +11,7 @@ import os
 
 from config.database import get_db
 from core.dependencies import require_role, get_current_active_user, get_optional_current_user
+from core.response_cache import cached_response
 from apps.users.models import User
 from apps.tutorials.schemas import (
     TutorialCreate, TutorialUpdate, TutorialResponse,
@@ -60,6 +61,7 @@ async def  create_tutorial_endpoint(
 
 
 @tutorials_router.get("", response_model=TutorialListResponse)
+@cached_response(tags=("tutorials",), ttl=300, vary_on_role=True)
 async def list_tutorials(
     skip: int = 0,
     limit: int = 100,
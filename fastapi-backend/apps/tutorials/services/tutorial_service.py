@@ -16,6 +16,7 @@ from datetime import datetime
 from apps.tutorials.models import Tutorial
 from apps.tutorials.schemas import TutorialCreate, TutorialUpdate
 from core.exceptions import NotFoundError
+from core.response_cache import invalidate_tags
 from config.settings import settings
 
 
@@ -120,6 +121,7 @@ async def  create_tutorial(
     db.add(tutorial)
     await db.commit()
     await db.refresh(tutorial)
+    await invalidate_tags("tutorials")
     return tutorial
 
 
@@ -211,6 +213,7 @@ async def update_tutorial(
     
     await db.commit()
     await db.refresh(tutorial)
+    await invalidate_tags("tutorials")
     return tutorial
 
 
@@ -231,6 +234,7 @@ async def delete_tutorial(
             delete_video_file(tutorial.video_file_path)
         await db.delete(tutorial)
         await db.commit()
+        await invalidate_tags("tutorials")
         return True
     else:
         # Soft delete
@@ -238,4 +242,5 @@ async def delete_tutorial(
         tutorial.deleted_by = deleted_by
         tutorial.deleted_at = datetime.utcnow()
         await db.commit()
+        await invalidate_tags("tutorials")
         return True
@@ -5,7 +5,7 @@ from datetime import datetime
 # pyrefly: ignore [missing-import]
 from sqlalchemy import (
     Column, Integer, String, Boolean, DateTime,
-    Enum as SQLEnum, ForeignKey, Text, JSON, Table
+    Enum as SQLEnum, ForeignKey, Text, JSON, Table, Index
 )
 # pyrefly: ignore [missing-import]
 from sqlalchemy.orm import relationship
@@ -136,6 +136,12 @@ class LoginHistory(Base):
     # Relationship to User
     user = relationship("User", back_populates="login_history")
 
+    __table_args__ = (
+        # Hot-window reads and the retention job's range scans
+        Index("idx_login_history_user_created", "user_id", "created_at"),
+        Index("idx_login_history_created", "created_at"),
+    )
+
 
 class Notification(Base):
     """Notification Model - System notifications for users"""
@@ -160,6 +166,11 @@ class Notification(Base):
     # Relationship to User
     user = relationship("User", back_populates="notifications")
 
+    __table_args__ = (
+        Index("idx_notifications_user_created", "user_id", "created_at"),
+        Index("idx_notifications_created", "created_at"),
+    )
+
 
 class UserActivity(Base):
     """User Activity Model - Track all user activities"""
@@ -185,3 +196,8 @@ class UserActivity(Base):
     
     # Relationship to User
     user = relationship("User", back_populates="activities")
+
+    __table_args__ = (
+        Index("idx_user_activities_user_created", "user_id", "created_at"),
+        Index("idx_user_activities_created", "created_at"),
+    )
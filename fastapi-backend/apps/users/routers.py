@@ -3,8 +3,10 @@ User Routers
 API endpoints for user management and authentication
 """
 import logging
+from datetime import date
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, BackgroundTasks, Query
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from config.database import get_db
 from apps.users.schemas import (
@@ -35,14 +37,16 @@ from apps.users.services.user_service import (
     get_all_users,
     get_spa_user_counts,
     generate_secure_password,
+    user_export_query,
 )
 from apps.users.services.auth_service import create_token_response, create_access_token
 from apps.notifications.services.notification_service import handle_login_tracking_task
 from apps.users.services.otp_service import generate_otp, generate_phone_otp, verify_otp
 from core.dependencies import get_current_user, get_current_active_user, require_role
-from apps.users.models import User
-from core.exceptions import AuthenticationError, ValidationError, NotFoundError
+from apps.users.models import User, UserRole
+from core.exceptions import AuthenticationError, ValidationError, NotFoundError, ServiceUnavailableError
 from config.settings import settings
+from core.export import EXPORT_FORMAT_PATTERN, export_response
 
 auth_router = APIRouter()
 users_router = APIRouter()
@@ -474,6 +478,8 @@ async def request_phone_login_otp(
     except ValidationError as e:
         error_detail = getattr(e, 'message', str(e))
         raise HTTPException(status_code=422, detail=error_detail)
+    except ServiceUnavailableError as e:
+        raise HTTPException(status_code=503, detail=e.message)
     except Exception as e:
         logger.exception("Phone OTP request failed for user=%s", user.id)
         raise HTTPException(status_code=500, detail=f"Failed to send OTP: {str(e)}")
@@ -824,6 +830,23 @@ async def list_users(
         raise HTTPException(status_code=500, detail=f"Failed to retrieve users: {str(e)}")
 
 
+@users_router.get("/export")
+async def export_users(
+    file_format: str = Query("csv", alias="format", pattern=EXPORT_FORMAT_PATTERN),
+    date_from: Optional[date] = Query(None, description="Joined on or after (UTC)"),
+    date_to: Optional[date] = Query(None, description="Joined on or before (UTC)"),
+    spa_id: Optional[int] = None,
+    role: Optional[UserRole] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_role("admin", "super_admin"))
+):
+    """Stream every matching user as CSV or XLSX (Admin/Super Admin only)"""
+    # The export reads through its own cursor session; release this one now
+    await db.close()
+    stmt = user_export_query(date_from=date_from, date_to=date_to, spa_id=spa_id, role=role)
+    return export_response(stmt, "users", file_format)
+
+
 @users_router.get("/spa-counts", response_model=list[SpaUserCountSchema])
 async def list_spa_user_counts(
     db: Session = Depends(get_db),
@@ -935,7 +958,9 @@ async def delete_user(
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
     
     from sqlalchemy import delete as sql_delete
+    from apps.users.services.user_service import invalidate_role_index
     stmt = sql_delete(User).where(User.id == user_id)
     await db.execute(stmt)
     await db.commit()
+    invalidate_role_index()
     return None
@@ -1,17 +1,18 @@
 """
 OTP Service
-Handles OTP generation and verification using SQLAlchemy
+Handles OTP generation and verification (storage lives in otp_store)
 """
-from datetime import datetime, timedelta, timezone
 import logging
 import random
 from typing import Optional
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession as Session
-from sqlalchemy import select, and_
-from apps.users.models import OTP, User
-from core.exceptions import ValidationError
-from core.utils import send_email, send_sms
+from sqlalchemy import select
+from apps.users.models import User
+from apps.users.services.otp_store import VERIFIED, consume_otp, issue_otp
+from core.circuit_breaker import OPEN
+from core.exceptions import ServiceUnavailableError, ValidationError
+from core.utils import get_sms_breaker
 
 logger = logging.getLogger(__name__)
 
@@ -21,16 +22,6 @@ def normalize_otp_code(code: str) -> str:
     return "".join(ch for ch in str(code or "").strip() if ch.isdigit())
 
 
-def _ensure_timezone_aware(dt: datetime) -> datetime:
-    """
-    Ensure a datetime is timezone-aware (UTC).
-    If it's timezone-naive, assume it's UTC and make it aware.
-    """
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt
-
-
 async def generate_otp(db: Session, user_id: int, purpose: str) -> str:
     """Generate and store OTP"""
     # Validate user exists
@@ -42,81 +33,38 @@ async def generate_otp(db: Session, user_id: int, purpose: str) -> str:
 
     # Generate 6-digit OTP
     code = str(random.randint(100000, 999999))
-    
-    # Set expiration (10 minutes)
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
-    
-    otp = OTP(
-        user_id=user_id,
-        code=code,
-        purpose=purpose,
-        is_used=False,
-        expires_at=expires_at,
-    )
-    
-    db.add(otp)
-    await db.commit()
-    await db.refresh(otp)
 
     subject = _get_otp_subject(purpose)
     body = _build_otp_body(user.full_name, code, purpose)
     html_body = _build_otp_html_template(user.full_name, code, purpose)
 
-    import logging
-    import time
     from config.settings import settings
-    logger = logging.getLogger(__name__)
-
-    logger.info(
-        "Generated OTP id=%s for user=%s purpose=%s",
-        otp.id,
-        user.email,
-        purpose,
-    )
-    logger.debug(
-        "Preparing OTP email: recipient=%s subject=%s body_type=%s html_type=%s smtp_host=%s smtp_port=%s",
-        user.email,
-        subject,
-        type(body),
-        type(html_body),
-        settings.SMTP_HOST,
-        settings.SMTP_PORT,
-    )
 
     # Check if email should be skipped (development mode)
     if settings.SKIP_EMAIL:
+        store = await issue_otp(db, user_id, purpose, code)
         logger.info(
-            "SKIP_EMAIL is enabled. OTP code %s generated for user %s (purpose: %s) but email not sent.",
+            "SKIP_EMAIL is enabled. OTP code %s generated for user %s (purpose: %s, store: %s) but email not sent.",
             code,
             user.email,
             purpose,
+            store,
         )
         return code
 
-    send_start = time.perf_counter()
-    try:
-        await send_email(subject, body, user.email, html_body=html_body)
-        send_duration = time.perf_counter() - send_start
-        logger.info(
-            "OTP email sent successfully to %s | otp_id=%s | purpose=%s | duration=%.3fs",
-            user.email,
-            otp.id,
-            purpose,
-            send_duration,
-        )
-    except Exception as e:
-        logger.exception(
-            "Failed to send OTP email for otp_id=%s to %s",
-            otp.id,
-            user.email,
-        )
-        error_msg = str(e)
-        if purpose in ("login", "password_reset"):
-            raise ValidationError(f"Failed to send OTP email: {error_msg}")
-        logger.info(
-            "Registration/OTP generation succeeded despite email failure. OTP: %s",
-            code,
-        )
+    # A database-held OTP commits together with its email; the outbox sender delivers it
+    from apps.notifications.services.email_outbox import queue_email
+
+    store = await issue_otp(db, user_id, purpose, code, commit=False)
+    email = await queue_email(db, subject, body, user.email, html_body=html_body, commit=False)
+    await db.commit()
+    logger.info(
+        "Generated OTP for user=%s purpose=%s store=%s | email queued id=%s",
+        user.email,
+        purpose,
+        store,
+        email.id if email else None,
+    )
 
     return code
 
@@ -131,73 +79,47 @@ async def generate_phone_otp(db: Session, user_id: int, purpose: str = "phone_lo
     if not user.phone_number:
         raise ValidationError("Phone number is not linked to this user")
 
-    code = str(random.randint(100000, 999999))
-    expires_at = datetime.now(timezone.utc) + timedelta(minutes=10)
-
-    # A new OTP request should make previous unused OTPs invalid, otherwise an
-    # accidental duplicate frontend call can leave several valid codes in play.
-    existing_stmt = select(OTP).where(
-        and_(
-            OTP.user_id == user_id,
-            OTP.purpose == purpose,
-            OTP.is_used == False,
+    # Fail fast instead of queueing a code the provider cannot deliver in time
+    breaker = get_sms_breaker()
+    if breaker.state == OPEN:
+        raise ServiceUnavailableError(
+            f"SMS service is temporarily unavailable, please try again in {int(breaker.retry_after()) + 1} seconds"
         )
-    )
-    existing_result = await db.execute(existing_stmt)
-    previous_active_otps = existing_result.scalars().all()
-    for previous_otp in previous_active_otps:
-        previous_otp.is_used = True
-
-    otp = OTP(
-        user_id=user_id,
-        code=code,
-        purpose=purpose,
-        is_used=False,
-        expires_at=expires_at,
-    )
 
-    db.add(otp)
-    await db.commit()
-    await db.refresh(otp)
+    code = str(random.randint(100000, 999999))
 
-    import logging
     from config.settings import settings
-    logger = logging.getLogger(__name__)
-
-    logger.info(
-        "Generated phone OTP id=%s user=%s purpose=%s code=%s expires_at=%s invalidated_previous=%s",
-        otp.id,
-        user.id,
-        purpose,
-        code,
-        otp.expires_at,
-        len(previous_active_otps),
-    )
 
+    # Issuing replaces any previous code, otherwise an accidental duplicate
+    # frontend call can leave several valid codes in play.
     if settings.SKIP_SMS:
+        store = await issue_otp(db, user_id, purpose, code)
         logger.info(
-            "SKIP_SMS is enabled. Phone OTP generated for user=%s purpose=%s but SMS not sent.",
+            "SKIP_SMS is enabled. Phone OTP generated for user=%s purpose=%s store=%s code=%s but SMS not sent.",
             user.id,
             purpose,
+            store,
+            code,
         )
         return code
 
     # This text must match the approved Hilite/DLT template exactly.
     message = f"Dear Customer, your Code for login to Spa Advisor is {code}. This Code is valid for 1 minutes. Do not share this OTP with anyone. Thank You"
 
-    try:
-        await send_sms(user.phone_number, message)
-        logger.info("Phone OTP sent successfully to user=%s otp_id=%s", user.id, otp.id)
-    except Exception as e:
-        logger.exception("Failed to send phone OTP for otp_id=%s user=%s", otp.id, user.id)
-        logger.info(
-            "Phone OTP remains unused for debugging/manual verification otp_id=%s user=%s code=%s expires_at=%s",
-            otp.id,
-            user.id,
-            code,
-            otp.expires_at,
-        )
-        raise ValidationError(f"Failed to send phone OTP: {str(e)}")
+    # A database-held OTP commits together with its SMS; the SMS outbox sender delivers it
+    from apps.notifications.services.sms_outbox import queue_sms
+
+    store = await issue_otp(db, user_id, purpose, code, commit=False)
+    sms = await queue_sms(db, user.phone_number, message, commit=False)
+    await db.commit()
+    logger.info(
+        "Generated phone OTP user=%s purpose=%s store=%s code=%s sms_id=%s",
+        user.id,
+        purpose,
+        store,
+        code,
+        sms.id if sms else None,
+    )
 
     return code
 
@@ -346,7 +268,7 @@ def _build_otp_html_template(full_name: str, code: str, purpose: str) -> str:
 
 
 async def verify_otp(db: Session, user_id: int, code: str, purpose: str) -> bool:
-    """Verify OTP"""
+    """Verify OTP, consuming it on success"""
     normalized_code = normalize_otp_code(code)
     if not normalized_code:
         logger.info(
@@ -357,20 +279,11 @@ async def verify_otp(db: Session, user_id: int, code: str, purpose: str) -> bool
         )
         return False
 
-    now = datetime.now(timezone.utc)
-    stmt = select(OTP).where(
-        and_(
-            OTP.user_id == user_id,
-            OTP.purpose == purpose,
-        )
-    ).order_by(OTP.created_at.desc(), OTP.id.desc()).limit(5)
-    result = await db.execute(stmt)
-    recent_otps = result.scalars().all()
-    otp = recent_otps[0] if recent_otps else None
-    
-    if not otp:
+    outcome = await consume_otp(db, user_id, purpose, normalized_code)
+    if outcome != VERIFIED:
         logger.info(
-            "OTP verification failed: no OTP rows user_id=%s purpose=%s entered_otp=%s",
+            "OTP verification failed: %s user_id=%s purpose=%s entered_otp=%s",
+            outcome,
             user_id,
             purpose,
             normalized_code,
@@ -378,80 +291,8 @@ async def verify_otp(db: Session, user_id: int, code: str, purpose: str) -> bool
         return False
 
     logger.info(
-        "Recent OTP rows user_id=%s purpose=%s rows=%s",
-        user_id,
-        purpose,
-        [
-            {
-                "id": recent_otp.id,
-                "code": recent_otp.code,
-                "is_used": recent_otp.is_used,
-                "created_at": str(recent_otp.created_at),
-                "expires_at": str(recent_otp.expires_at),
-            }
-            for recent_otp in recent_otps
-        ],
-    )
-
-    db_code = normalize_otp_code(otp.code)
-    expires_at = _ensure_timezone_aware(otp.expires_at)
-    logger.info(
-        "OTP verification debug user_id=%s purpose=%s latest_otp_id=%s entered_otp=%s db_otp=%s is_used=%s created_at=%s expires_at=%s now=%s",
+        "OTP verification succeeded user_id=%s purpose=%s",
         user_id,
         purpose,
-        otp.id,
-        normalized_code,
-        db_code,
-        otp.is_used,
-        otp.created_at,
-        expires_at,
-        now,
     )
-
-    if otp.is_used:
-        logger.info(
-            "OTP verification failed: latest OTP already used otp_id=%s user_id=%s purpose=%s",
-            otp.id,
-            user_id,
-            purpose,
-        )
-        return False
-    
-    if now > expires_at:
-        logger.info(
-            "OTP verification failed: expired otp_id=%s user_id=%s purpose=%s entered_otp=%s db_otp=%s expires_at=%s now=%s",
-            otp.id,
-            user_id,
-            purpose,
-            normalized_code,
-            db_code,
-            expires_at,
-            now,
-        )
-        otp.is_used = True
-        await db.commit()
-        return False
-
-    if db_code != normalized_code:
-        logger.info(
-            "OTP verification failed: latest OTP mismatch otp_id=%s user_id=%s purpose=%s entered_otp=%s db_otp=%s",
-            otp.id,
-            user_id,
-            purpose,
-            normalized_code,
-            db_code,
-        )
-        return False
-    
-    otp.is_used = True
-    await db.commit()
-
-    logger.info(
-        "OTP verification succeeded otp_id=%s user_id=%s purpose=%s",
-        otp.id,
-        user_id,
-        purpose,
-    )
-    
     return True
-
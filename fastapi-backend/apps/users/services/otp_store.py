@@ -0,0 +1,334 @@
+"""
+OTP Store
+Where issued OTPs live until they are verified or expire
+
+``RedisOTPStore`` keeps one hash per (purpose, user) with a native TTL of
+``OTP_TTL_SECONDS``; issuing a new code replaces the previous one. Verification
+is a single Lua script that compares, consumes on success and counts failed
+guesses, burning the code after ``OTP_MAX_ATTEMPTS`` wrong ones. Issuing also
+retires any unused ``otps`` rows for the (purpose, user).
+
+``DatabaseOTPStore`` is the ``otps`` table, used when ``OTP_STORE=database``
+or Redis is unreachable. A code Redis does not know is looked up there only
+when the table holds a live row, since it may have been issued during a Redis
+outage. Wrong guesses against the table count towards ``OTP_MAX_ATTEMPTS``
+too: in Redis when it is reachable, otherwise per worker. Used and expired
+rows are deleted by a periodic purge every ``OTP_PURGE_INTERVAL_SECONDS``.
+"""
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from apps.users.models import OTP
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Verification outcomes
+VERIFIED = "verified"
+MISMATCH = "mismatch"
+MISSING = "missing"  # Never issued, already used or expired
+LOCKED = "locked"  # Too many wrong guesses; the code was burned
+
+_REDIS_PREFIX = "otp"
+_TABLE_ATTEMPTS_PREFIX = "otp-table-attempts"
+
+# (user_id, purpose) -> (wrong guesses, monotonic expiry); used while Redis is unreachable
+_local_table_attempts: Dict[Tuple[int, str], Tuple[int, float]] = {}
+
+# KEYS[1] otp hash, ARGV[1] entered code, ARGV[2] max attempts
+# Returns 1 verified, 0 mismatch, -1 missing, -2 locked
+_VERIFY_SCRIPT = """
+local code = redis.call("HGET", KEYS[1], "code")
+if not code then
+    return -1
+end
+if code == ARGV[1] then
+    redis.call("DEL", KEYS[1])
+    return 1
+end
+local attempts = redis.call("HINCRBY", KEYS[1], "attempts", 1)
+if attempts >= tonumber(ARGV[2]) then
+    redis.call("DEL", KEYS[1])
+    return -2
+end
+return 0
+"""
+
+_SCRIPT_OUTCOMES = {1: VERIFIED, 0: MISMATCH, -1: MISSING, -2: LOCKED}
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _table_attempts_key(user_id: int, purpose: str) -> str:
+    return f"{_TABLE_ATTEMPTS_PREFIX}:{purpose}:{user_id}"
+
+
+async def _retire_codes(db: Session, user_id: int, purpose: str):
+    """Mark every unused ``otps`` row for (user, purpose) as used, in one statement."""
+    await db.execute(
+        update(OTP)
+        .where(and_(OTP.user_id == user_id, OTP.purpose == purpose, OTP.is_used == False))
+        .values(is_used=True)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def _count_table_mismatch(redis, user_id: int, purpose: str) -> int:
+    """Record a wrong guess against the table-held code; returns the guesses so far."""
+    if redis is not None:
+        try:
+            key = _table_attempts_key(user_id, purpose)
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, settings.OTP_TTL_SECONDS)
+                attempts, _ = await pipe.execute()
+            return int(attempts)
+        except Exception as e:
+            logger.warning(f"Redis OTP attempt counter failed, counting in this worker: {e}")
+    now = time.monotonic()
+    attempts, expires = _local_table_attempts.get((user_id, purpose), (0, 0.0))
+    if expires <= now:
+        attempts = 0
+    _local_table_attempts[(user_id, purpose)] = (attempts + 1, now + settings.OTP_TTL_SECONDS)
+    return attempts + 1
+
+
+async def _reset_table_attempts(redis, user_id: int, purpose: str):
+    _local_table_attempts.pop((user_id, purpose), None)
+    if redis is not None:
+        try:
+            await redis.delete(_table_attempts_key(user_id, purpose))
+        except Exception as e:
+            logger.warning(f"Could not reset the Redis OTP attempt counter: {e}")
+
+
+class RedisOTPStore:
+    name = "redis"
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def _key(user_id: int, purpose: str) -> str:
+        return f"{_REDIS_PREFIX}:{purpose}:{user_id}"
+
+    async def issue(self, db: Session, user_id: int, purpose: str, code: str, commit: bool = True):
+        # A code issued to the table during a Redis outage must not stay valid
+        await _retire_codes(db, user_id, purpose)
+        if commit:
+            await db.commit()
+        key = self._key(user_id, purpose)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"code": code, "attempts": 0})
+            pipe.expire(key, settings.OTP_TTL_SECONDS)
+            pipe.delete(_table_attempts_key(user_id, purpose))
+            await pipe.execute()
+        _local_table_attempts.pop((user_id, purpose), None)
+
+    async def verify(self, db: Session, user_id: int, purpose: str, code: str) -> str:
+        result = await self.redis.eval(
+            _VERIFY_SCRIPT, 1, self._key(user_id, purpose), code, max(1, settings.OTP_MAX_ATTEMPTS)
+        )
+        return _SCRIPT_OUTCOMES.get(int(result), MISSING)
+
+
+class DatabaseOTPStore:
+    name = "database"
+
+    async def issue(self, db: Session, user_id: int, purpose: str, code: str, commit: bool = True):
+        # Only the newest code is valid: retire the previous ones
+        await _retire_codes(db, user_id, purpose)
+        _local_table_attempts.pop((user_id, purpose), None)
+        db.add(OTP(
+            user_id=user_id,
+            code=code,
+            purpose=purpose,
+            is_used=False,
+            expires_at=datetime.now(timezone.utc) + timedelta(seconds=settings.OTP_TTL_SECONDS),
+        ))
+        if commit:
+            await db.commit()
+
+    async def has_live_code(self, db: Session, user_id: int, purpose: str) -> bool:
+        result = await db.execute(
+            select(OTP.id)
+            .where(and_(
+                OTP.user_id == user_id,
+                OTP.purpose == purpose,
+                OTP.is_used == False,
+                OTP.expires_at > datetime.now(timezone.utc),
+            ))
+            .limit(1)
+        )
+        return result.first() is not None
+
+    async def verify(self, db: Session, user_id: int, purpose: str, code: str) -> str:
+        from apps.users.services.otp_service import normalize_otp_code
+
+        result = await db.execute(
+            select(OTP)
+            .where(and_(OTP.user_id == user_id, OTP.purpose == purpose))
+            .order_by(OTP.created_at.desc(), OTP.id.desc())
+            .limit(1)
+        )
+        otp = result.scalar_one_or_none()
+        if otp is None or otp.is_used:
+            return MISSING
+
+        if datetime.now(timezone.utc) > _as_utc(otp.expires_at):
+            otp.is_used = True
+            await db.commit()
+            return MISSING
+
+        if normalize_otp_code(otp.code) != code:
+            return MISMATCH
+
+        otp.is_used = True
+        await db.commit()
+        return VERIFIED
+
+
+_database_store = DatabaseOTPStore()
+
+
+async def _redis():
+    from config.redis import get_redis
+
+    try:
+        return await get_redis()
+    except Exception:
+        return None
+
+
+async def get_otp_store():
+    """The configured store; ``auto`` picks Redis whenever it is reachable."""
+    mode = settings.OTP_STORE.lower()
+    if mode == "database":
+        return _database_store
+    redis = await _redis()
+    if redis is None:
+        if mode == "redis":
+            logger.warning("OTP_STORE=redis but Redis is unavailable; using the otps table")
+        return _database_store
+    return RedisOTPStore(redis)
+
+
+async def issue_otp(db: Session, user_id: int, purpose: str, code: str, commit: bool = True) -> str:
+    """
+    Store ``code`` as the only valid OTP for (user, purpose); returns the store
+    name. With ``commit=False`` a database-held code is only added to ``db``.
+    """
+    store = await get_otp_store()
+    if store is not _database_store:
+        try:
+            await store.issue(db, user_id, purpose, code, commit=commit)
+            return store.name
+        except Exception as e:
+            logger.warning(f"Redis OTP store failed, falling back to the otps table: {e}")
+            store = _database_store
+    await store.issue(db, user_id, purpose, code, commit=commit)
+    return store.name
+
+
+async def consume_otp(db: Session, user_id: int, purpose: str, code: str) -> str:
+    """Check ``code`` and consume it on a match; returns the verification outcome."""
+    store = await get_otp_store()
+    redis = None
+    if store is not _database_store:
+        redis = store.redis
+        try:
+            outcome = await store.verify(db, user_id, purpose, code)
+            if outcome != MISSING:
+                metrics.record_otp_verification(store.name, outcome)
+                return outcome
+        except Exception as e:
+            logger.warning(f"Redis OTP store failed, falling back to the otps table: {e}")
+            redis = None
+        else:
+            # Not in Redis: only a code issued to the table while Redis was down can match
+            if not await _database_store.has_live_code(db, user_id, purpose):
+                metrics.record_otp_verification(store.name, MISSING)
+                return MISSING
+        store = _database_store
+
+    outcome = await store.verify(db, user_id, purpose, code)
+    if outcome == MISMATCH:
+        if await _count_table_mismatch(redis, user_id, purpose) >= max(1, settings.OTP_MAX_ATTEMPTS):
+            await _retire_codes(db, user_id, purpose)
+            await db.commit()
+            await _reset_table_attempts(redis, user_id, purpose)
+            outcome = LOCKED
+    elif outcome == VERIFIED:
+        await _reset_table_attempts(redis, user_id, purpose)
+    metrics.record_otp_verification(store.name, outcome)
+    return outcome
+
+
+# =========================================================
+# Purge (database store)
+# =========================================================
+
+async def purge_otps() -> int:
+    """Delete used and expired ``otps`` rows in batches; returns the number deleted."""
+    from config.database import async_session_maker
+
+    deleted = 0
+    while True:
+        async with async_session_maker() as db:
+            result = await db.execute(
+                select(OTP.id)
+                .where(or_(OTP.is_used == True, OTP.expires_at < datetime.now(timezone.utc)))
+                .limit(settings.OTP_PURGE_BATCH_SIZE)
+            )
+            ids = list(result.scalars().all())
+            if not ids:
+                return deleted
+            await db.execute(delete(OTP).where(OTP.id.in_(ids)))
+            await db.commit()
+            deleted += len(ids)
+        if len(ids) < settings.OTP_PURGE_BATCH_SIZE:
+            return deleted
+
+
+_purge_task: Optional[asyncio.Task] = None
+
+
+async def _purge_loop():
+    while True:
+        try:
+            deleted = await purge_otps()
+            if deleted:
+                logger.info(f"Purged {deleted} used or expired OTP rows")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"OTP purge failed: {e}", exc_info=True)
+        await asyncio.sleep(settings.OTP_PURGE_INTERVAL_SECONDS)
+
+
+def start_otp_purge():
+    """Start the periodic purge task (called from the app lifespan)."""
+    global _purge_task
+    if settings.OTP_PURGE_INTERVAL_SECONDS <= 0 or _purge_task is not None:
+        return
+    _purge_task = asyncio.create_task(_purge_loop(), name="otp-purge")
+
+
+async def stop_otp_purge():
+    global _purge_task
+    if _purge_task is not None:
+        _purge_task.cancel()
+        try:
+            await _purge_task
+        except asyncio.CancelledError:
+            pass
+        _purge_task = None
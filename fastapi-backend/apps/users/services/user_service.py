@@ -2,10 +2,11 @@
 User Service
 Business logic for user operations using SQLAlchemy
 """
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List, Tuple
 from datetime import datetime, timezone
 import secrets
 import string
+import time
 from sqlalchemy.ext.asyncio import AsyncSession as Session
 from sqlalchemy import select, or_, func
 from sqlalchemy.orm import selectinload
@@ -13,6 +14,7 @@ from passlib.context import CryptContext
 from apps.users.models import User, UserRole
 from apps.forms_app.models import SPA
 from core.exceptions import NotFoundError, ValidationError
+from config.settings import settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -112,6 +114,7 @@ async def  create_user(
     db.add(user)
     await db.commit()
     await db.refresh(user)
+    invalidate_role_index()
     
     # Record current spa in history if provided
     if spa_id:
@@ -289,10 +292,43 @@ async def update_user(db: Session, user_id: int, update_data: dict) -> User:
     user.updated_at = datetime.now(timezone.utc)
     await db.commit()
     await db.refresh(user)
+    invalidate_role_index()
     
     return user
 
 
+# =========================================================
+# Role index (notification fan-out recipients)
+# =========================================================
+
+# role -> (loaded_at, [(user_id, email)]); per worker, refreshed after
+# USER_ROLE_INDEX_TTL_SECONDS or when this worker changes a user
+_role_index: Dict[str, Tuple[float, List[Tuple[int, Optional[str]]]]] = {}
+
+
+def invalidate_role_index():
+    _role_index.clear()
+
+
+async def get_users_by_role(db: Session, roles: Iterable[UserRole]) -> List[Tuple[int, Optional[str]]]:
+    """``(user_id, email)`` of every user holding one of ``roles``"""
+    roles = [UserRole(role) for role in roles]
+    now = time.monotonic()
+    ttl = settings.USER_ROLE_INDEX_TTL_SECONDS
+    missing = [role for role in roles if role not in _role_index or now - _role_index[role][0] > ttl]
+    if missing:
+        result = await db.execute(
+            select(User.role, User.id, User.email).where(User.role.in_(missing)).order_by(User.id)
+        )
+        loaded: Dict[UserRole, List[Tuple[int, Optional[str]]]] = {role: [] for role in missing}
+        for role, user_id, email in result.all():
+            loaded[UserRole(role)].append((user_id, email))
+        for role, members in loaded.items():
+            _role_index[role] = (now, members)
+
+    return [member for role in roles for member in _role_index[role][1]]
+
+
 async def get_all_users(db: Session, skip: int = 0, limit: int = 1000) -> List[User]:
     """Get all users with pagination"""
     stmt = select(User).options(selectinload(User.branch)).offset(skip).limit(limit)
@@ -300,6 +336,42 @@ async def get_all_users(db: Session, skip: int = 0, limit: int = 1000) -> List[U
     return list(result.scalars().all())
 
 
+def user_export_query(
+    date_from=None,
+    date_to=None,
+    spa_id: Optional[int] = None,
+    role: Optional[UserRole] = None,
+):
+    """Column select of users (joined-on date range) for a streaming export"""
+    from core.export import date_range
+
+    conditions = date_range(User.created_at, date_from, date_to)
+    if spa_id is not None:
+        conditions.append(User.spa_id == spa_id)
+    if role is not None:
+        conditions.append(User.role == role)
+    return (
+        select(
+            User.id,
+            User.username,
+            User.email,
+            User.first_name,
+            User.last_name,
+            User.phone_number,
+            User.role,
+            User.spa_id,
+            SPA.name.label("spa_name"),
+            User.is_active,
+            User.is_verified,
+            User.last_login_at,
+            User.created_at,
+        )
+        .outerjoin(SPA, SPA.id == User.spa_id)
+        .where(*conditions)
+        .order_by(User.id)
+    )
+
+
 async def get_spa_user_counts(db: Session) -> List[dict]:
     """Return how many users are associated with each SPA."""
     stmt = (
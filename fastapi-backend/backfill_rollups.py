@@ -0,0 +1,32 @@
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+
+from config.database import async_session_maker, engine
+from apps.analytics.services.rollup_service import backfill_rollups
+
+# Rebuild analytics_rollups for a date range, e.g.
+#   python backfill_rollups.py --days 365
+#   python backfill_rollups.py --start 2025-01-01 --end 2025-07-01
+# Windows are recomputed idempotently, so re-running a range is safe.
+
+
+async def backfill(start: datetime, end: datetime):
+    try:
+        async with async_session_maker() as db:
+            written = await backfill_rollups(db, start, end)
+        print(f"Backfilled {start:%Y-%m-%d} .. {end:%Y-%m-%d %H:%M}: {written} hourly rows")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill analytics rollups")
+    parser.add_argument("--days", type=int, default=90, help="Days of history to roll up (ignored with --start)")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Start date (UTC), e.g. 2025-01-01")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="End date (UTC), defaults to now")
+    args = parser.parse_args()
+
+    end = args.end or datetime.utcnow()
+    start = args.start or end - timedelta(days=args.days)
+    asyncio.run(backfill(start, end))
@@ -0,0 +1,92 @@
+import asyncio
+import httpx
+import re
+import time
+import statistics
+from datetime import datetime
+
+from benchmark_endpoints import BASE_URL, API_PREFIX, authenticate
+
+# Dashboard analytics endpoints. Each response carries a Server-Timing header
+# with the number of SQL statements it issued, so the round-trip count is
+# reported next to the latency.
+SAMPLES = 20
+
+ENDPOINTS = [
+    {"name": "Analytics Overall", "url": "/analytics"},
+    {"name": "Analytics Candidates", "url": "/analytics/candidates"},
+    {"name": "Analytics Certificates", "url": "/analytics/certificates"},
+    {"name": "Consolidated Analytics", "url": "/analytics/overview"},
+]
+
+_QUERY_COUNT = re.compile(r'desc="(\d+) queries"')
+
+
+async def benchmark_endpoint(client, name, url):
+    latencies = []
+    query_counts = []
+    print(f"Testing {name} ({url})...")
+
+    full_url = f"{API_PREFIX}{url}"
+
+    for i in range(SAMPLES):
+        start_time = time.perf_counter()
+        try:
+            response = await client.get(full_url)
+            latency = (time.perf_counter() - start_time) * 1000  # ms
+            if response.status_code != 200:
+                print(f"  [Error] {name} [{i+1}/{SAMPLES}]: Status {response.status_code}")
+                break
+            latencies.append(latency)
+            match = _QUERY_COUNT.search(response.headers.get("server-timing", ""))
+            if match:
+                query_counts.append(int(match.group(1)))
+        except Exception as e:
+            print(f"  [Error] {name} [{i+1}/{SAMPLES}]: {e}")
+
+    if latencies:
+        latencies.sort()
+        avg = statistics.mean(latencies)
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        queries = max(query_counts) if query_counts else None
+        print(f"  Average: {avg:.2f}ms | p95: {p95:.2f}ms | SQL statements: {queries if queries is not None else 'n/a'}")
+        return {"name": name, "avg": avg, "p95": p95, "queries": queries}
+    return None
+
+
+async def main():
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+        "Accept": "application/json",
+    }
+
+    async with httpx.AsyncClient(
+        base_url=BASE_URL,
+        timeout=30.0,
+        follow_redirects=True,
+        headers=headers
+    ) as client:
+        # Step 1: Authenticate
+        success = await authenticate(client)
+        if not success:
+            print("Aborting benchmark due to authentication failure.")
+            return
+
+        # Step 2: Run benchmarks
+        results = []
+        for ep in ENDPOINTS:
+            res = await benchmark_endpoint(client, ep["name"], ep["url"])
+            if res:
+                results.append(res)
+
+        print("\n" + "="*40)
+        print(f"ANALYTICS BENCHMARK - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("="*40)
+        for r in results:
+            queries = r["queries"] if r["queries"] is not None else "n/a"
+            print(f"{r['name'].ljust(25)}: {r['avg']:>7.2f}ms (Avg) | {r['p95']:>7.2f}ms (p95) | {queries} SQL")
+        print("="*40)
+
+if __name__ == "__main__":
+    print("Starting analytics benchmark...")
+    asyncio.run(main())
@@ -0,0 +1,200 @@
+import asyncio
+import httpx
+import logging
+import os
+import tempfile
+import time
+import statistics
+from collections import defaultdict
+from datetime import datetime
+
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from core.middleware import ErrorHandlerMiddleware, PerformanceMiddleware
+from core.rate_limiter import RateLimitMiddleware
+
+from config.settings import settings
+
+# Runs in-process through httpx.ASGITransport, so no server or database is needed.
+# Compares the middleware stack as it was before the pure-ASGI rewrite (the
+# BaseHTTPMiddleware classes below, copied from core/middleware.py and
+# core/rate_limiter.py) against the current implementation on the same endpoints.
+
+SAMPLES = int(os.environ.get("BENCHMARK_SAMPLES", 500))
+PDF_SIZE = 5 * 1024 * 1024  # 5 MB
+
+logger = logging.getLogger("benchmark_middleware")
+
+
+# =========================================================
+# Pre-rewrite middleware (BaseHTTPMiddleware)
+# =========================================================
+
+class LegacyErrorHandlerMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        try:
+            response = await call_next(request)
+            return response
+        except (HTTPException, RequestValidationError):
+            raise
+        except Exception as e:
+            # The CORS header handling of the original is left out: the benchmark never errors
+            logger.error(f"Unhandled error: {str(e)}")
+            return JSONResponse(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                content={"error": "Internal server error", "detail": None},
+            )
+
+
+class LegacyPerformanceMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.perf_counter()
+        response = await call_next(request)
+        ms = (time.perf_counter() - start_time) * 1000
+        response.headers["X-Process-Time"] = f"{ms:.2f}ms"
+        log_msg = f"{request.method} {request.url.path} - Time: {ms:.2f}ms - Status: {response.status_code}"
+        if ms > settings.SLOW_REQUEST_MS:
+            logger.warning(f"SLOW REQUEST: {log_msg}")
+        elif settings.LOG_FAST_REQUESTS:
+            logger.info(log_msg)
+        return response
+
+
+class LegacyRateLimiter:
+    """In-memory sliding window per IP, one timestamp list each."""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+
+    async def is_allowed(self, ip: str):
+        if not settings.RATE_LIMIT_ENABLED:
+            return True, ""
+        current_time = time.time()
+        timestamps = self.requests[ip]
+        if len([ts for ts in timestamps if ts > current_time - 60]) >= settings.RATE_LIMIT_PER_MINUTE:
+            return False, f"Rate limit exceeded: {settings.RATE_LIMIT_PER_MINUTE} requests per minute"
+        if len([ts for ts in timestamps if ts > current_time - 3600]) >= settings.RATE_LIMIT_PER_HOUR:
+            return False, f"Rate limit exceeded: {settings.RATE_LIMIT_PER_HOUR} requests per hour"
+        timestamps.append(current_time)
+        return True, ""
+
+    async def get_client_ip(self, request: Request) -> str:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+        real_ip = request.headers.get("X-Real-IP")
+        if real_ip:
+            return real_ip.strip()
+        return request.client.host if request.client else "unknown"
+
+
+legacy_rate_limiter = LegacyRateLimiter()
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    EXCLUDED_PATHS = ["/health", "/", "/docs", "/openapi.json", "/redoc"]
+
+    async def dispatch(self, request: Request, call_next):
+        if any(request.url.path.startswith(path) for path in self.EXCLUDED_PATHS):
+            return await call_next(request)
+        client_ip = await legacy_rate_limiter.get_client_ip(request)
+        is_allowed, error_message = await legacy_rate_limiter.is_allowed(client_ip)
+        if not is_allowed:
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"error": "Rate limit exceeded", "detail": error_message, "status_code": 429},
+                headers={"Retry-After": "60", "X-RateLimit-Limit": str(settings.RATE_LIMIT_PER_MINUTE), "X-RateLimit-Remaining": "0"},
+            )
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(settings.RATE_LIMIT_PER_MINUTE)
+        response.headers["X-RateLimit-Remaining"] = str(max(0, settings.RATE_LIMIT_PER_MINUTE - len([
+            ts for ts in legacy_rate_limiter.requests.get(client_ip, []) if ts > time.time() - 60
+        ])))
+        return response
+
+
+def build_app(pdf_path, middlewares):
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @app.get("/download/pdf")
+    async def download_pdf():
+        return FileResponse(pdf_path, media_type="application/pdf", filename="certificate.pdf")
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def benchmark_endpoint(app, name, url):
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # Warm up routing and import caches
+        for _ in range(10):
+            await client.get(url)
+
+        for _ in range(SAMPLES):
+            start_time = time.perf_counter()
+            response = await client.get(url)
+            latency = (time.perf_counter() - start_time) * 1000  # ms
+            if response.status_code == 200:
+                latencies.append(latency)
+            else:
+                print(f"  [Error] {name}: Status {response.status_code}")
+                break
+
+    if latencies:
+        latencies.sort()
+        avg = statistics.mean(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"  {name.ljust(28)} Average: {avg:.3f}ms | p95: {p95:.3f}ms")
+        return {"name": name, "avg": avg, "p95": p95}
+    return None
+
+
+async def main():
+    # Disable the default rate limit so the benchmark loop is never throttled
+    settings.RATE_LIMIT_ENABLED = False
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as handle:
+        handle.write(b"%PDF-1.4\n" + os.urandom(PDF_SIZE))
+        pdf_path = handle.name
+
+    stacks = {
+        "none": [],
+        "before": [LegacyRateLimitMiddleware, LegacyPerformanceMiddleware, LegacyErrorHandlerMiddleware],
+        "after": [RateLimitMiddleware, PerformanceMiddleware, ErrorHandlerMiddleware],
+    }
+
+    results = {}
+    try:
+        for stack_name, middlewares in stacks.items():
+            print(f"Stack: {stack_name}")
+            app = build_app(pdf_path, middlewares)
+            results[stack_name] = {
+                "health": await benchmark_endpoint(app, "GET /health", "/health"),
+                "pdf": await benchmark_endpoint(app, "GET 5MB PDF (FileResponse)", "/download/pdf"),
+            }
+    finally:
+        os.unlink(pdf_path)
+
+    print("\n" + "="*40)
+    print(f"MIDDLEWARE OVERHEAD - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("="*40)
+    for endpoint in ("health", "pdf"):
+        baseline = results["none"][endpoint]["avg"]
+        for stack_name in ("before", "after"):
+            avg = results[stack_name][endpoint]["avg"]
+            print(f"{endpoint.ljust(7)} | {stack_name.ljust(7)}: {avg:>8.3f}ms (Avg) | overhead {avg - baseline:>7.3f}ms")
+    print("="*40)
+
+if __name__ == "__main__":
+    print("Starting middleware overhead benchmark...")
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+import random
+import sqlite3
+import statistics
+import time
+from datetime import datetime
+
+from apps.forms_app.services.spa_search import FIELD_WEIGHTS, SpaSearchIndex
+
+# In-process comparison of the SPA search index against the previous
+# ILIKE '%term%' scan over eleven columns (SQLite LIKE stands in for MySQL;
+# both are full scans). No server or database needed.
+SPA_COUNT = 10_000
+SAMPLES = 50
+SEED = 7
+
+NAME_WORDS = [
+    "Serenity", "Lotus", "Bliss", "Harmony", "Zen", "Aroma", "Royal", "Orchid",
+    "Tranquil", "Oasis", "Velvet", "Jasmine", "Crystal", "Golden", "Azure", "Nirvana",
+]
+NAME_SUFFIXES = ["Spa", "Wellness", "Retreat", "Day Spa", "Thai Spa", "Massage Centre"]
+AREAS = ["Andheri", "Bandra", "Powai", "Koramangala", "Indiranagar", "Whitefield", "Saket", "Juhu", "Baner", "Viman Nagar"]
+CITIES = [("Mumbai", "Maharashtra"), ("Bengaluru", "Karnataka"), ("Delhi", "Delhi"), ("Pune", "Maharashtra")]
+
+QUERIES = [
+    ("exact", "serenity"),
+    ("prefix", "seren"),
+    ("typo", "serenty"),
+    ("multi-term", "lotus andheri"),
+    ("code", "1042"),
+    ("phone prefix", "98200"),
+]
+
+
+def make_rows(count):
+    rng = random.Random(SEED)
+    rows = []
+    for spa_id in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        area = rng.choice(AREAS)
+        name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)} {area}"
+        phone = f"98{rng.randrange(10**7, 10**8)}"
+        rows.append((
+            spa_id,
+            rng.random() > 0.1,
+            name,
+            spa_id,
+            f"{rng.randrange(1, 200)}, {area} Main Road, near Metro Station",
+            area,
+            city,
+            state,
+            str(rng.randrange(400001, 560100)),
+            f"spa{spa_id}@example.com",
+            phone,
+            None,
+            f"27AAAC{rng.randrange(1000, 9999)}Z{spa_id % 10}",
+        ))
+    return rows
+
+
+def timed(fn, samples=SAMPLES):
+    latencies = []
+    result = None
+    for _ in range(samples):
+        start = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.mean(latencies), latencies[max(0, int(len(latencies) * 0.95) - 1)], result
+
+
+def build_sqlite(rows):
+    conn = sqlite3.connect(":memory:")
+    columns = list(FIELD_WEIGHTS)
+    conn.execute(f"CREATE TABLE spas (id INTEGER PRIMARY KEY, is_active INTEGER, {', '.join(columns)})")
+    conn.executemany(f"INSERT INTO spas VALUES ({', '.join('?' * (len(columns) + 2))})", rows)
+    return conn
+
+
+def like_scan(conn, term):
+    columns = list(FIELD_WEIGHTS)
+    where = " OR ".join(f"CAST({col} AS TEXT) LIKE ?" for col in columns)
+    params = [f"%{term}%"] * len(columns)
+    return [row[0] for row in conn.execute(f"SELECT id FROM spas WHERE {where} ORDER BY name", params)]
+
+
+def main():
+    rows = make_rows(SPA_COUNT)
+
+    start = time.perf_counter()
+    index = SpaSearchIndex(rows)
+    build_ms = (time.perf_counter() - start) * 1000
+    conn = build_sqlite(rows)
+
+    print("\n" + "=" * 72)
+    print(f"SPA SEARCH BENCHMARK - {SPA_COUNT} SPAs - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"Index build: {build_ms:.1f}ms ({len(index.tokens)} tokens)")
+    print("=" * 72)
+    for label, query in QUERIES:
+        idx_avg, idx_p95, idx_hits = timed(lambda: index.search(query, limit=200))
+        like_avg, like_p95, like_hits = timed(lambda: like_scan(conn, query))
+        print(
+            f"{label.ljust(13)} {query!r:<18} index: {idx_avg:>6.2f}ms (p95 {idx_p95:>6.2f}) {len(idx_hits):>4} hits | "
+            f"LIKE scan: {like_avg:>6.2f}ms (p95 {like_p95:>6.2f}) {len(like_hits):>5} hits"
+        )
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -137,6 +137,12 @@ async def init_db():
     # Queries
     from apps.Query.models import Query, QueryType
 
+    # Analytics
+    from apps.analytics.models import StatsCounter, AnalyticsRollup, AnalyticsRollupState
+
+    # Email / SMS outboxes, audit archives
+    from apps.notifications.models import EmailOutbox, SmsOutbox, user_activities_archive
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
@@ -154,6 +154,82 @@ class Settings(BaseSettings):
     AUTO_CREATE_TABLES: bool = False
     LOG_FAST_REQUESTS: bool = False
     SLOW_REQUEST_MS: int = 500
+    SQL_INSTRUMENTATION_ENABLED: bool = True  # Per-request query count/time + Server-Timing header
+    SQL_REPEATED_STATEMENT_THRESHOLD: int = 10  # Warn (possible N+1) above this many identical statements; 0 disables
+    LOOP_LAG_MONITOR_ENABLED: bool = True
+    LOOP_LAG_SAMPLE_INTERVAL_SECONDS: float = 0.5
+    LOOP_BLOCK_DETECTOR_ENABLED: bool = False  # Always on when DEBUG; logs a stack trace per blocking callback
+    LOOP_BLOCK_THRESHOLD_MS: int = 100
+    STATS_COUNTER_RECONCILE_SECONDS: int = 3600  # Recount stats_counters from source tables; 0 disables
+    ROLLUP_INTERVAL_SECONDS: int = 300  # Incremental analytics_rollups refresh; 0 disables
+    ROLLUP_LATE_DATA_MINUTES: int = 60  # Re-scan this far behind the rollup watermark
+    ROLLUP_INITIAL_BACKFILL_DAYS: int = 90  # History rolled up on the first run
+    SINGLE_FLIGHT_DISTRIBUTED: bool = True  # Coalesce across workers through a Redis lock when Redis is up
+    SINGLE_FLIGHT_LOCK_SECONDS: float = 30
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_REDIS_ENABLED: bool = True  # Share cached responses and invalidations across workers
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000  # Per-process LRU bound
+    SPA_SEARCH_INDEX_TTL_SECONDS: int = 300  # Rebuild the in-process SPA search index at least this often
+    SPA_SEARCH_MAX_RESULTS: int = 200
+    SPA_CACHE_MAX_ENTRIES: int = 512  # SPA list/by-id snapshots kept per worker (LRU)
+    SPA_CACHE_TTL_SECONDS: int = 300
+    SPA_CACHE_VERSION_CHECK_SECONDS: float = 1.0  # How often workers poll the Redis invalidation version
+    EVENT_BUFFER_ENABLED: bool = True  # Write-behind batching of activity/login/notification rows
+    EVENT_BUFFER_FLUSH_MS: int = 200
+    EVENT_BUFFER_BATCH_SIZE: int = 500  # Rows per multi-row INSERT; a full batch flushes immediately
+    EVENT_BUFFER_MAX_SIZE: int = 10000  # Producers wait for room beyond this
+    USER_ROLE_INDEX_TTL_SECONDS: int = 60  # Cached admin recipient lists for notification fan-out
+    SMTP_POOL_SIZE: int = 3  # Persistent SMTP connections per worker
+    SMTP_POOL_IDLE_SECONDS: int = 60  # Reconnect instead of reusing a connection idle this long
+    SMTP_RATE_LIMIT_PER_MINUTE: int = 60  # Per worker and provider (SMTP host); 0 disables
+    EMAIL_OUTBOX_POLL_SECONDS: float = 5.0  # New mail from this worker wakes the sender at once
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 300  # A claimed email is retried after this if its worker died
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 6
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: int = 30  # Doubles per attempt
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS: int = 3600
+    SMS_SEND_DEADLINE_SECONDS: int = 120  # Default per-message deadline; undelivered SMS then expire
+    SMS_OUTBOX_POLL_SECONDS: float = 2.0  # New SMS from this worker wakes the sender at once
+    SMS_OUTBOX_BATCH_SIZE: int = 20
+    SMS_OUTBOX_LEASE_SECONDS: int = 60
+    SMS_OUTBOX_MAX_ATTEMPTS: int = 5
+    SMS_OUTBOX_RETRY_BASE_SECONDS: int = 5  # Doubles per attempt
+    SMS_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive provider failures that open the breaker
+    SMS_CIRCUIT_RESET_SECONDS: int = 30  # Open time before one probe request is let through
+    NOTIFICATION_COUNTERS_ENABLED: bool = True  # Unread counts cached in Redis, pushed over /notifications/stream
+    NOTIFICATION_COUNTER_RECONCILE_SECONDS: int = 300  # Rebuild from the table; 0 disables (counts then use COUNT(*))
+    NOTIFICATION_SSE_HEARTBEAT_SECONDS: float = 20  # Keep-alive comment and count re-check per open stream
+    NOTIFICATION_SSE_RETRY_MS: int = 5000  # Client reconnect delay sent to EventSource
+    RETENTION_ENABLED: bool = True  # Archive old audit rows; reads default to the hot window
+    ACTIVITY_RETENTION_DAYS: int = 90  # Hot window of user_activities; 0 keeps everything hot
+    LOGIN_HISTORY_RETENTION_DAYS: int = 90
+    NOTIFICATION_RETENTION_DAYS: int = 180
+    RETENTION_WINDOW_START_HOUR: int = 20  # Archival runs only between these UTC hours (01:30-05:30 IST)
+    RETENTION_WINDOW_END_HOUR: int = 24
+    RETENTION_CHECK_SECONDS: int = 900
+    RETENTION_BATCH_SIZE: int = 5000  # Rows moved per INSERT ... SELECT + DELETE transaction
+    RETENTION_BATCH_PAUSE_MS: int = 200  # Breather between batches for replication and foreground traffic
+    RETENTION_PARTITION_ARCHIVES: bool = True  # MySQL: monthly RANGE partitions on the archive tables
+    RETENTION_PARTITION_MONTHS_AHEAD: int = 3
+    ARCHIVE_RETENTION_MONTHS: int = 0  # Drop archive partitions older than this; 0 keeps them forever
+    BULK_CHUNK_SIZE: int = 1000  # Ids per set-based UPDATE/DELETE statement in bulk actions
+    EXPORT_BATCH_SIZE: int = 1000  # Rows fetched per round trip of a streaming CSV/XLSX export cursor
+    OTP_STORE: str = "auto"  # "redis", "database", or "auto" (Redis when reachable, else the otps table)
+    OTP_TTL_SECONDS: int = 600
+    OTP_MAX_ATTEMPTS: int = 5  # Wrong guesses before an OTP is burned
+    OTP_PURGE_INTERVAL_SECONDS: int = 3600  # Delete used/expired otps rows; 0 disables
+    OTP_PURGE_BATCH_SIZE: int = 1000
+
+    # ------------------------------------------------------------------
+    # Rate Limiting (token buckets, units refilled per minute)
+    # ------------------------------------------------------------------
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_MINUTE: int = 300  # Default per-IP policy, cost 1 per request
+    RATE_LIMIT_PDF_RENDER_BURST: int = 100  # Per user, certificate PDF render costs 10
+    RATE_LIMIT_PDF_RENDER_PER_MINUTE: int = 50
+    RATE_LIMIT_BG_REMOVAL_BURST: int = 100  # Per IP, background removal costs 20
+    RATE_LIMIT_BG_REMOVAL_PER_MINUTE: int = 40
+
     # ------------------------------------------------------------------
     # Background Removal API (remove.bg)
     # ------------------------------------------------------------------
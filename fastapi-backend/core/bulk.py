@@ -0,0 +1,66 @@
+"""
+Bulk Statements
+Set-based UPDATE/DELETE over a list of primary keys
+
+``update_by_ids`` / ``delete_by_ids`` touch every row whose id is in ``ids``
+and matches ``condition`` with one statement per ``BULK_CHUNK_SIZE`` ids, and
+return the ids actually affected so callers can report per-id outcomes. Where
+the dialect supports ``RETURNING`` the affected ids come back with the
+statement itself; otherwise (MySQL) each chunk first locks its matching rows
+with ``SELECT ... FOR UPDATE`` and then runs the statement against exactly
+those ids. The caller commits.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import and_, delete, select, true, update
+from sqlalchemy.ext.asyncio import AsyncSession as Session
+
+from config.settings import settings
+
+
+def unique_ids(ids: Iterable[int]) -> List[int]:
+    """``ids`` without duplicates, in first-seen order."""
+    return list(dict.fromkeys(ids))
+
+
+def chunked(ids: List[int], size: Optional[int] = None) -> Iterator[List[int]]:
+    size = max(1, size or settings.BULK_CHUNK_SIZE)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+async def _apply(db: Session, model, ids: Iterable[int], condition, values: Optional[Dict[str, Any]]) -> List[int]:
+    pk = model.__mapper__.primary_key[0]
+    dialect = db.bind.dialect
+    supports_returning = dialect.update_returning if values is not None else dialect.delete_returning
+    condition = condition if condition is not None else true()
+
+    affected: List[int] = []
+    for chunk in chunked(unique_ids(ids)):
+        where = and_(pk.in_(chunk), condition)
+        if not supports_returning:
+            result = await db.execute(select(pk).where(where).with_for_update())
+            chunk = list(result.scalars().all())
+            if not chunk:
+                continue
+            where = pk.in_(chunk)
+
+        stmt = update(model).where(where).values(**values) if values is not None else delete(model).where(where)
+        stmt = stmt.execution_options(synchronize_session=False)
+        if supports_returning:
+            result = await db.execute(stmt.returning(pk))
+            affected.extend(result.scalars().all())
+        else:
+            await db.execute(stmt)
+            affected.extend(chunk)
+    return affected
+
+
+async def update_by_ids(db: Session, model, ids: Iterable[int], values: Dict[str, Any], condition=None) -> List[int]:
+    """Set ``values`` on the rows in ``ids`` matching ``condition``; returns the updated ids."""
+    return await _apply(db, model, ids, condition, values)
+
+
+async def delete_by_ids(db: Session, model, ids: Iterable[int], condition=None) -> List[int]:
+    """Delete the rows in ``ids`` matching ``condition``; returns the deleted ids."""
+    return await _apply(db, model, ids, condition, None)
@@ -0,0 +1,126 @@
+"""
+Circuit Breaker
+Fast-fail calls to an external provider after consecutive failures
+
+A breaker starts ``closed``. ``failure_threshold`` consecutive failures open
+it: calls are refused without touching the provider for ``reset_seconds``.
+After that one probe call is let through (``half_open``); its success closes
+the breaker, its failure opens it again. The breaker also keeps a small
+health record (last error, last success, latency EWMA) for the provider.
+State is per worker.
+"""
+import time
+from typing import Any, Dict, Optional
+
+from core import metrics
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+_LATENCY_SMOOTHING = 0.2
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.last_error: Optional[str] = None
+        self.last_failure_at: Optional[float] = None
+        self.last_success_at: Optional[float] = None
+        self.latency_ewma: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return OPEN
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """True if a call may go out now (reserves the probe when half open)."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            metrics.set_circuit_state(self.name, _STATE_VALUES[HALF_OPEN])
+            return True
+        return False
+
+    def check(self):
+        """Raise ``CircuitOpenError`` unless a call may go out now."""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def record_success(self, latency_seconds: Optional[float] = None):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.last_success_at = time.time()
+        if latency_seconds is not None:
+            if self.latency_ewma is None:
+                self.latency_ewma = latency_seconds
+            else:
+                self.latency_ewma += _LATENCY_SMOOTHING * (latency_seconds - self.latency_ewma)
+        metrics.set_circuit_state(self.name, _STATE_VALUES[CLOSED])
+
+    def record_failure(self, error: Any = None):
+        self.consecutive_failures += 1
+        self.last_error = str(error)[:500] if error is not None else None
+        self.last_failure_at = time.time()
+        was_probe = self.probe_in_flight
+        self.probe_in_flight = False
+        if was_probe or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            metrics.set_circuit_state(self.name, _STATE_VALUES[OPEN])
+
+    def release_probe(self):
+        """Give the probe back when the call ended without a provider verdict."""
+        self.probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_seconds": round(self.retry_after(), 1),
+            "last_error": self.last_error,
+            "last_failure_at": self.last_failure_at,
+            "last_success_at": self.last_success_at,
+            "latency_ewma_seconds": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, failure_threshold: int, reset_seconds: float) -> CircuitBreaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, failure_threshold, reset_seconds)
+    return breaker
+
+
+def breaker_snapshots() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
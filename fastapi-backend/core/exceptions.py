@@ -41,3 +41,8 @@ class AuthorizationError(CustomException):
     def __init__(self, message: str = "Permission denied", detail: Optional[str] = None):
         super().__init__(message, status_code=403, detail=detail)
 
+
+class ServiceUnavailableError(CustomException):
+    """A dependency (e.g. the SMS provider) is temporarily unavailable"""
+    def __init__(self, message: str = "Service temporarily unavailable", detail: Optional[str] = None):
+        super().__init__(message, status_code=503, detail=detail)
@@ -0,0 +1,102 @@
+"""
+File Cleanup
+Unlink files off the event loop, after the rows pointing at them are gone
+
+``queue_file_deletion(paths)`` hands paths (relative to ``UPLOAD_DIR``) to a
+background task that removes them in batches on a worker thread. Paths that
+resolve outside ``UPLOAD_DIR`` are refused. Queue only after the deleting
+transaction has committed; a crash before the task gets to them leaves
+orphaned files, never dangling rows.
+"""
+import asyncio
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_BATCH_SIZE = 200
+
+_queue: Optional[asyncio.Queue] = None
+_cleanup_task: Optional[asyncio.Task] = None
+
+
+def _resolve(relative_path: str) -> Optional[Path]:
+    root = Path(settings.UPLOAD_DIR).resolve()
+    path = (root / relative_path).resolve()
+    if root not in path.parents:
+        logger.warning(f"Refusing to delete file outside {root}: {relative_path}")
+        return None
+    return path
+
+
+def _unlink_files(relative_paths: List[str]) -> int:
+    """Blocking: remove the files; returns the number removed."""
+    removed = 0
+    for relative_path in relative_paths:
+        path = _resolve(relative_path)
+        if path is None:
+            continue
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete {path}: {e}")
+    return removed
+
+
+async def queue_file_deletion(relative_paths: Iterable[str]):
+    """Queue files under ``UPLOAD_DIR`` for deletion."""
+    paths = [path for path in dict.fromkeys(relative_paths) if path]
+    if not paths:
+        return
+    if _queue is None:
+        # No cleanup task (scripts, tests): still keep the unlinks off the loop
+        await asyncio.to_thread(_unlink_files, paths)
+        return
+    for path in paths:
+        _queue.put_nowait(path)
+
+
+async def _cleanup_loop():
+    while True:
+        batch = [await _queue.get()]
+        while len(batch) < _BATCH_SIZE and not _queue.empty():
+            batch.append(_queue.get_nowait())
+        try:
+            removed = await asyncio.to_thread(_unlink_files, batch)
+            logger.info(f"Deleted {removed} of {len(batch)} queued files")
+        except Exception as e:
+            logger.error(f"File cleanup failed: {e}", exc_info=True)
+
+
+def start_file_cleanup():
+    """Start the cleanup task (called from the app lifespan)."""
+    global _queue, _cleanup_task
+    if _cleanup_task is not None:
+        return
+    _queue = asyncio.Queue()
+    _cleanup_task = asyncio.create_task(_cleanup_loop(), name="file-cleanup")
+
+
+async def stop_file_cleanup():
+    """Stop the task, deleting whatever is still queued."""
+    global _queue, _cleanup_task
+    if _cleanup_task is None:
+        return
+    _cleanup_task.cancel()
+    try:
+        await _cleanup_task
+    except asyncio.CancelledError:
+        pass
+    leftover = []
+    while not _queue.empty():
+        leftover.append(_queue.get_nowait())
+    _queue = None
+    _cleanup_task = None
+    if leftover:
+        await asyncio.to_thread(_unlink_files, leftover)
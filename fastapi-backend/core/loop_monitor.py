@@ -0,0 +1,149 @@
+"""
+Event Loop Monitor
+Samples event-loop lag and (in debug/staging) reports callbacks that block the loop
+
+The lag sampler sleeps for a fixed interval and measures how late it wakes up;
+the lateness is time the loop spent running something else without yielding.
+
+The blocking-call detector is a watchdog thread. The loop refreshes a heartbeat
+every few milliseconds; when the heartbeat goes stale for longer than
+LOOP_BLOCK_THRESHOLD_MS, the watchdog captures the loop thread's current stack
+so the offending synchronous call (file I/O, bcrypt, ...) shows up in the logs.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Optional
+
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_LAG_WINDOW = 600  # samples kept for max/p99 (5 minutes at the default interval)
+
+
+class LoopLagMonitor:
+    """Periodic lag sampler plus optional watchdog for blocking callbacks."""
+
+    def __init__(self, interval: float, block_threshold_ms: Optional[int] = None):
+        self.interval = interval
+        self.block_threshold = block_threshold_ms / 1000 if block_threshold_ms else None
+        self.samples: Deque[float] = deque(maxlen=_LAG_WINDOW)
+        self._task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+
+    # ------------------------------------------------------------------
+    # Lag sampling
+    # ------------------------------------------------------------------
+
+    async def _sample(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self.samples.append(lag)
+            metrics.record_loop_lag(lag, self.max_lag(), self.p99_lag())
+
+    def max_lag(self) -> float:
+        return max(self.samples, default=0.0)
+
+    def p99_lag(self) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+    # ------------------------------------------------------------------
+    # Blocking-call detection
+    # ------------------------------------------------------------------
+
+    async def _beat(self):
+        tick = min(self.block_threshold / 4, 0.05)
+        while True:
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(tick)
+
+    def _watch(self):
+        reported = False
+        while not self._stop.wait(self.block_threshold / 2):
+            stalled = time.monotonic() - self._heartbeat
+            if stalled < self.block_threshold:
+                reported = False
+                continue
+            if reported:
+                # One stack per blocking episode is enough
+                continue
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "<no frame>"
+            metrics.record_loop_block()
+            logger.warning(
+                f"Event loop blocked for more than {stalled * 1000:.0f}ms. "
+                f"Loop thread stack:\n{stack}"
+            )
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        self._task = asyncio.create_task(self._sample(), name="loop-lag-sampler")
+        if self.block_threshold:
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._stop.clear()
+            self._heartbeat_task = asyncio.create_task(self._beat(), name="loop-heartbeat")
+            self._watchdog = threading.Thread(target=self._watch, name="loop-block-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        for task in (self._task, self._heartbeat_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._heartbeat_task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def start_loop_monitor() -> Optional[LoopLagMonitor]:
+    """Start the monitor for the running loop (called from the app lifespan)."""
+    global _monitor
+    if not settings.LOOP_LAG_MONITOR_ENABLED or _monitor is not None:
+        return _monitor
+
+    block_threshold_ms = None
+    if settings.DEBUG or settings.LOOP_BLOCK_DETECTOR_ENABLED:
+        block_threshold_ms = settings.LOOP_BLOCK_THRESHOLD_MS
+
+    _monitor = LoopLagMonitor(settings.LOOP_LAG_SAMPLE_INTERVAL_SECONDS, block_threshold_ms)
+    _monitor.start()
+    logger.info(
+        f"Event loop monitor started (interval={settings.LOOP_LAG_SAMPLE_INTERVAL_SECONDS}s, "
+        f"block_detector={'%sms' % block_threshold_ms if block_threshold_ms else 'off'})"
+    )
+    return _monitor
+
+
+async def stop_loop_monitor():
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
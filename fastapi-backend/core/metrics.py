@@ -0,0 +1,270 @@
+"""
+Prometheus Metrics
+In-process request metrics exposed in Prometheus text format on /metrics
+
+Labels use the matched route template (``/api/forms/spas/{spa_id}``), never the
+raw path, so cardinality stays bounded. Under gunicorn, set
+``PROMETHEUS_MULTIPROC_DIR`` before the workers start (run_production.sh does)
+and every worker writes its samples there; a scrape of any worker then
+returns the aggregate across all of them.
+"""
+import os
+import logging
+from typing import Optional, Tuple
+
+from starlette.types import Scope
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_AVAILABLE = False
+MULTIPROCESS_MODE = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+try:
+    from prometheus_client import (
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        REGISTRY,
+        generate_latest,
+        multiprocess,
+        CONTENT_TYPE_LATEST,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError as e:
+    logger.warning(f"prometheus_client not available: {e}. Install with 'pip install prometheus-client'")
+
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Latency buckets in seconds, tuned for API calls from ~5ms up to slow PDF renders
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+if PROMETHEUS_AVAILABLE:
+    HTTP_REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency until the last response byte",
+        ["method", "route"],
+        buckets=LATENCY_BUCKETS,
+    )
+    HTTP_REQUESTS_TOTAL = Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code",
+        ["method", "route", "status"],
+    )
+    HTTP_RESPONSE_SIZE = Histogram(
+        "http_response_size_bytes",
+        "HTTP response body size",
+        ["method", "route"],
+        buckets=SIZE_BUCKETS,
+    )
+    HTTP_REQUESTS_IN_FLIGHT = Gauge(
+        "http_requests_in_flight",
+        "HTTP requests currently being processed",
+        ["method"],
+        multiprocess_mode="livesum",
+    )
+    DB_QUERIES_PER_REQUEST = Histogram(
+        "db_queries_per_request",
+        "SQL statements issued per HTTP request",
+        ["route"],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+    )
+    DB_TIME_PER_REQUEST = Histogram(
+        "db_time_per_request_seconds",
+        "Total SQL execution time per HTTP request",
+        ["route"],
+        buckets=LATENCY_BUCKETS,
+    )
+    DB_REPEATED_STATEMENT_REQUESTS = Counter(
+        "db_repeated_statement_requests_total",
+        "Requests that repeated one statement shape above the N+1 threshold",
+        ["route"],
+    )
+    EVENT_LOOP_LAG = Histogram(
+        "event_loop_lag_seconds",
+        "How late the loop lag sampler woke up",
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    )
+    EVENT_LOOP_LAG_MAX = Gauge(
+        "event_loop_lag_max_seconds",
+        "Maximum event loop lag over the recent sample window",
+        multiprocess_mode="livemax",
+    )
+    EVENT_LOOP_LAG_P99 = Gauge(
+        "event_loop_lag_p99_seconds",
+        "99th percentile event loop lag over the recent sample window",
+        multiprocess_mode="livemax",
+    )
+    EVENT_LOOP_BLOCKS = Counter(
+        "event_loop_blocked_total",
+        "Times a single callback blocked the loop beyond LOOP_BLOCK_THRESHOLD_MS",
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        "db_pool_connections_checked_out",
+        "Database connections currently checked out of the pool",
+        multiprocess_mode="livesum",
+    )
+    SINGLE_FLIGHT_CALLS = Counter(
+        "single_flight_calls_total",
+        "Single-flight calls by outcome: leader (computed), coalesced (shared in-process), remote (shared from another worker)",
+        ["name", "outcome"],
+    )
+    EVENT_BUFFER_ROWS = Counter(
+        "event_buffer_rows_total",
+        "Write-behind audit rows by table and outcome: written or dropped",
+        ["table", "outcome"],
+    )
+    RETENTION_ARCHIVED_ROWS = Counter(
+        "retention_archived_rows_total",
+        "Audit rows moved from the hot tables into their archive tables",
+        ["table"],
+    )
+    SMS_PROVIDER_REQUESTS = Counter(
+        "sms_provider_requests_total",
+        "SMS sends by provider and outcome: sent, failed or short_circuited (breaker open)",
+        ["provider", "outcome"],
+    )
+    SMS_PROVIDER_LATENCY = Histogram(
+        "sms_provider_latency_seconds",
+        "SMS provider request latency, including failed requests",
+        ["provider"],
+        buckets=LATENCY_BUCKETS,
+    )
+    CIRCUIT_BREAKER_STATE = Gauge(
+        "circuit_breaker_state",
+        "Circuit breaker state: 0 closed, 1 half open, 2 open",
+        ["name"],
+        multiprocess_mode="livemax",
+    )
+    OTP_VERIFICATIONS = Counter(
+        "otp_verifications_total",
+        "OTP verifications by store (redis, database) and outcome",
+        ["store", "outcome"],
+    )
+    RESPONSE_CACHE_REQUESTS = Counter(
+        "response_cache_requests_total",
+        "Cached GET endpoints by result: hit, stale (served while refreshing) or miss",
+        ["route", "result"],
+    )
+
+
+def route_label(scope: Scope) -> str:
+    """Return the route template matched for this request, or a fixed placeholder."""
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def request_started(method: str):
+    if PROMETHEUS_AVAILABLE:
+        HTTP_REQUESTS_IN_FLIGHT.labels(method).inc()
+
+
+def request_finished(method: str, route: str, status_code: int, duration_seconds: float, response_bytes: int):
+    if not PROMETHEUS_AVAILABLE:
+        return
+    HTTP_REQUESTS_IN_FLIGHT.labels(method).dec()
+    HTTP_REQUEST_DURATION.labels(method, route).observe(duration_seconds)
+    HTTP_RESPONSE_SIZE.labels(method, route).observe(response_bytes)
+    HTTP_REQUESTS_TOTAL.labels(method, route, str(status_code)).inc()
+
+
+def record_request_queries(route: str, query_count: int, db_seconds: float, repeated: bool):
+    if not PROMETHEUS_AVAILABLE:
+        return
+    DB_QUERIES_PER_REQUEST.labels(route).observe(query_count)
+    DB_TIME_PER_REQUEST.labels(route).observe(db_seconds)
+    if repeated:
+        DB_REPEATED_STATEMENT_REQUESTS.labels(route).inc()
+
+
+def record_loop_lag(lag_seconds: float, max_seconds: float, p99_seconds: float):
+    if not PROMETHEUS_AVAILABLE:
+        return
+    EVENT_LOOP_LAG.observe(lag_seconds)
+    EVENT_LOOP_LAG_MAX.set(max_seconds)
+    EVENT_LOOP_LAG_P99.set(p99_seconds)
+
+
+def record_loop_block():
+    if PROMETHEUS_AVAILABLE:
+        EVENT_LOOP_BLOCKS.inc()
+
+
+def record_single_flight(name: str, outcome: str):
+    if PROMETHEUS_AVAILABLE:
+        SINGLE_FLIGHT_CALLS.labels(name, outcome).inc()
+
+
+def record_response_cache(route: str, result: str):
+    if PROMETHEUS_AVAILABLE:
+        RESPONSE_CACHE_REQUESTS.labels(route, result).inc()
+
+
+def record_event_buffer(table: str, outcome: str, count: int = 1):
+    if PROMETHEUS_AVAILABLE:
+        EVENT_BUFFER_ROWS.labels(table, outcome).inc(count)
+
+
+def record_retention_archived(table: str, count: int):
+    if PROMETHEUS_AVAILABLE:
+        RETENTION_ARCHIVED_ROWS.labels(table).inc(count)
+
+
+def record_sms_provider(provider: str, outcome: str, latency_seconds: Optional[float] = None):
+    if not PROMETHEUS_AVAILABLE:
+        return
+    SMS_PROVIDER_REQUESTS.labels(provider, outcome).inc()
+    if latency_seconds is not None:
+        SMS_PROVIDER_LATENCY.labels(provider).observe(latency_seconds)
+
+
+def set_circuit_state(name: str, value: int):
+    if PROMETHEUS_AVAILABLE:
+        CIRCUIT_BREAKER_STATE.labels(name).set(value)
+
+
+def record_otp_verification(store: str, outcome: str):
+    if PROMETHEUS_AVAILABLE:
+        OTP_VERIFICATIONS.labels(store, outcome).inc()
+
+
+def instrument_pool(engine):
+    """Track pool checkouts through pool events so the gauge sums correctly across workers."""
+    if not PROMETHEUS_AVAILABLE or engine is None:
+        return
+
+    from sqlalchemy import event
+
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Serialize all metrics (aggregated across workers in multiprocess mode)."""
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus_client is not installed\n", CONTENT_TYPE_LATEST
+
+    if MULTIPROCESS_MODE:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Gunicorn child_exit hook: drop live gauges written by a finished worker."""
+    if PROMETHEUS_AVAILABLE and MULTIPROCESS_MODE:
+        multiprocess.mark_process_dead(pid)
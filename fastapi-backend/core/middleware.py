@@ -1,83 +1,148 @@
 """
 Custom Middleware
+
+Implemented as plain ASGI middleware instead of ``BaseHTTPMiddleware`` so
+requests are not re-wrapped in an extra task and body stream per layer, and
+streaming responses (FileResponse, SSE) pass through untouched.
 """
-from fastapi import Request, status, HTTPException
-from fastapi.exceptions import RequestValidationError
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 import traceback
 import time
 
 from config.settings import settings
+from core import metrics, query_tracker
 
 logger = logging.getLogger(__name__)
 
 
-class ErrorHandlerMiddleware(BaseHTTPMiddleware):
+class ErrorHandlerMiddleware:
     """Global error handler middleware"""
-    
-    async def dispatch(self, request: Request, call_next):
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
-        except (HTTPException, RequestValidationError):
-            # Let FastAPI handle HTTPException and RequestValidationError (they have their own handlers)
-            raise
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
+            # HTTPException and RequestValidationError are handled inside the
+            # app by their own handlers and never reach this point.
+            if response_started:
+                # Headers are already on the wire; nothing sensible left to send.
+                raise
+
             logger.error(f"Unhandled error: {str(e)}")
             logger.error(traceback.format_exc())
-            
+
+            app = scope.get("app")
             # Create response with CORS headers
             response = JSONResponse(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content={
                     "error": "Internal server error",
-                    "detail": str(e) if getattr(request.app.state, 'debug', False) else None
+                    "detail": str(e) if getattr(getattr(app, "state", None), 'debug', False) else None
                 }
             )
-            
+
             # Add CORS headers if origin is present
-            origin = request.headers.get("origin")
+            origin = Headers(scope=scope).get("origin")
             if origin:
                 cors_origins = settings.CORS_ORIGINS
                 if isinstance(cors_origins, str):
                     cors_origins = [origin.strip() for origin in cors_origins.split(",") if origin.strip()]
-                
+
                 # Add default localhost origins
                 default_origins = ["http://localhost:5173", "http://localhost:3000", "http://127.0.0.1:5173", "http://127.0.0.1:3000"]
                 for default_origin in default_origins:
                     if default_origin not in cors_origins:
                         cors_origins.append(default_origin)
-                
+
                 if origin in cors_origins or "*" in cors_origins:
                     response.headers["Access-Control-Allow-Origin"] = origin
                     response.headers["Access-Control-Allow-Credentials"] = "true"
                     response.headers["Access-Control-Allow-Methods"] = "*"
                     response.headers["Access-Control-Allow-Headers"] = "*"
-            
-            return response
+
+            await response(scope, receive, send)
 
 
-class PerformanceMiddleware(BaseHTTPMiddleware):
-    """Middleware to track and log request processing time"""
-    
-    async def dispatch(self, request: Request, call_next):
+class PerformanceMiddleware:
+    """Middleware to track and log request processing time and record request metrics"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start_time = time.perf_counter()
-        
-        response = await call_next(request)
-        
-        process_time = time.perf_counter() - start_time
-        ms = process_time * 1000
-        
-        # Add processing time to response headers
-        response.headers["X-Process-Time"] = f"{ms:.2f}ms"
-        
-        log_msg = f"{request.method} {request.url.path} - Time: {ms:.2f}ms - Status: {response.status_code}"
-        
-        if ms > settings.SLOW_REQUEST_MS:
-            logger.warning(f"SLOW REQUEST: {log_msg}")
-        elif settings.LOG_FAST_REQUESTS:
-            logger.info(log_msg)
-            
-        return response
+        method = scope["method"]
+        status_code = 500
+        response_bytes = 0
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Measured up to the response headers, like call_next() did
+                ms = (time.perf_counter() - start_time) * 1000
+
+                # Add processing time to response headers
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = f"{ms:.2f}ms"
+                if query_stats is not None:
+                    headers.append("Server-Timing", query_stats.server_timing())
+
+                log_msg = f"{method} {scope['path']} - Time: {ms:.2f}ms - Status: {status_code}"
+                if query_stats is not None:
+                    log_msg += f" - DB: {query_stats.count} queries {query_stats.total_seconds * 1000:.2f}ms"
+
+                if ms > settings.SLOW_REQUEST_MS:
+                    if query_stats is not None and query_stats.slowest_statement:
+                        log_msg += f" - Slowest ({query_stats.slowest_seconds * 1000:.2f}ms): {query_tracker.statement_preview(query_stats.slowest_statement)}"
+                    logger.warning(f"SLOW REQUEST: {log_msg}")
+                elif settings.LOG_FAST_REQUESTS:
+                    logger.info(log_msg)
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+
+            await send(message)
+
+        query_stats, query_token = (None, None)
+        if settings.SQL_INSTRUMENTATION_ENABLED:
+            query_stats, query_token = query_tracker.start_request()
+
+        metrics.request_started(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = metrics.route_label(scope)
+            metrics.request_finished(
+                method,
+                route,
+                status_code,
+                time.perf_counter() - start_time,
+                response_bytes,
+            )
+            if query_stats is not None:
+                query_tracker.end_request(query_token)
+                repeated = query_tracker.check_repeated_statements(query_stats, method, route)
+                metrics.record_request_queries(route, query_stats.count, query_stats.total_seconds, repeated)
@@ -0,0 +1,127 @@
+"""
+Per-request SQL instrumentation
+Counts statements, DB time and the slowest statement for the current request
+
+Engine cursor events attribute every statement to the ``RequestQueryStats``
+stored in a contextvar by ``PerformanceMiddleware``. Statements issued outside
+a request (startup, background jobs) are not tracked.
+"""
+import re
+import time
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_STATEMENT_PREVIEW_CHARS = 200
+
+# Collapse bind placeholders and expanded IN (...) lists so that the same query
+# issued with different ids has one shape.
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:%s|\?|:\w+)(?:\s*,\s*(?:%s|\?|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class RequestQueryStats:
+    """SQL statistics accumulated for a single request."""
+
+    __slots__ = ("count", "total_seconds", "slowest_seconds", "slowest_statement", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_seconds += elapsed
+        if elapsed >= self.slowest_seconds:
+            self.slowest_seconds = elapsed
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+
+    def most_repeated(self):
+        """Return (shape, count) of the most repeated statement shape, or (None, 0)."""
+        if not self.shapes:
+            return None, 0
+        return self.shapes.most_common(1)[0]
+
+    def server_timing(self) -> str:
+        """Format as a ``Server-Timing`` header value."""
+        return (
+            f'db;dur={self.total_seconds * 1000:.2f};desc="{self.count} queries", '
+            f"db-slowest;dur={self.slowest_seconds * 1000:.2f}"
+        )
+
+
+_current_stats: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    normalized = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(?)", normalized)
+
+
+def statement_preview(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()[:_STATEMENT_PREVIEW_CHARS]
+
+
+def start_request():
+    """Begin collecting statements for the current request; returns the token for ``end_request``."""
+    stats = RequestQueryStats()
+    return stats, _current_stats.set(stats)
+
+
+def end_request(token):
+    _current_stats.reset(token)
+
+
+def check_repeated_statements(stats: RequestQueryStats, method: str, route: str) -> bool:
+    """Warn when one statement shape repeats more than SQL_REPEATED_STATEMENT_THRESHOLD times."""
+    threshold = settings.SQL_REPEATED_STATEMENT_THRESHOLD
+    if threshold <= 0:
+        return False
+    shape, repeats = stats.most_repeated()
+    if repeats <= threshold:
+        return False
+    logger.warning(
+        f"Possible N+1: {method} {route} ran the same statement {repeats} times "
+        f"({stats.count} total): {statement_preview(shape)}"
+    )
+    return True
+
+
+def instrument_engine(engine):
+    """Attach cursor event hooks to an (async) engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None:
+            conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is None:
+            return
+        starts = conn.info.get("query_start_time")
+        if not starts:
+            return
+        stats.record(statement, time.perf_counter() - starts.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        # Failed statements never reach after_cursor_execute; drop their start time.
+        connection = exception_context.connection
+        if connection is not None and _current_stats.get() is not None:
+            starts = connection.info.get("query_start_time")
+            if starts:
+                starts.pop()
@@ -1,80 +1,142 @@
 """
 Rate Limiting Middleware
 Prevents abuse and ensures fair resource usage for 500+ concurrent users
+
+Limits are expressed as declarative policies. Each policy owns a token bucket
+per key (client IP, user id or SPA) with a burst capacity and a sustained
+refill rate, and every request spends ``cost`` units from it. Cheap reads
+share the generous ``default`` policy applied by ``RateLimitMiddleware``,
+while CPU-heavy endpoints attach their own policy with ``rate_limit(...)``.
 """
 from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from dataclasses import dataclass
+from jose import jwt
+import math
 import time
 import logging
-from collections import defaultdict
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
 
+RATE_LIMIT_KEYS = ("ip", "user", "spa")
+
+
+@dataclass(frozen=True)
+class RateLimitPolicy:
+    """Token bucket policy: ``burst`` units of capacity refilled at ``per_minute`` units/minute."""
+    name: str
+    burst: int
+    per_minute: float
+    key: str = "ip"
+    cost: int = 1
+
+    def __post_init__(self):
+        if self.key not in RATE_LIMIT_KEYS:
+            raise ValueError(f"Unknown rate limit key '{self.key}', expected one of {RATE_LIMIT_KEYS}")
+        if self.burst <= 0 or self.per_minute <= 0:
+            raise ValueError(f"Rate limit policy '{self.name}' needs positive burst and per_minute")
+
+
+# Registered policies, looked up by name from ``rate_limit(...)``.
+POLICIES: Dict[str, RateLimitPolicy] = {}
+
+
+def register_policy(policy: RateLimitPolicy) -> RateLimitPolicy:
+    """Register (or replace) a named policy."""
+    POLICIES[policy.name] = policy
+    return policy
+
+
+register_policy(RateLimitPolicy(
+    name="default",
+    burst=settings.RATE_LIMIT_PER_MINUTE,
+    per_minute=settings.RATE_LIMIT_PER_MINUTE,
+    key="ip",
+))
+register_policy(RateLimitPolicy(
+    name="pdf_render",
+    burst=settings.RATE_LIMIT_PDF_RENDER_BURST,
+    per_minute=settings.RATE_LIMIT_PDF_RENDER_PER_MINUTE,
+    key="user",
+    cost=10,
+))
+register_policy(RateLimitPolicy(
+    name="background_removal",
+    burst=settings.RATE_LIMIT_BG_REMOVAL_BURST,
+    per_minute=settings.RATE_LIMIT_BG_REMOVAL_PER_MINUTE,
+    key="ip",
+    cost=20,
+))
+
+
 class RateLimiter:
-    """Simple in-memory rate limiter (use Redis for distributed systems)"""
-    
+    """Simple in-memory token bucket limiter (use Redis for distributed systems)"""
+
     def __init__(self):
-        self.requests: Dict[str, list] = defaultdict(list)
-        self.cleanup_interval = 300  # Clean up old entries every 5 minutes
-        self.last_cleanup = time.time()
-    
-    async def _cleanup_old_entries(self):
-        """Remove old request timestamps to prevent memory leaks"""
-        current_time = time.time()
-        if current_time - self.last_cleanup < self.cleanup_interval:
+        # (policy name, key) -> (tokens, last refill timestamp)
+        self.buckets: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self.cleanup_interval = 300  # Clean up idle buckets every 5 minutes
+        self.last_cleanup = time.monotonic()
+
+    def _cleanup_old_entries(self, now: float):
+        """Drop buckets that have refilled completely to prevent memory leaks"""
+        if now - self.last_cleanup < self.cleanup_interval:
             return
-        
-        cutoff_minute = current_time - 60
-        cutoff_hour = current_time - 3600
-        
-        for ip in list(self.requests.keys()):
-            # Keep only recent timestamps
-            self.requests[ip] = [
-                ts for ts in self.requests[ip]
-                if ts > cutoff_hour
-            ]
-            # Remove empty entries
-            if not self.requests[ip]:
-                del self.requests[ip]
-        
-        self.last_cleanup = current_time
-    
+
+        for bucket_key, (tokens, updated_at) in list(self.buckets.items()):
+            policy = POLICIES.get(bucket_key[0])
+            if policy is None:
+                del self.buckets[bucket_key]
+                continue
+            refilled = tokens + (now - updated_at) * policy.per_minute / 60.0
+            if refilled >= policy.burst:
+                del self.buckets[bucket_key]
+
+        self.last_cleanup = now
+
+    def consume(self, policy: RateLimitPolicy, key: str, cost: Optional[int] = None) -> Tuple[bool, int, int]:
+        """
+        Spend ``cost`` units from the bucket for ``key`` under ``policy``.
+        Returns: (is_allowed, remaining_units, retry_after_seconds)
+        """
+        cost = policy.cost if cost is None else cost
+        if not settings.RATE_LIMIT_ENABLED:
+            return True, policy.burst, 0
+
+        now = time.monotonic()
+        self._cleanup_old_entries(now)
+
+        rate_per_second = policy.per_minute / 60.0
+        bucket_key = (policy.name, key)
+        tokens, updated_at = self.buckets.get(bucket_key, (float(policy.burst), now))
+        tokens = min(float(policy.burst), tokens + (now - updated_at) * rate_per_second)
+
+        if tokens < cost:
+            self.buckets[bucket_key] = (tokens, now)
+            # A request costing more than the burst can never succeed; report a full refill.
+            missing = min(cost, policy.burst) - tokens
+            retry_after = max(1, math.ceil(missing / rate_per_second))
+            return False, int(tokens), retry_after
+
+        tokens -= cost
+        self.buckets[bucket_key] = (tokens, now)
+        return True, int(tokens), 0
+
     async def is_allowed(self, ip: str) -> Tuple[bool, str]:
         """
-        Check if request is allowed based on rate limits
+        Check if request is allowed under the default per-IP policy
         Returns: (is_allowed, error_message)
         """
-        if not settings.RATE_LIMIT_ENABLED:
-            return True, ""
-        
-        await self._cleanup_old_entries()
-        
-        current_time = time.time()
-        minute_ago = current_time - 60
-        hour_ago = current_time - 3600
-        
-        # Get request timestamps for this IP
-        timestamps = self.requests[ip]
-        
-        # Count requests in last minute
-        recent_minute = [ts for ts in timestamps if ts > minute_ago]
-        if len(recent_minute) >= settings.RATE_LIMIT_PER_MINUTE:
+        allowed, _, _ = self.consume(POLICIES["default"], f"ip:{ip}")
+        if not allowed:
             return False, f"Rate limit exceeded: {settings.RATE_LIMIT_PER_MINUTE} requests per minute"
-        
-        # Count requests in last hour
-        recent_hour = [ts for ts in timestamps if ts > hour_ago]
-        if len(recent_hour) >= settings.RATE_LIMIT_PER_HOUR:
-            return False, f"Rate limit exceeded: {settings.RATE_LIMIT_PER_HOUR} requests per hour"
-        
-        # Add current request timestamp
-        timestamps.append(current_time)
-        
         return True, ""
-    
+
     async def get_client_ip(self, request: Request) -> str:
         """Extract client IP address from request"""
         # Check for forwarded IP (behind proxy/load balancer)
@@ -82,15 +144,15 @@ class RateLimiter:
         if forwarded:
             # Take first IP in chain
             return forwarded.split(",")[0].strip()
-        
+
         real_ip = request.headers.get("X-Real-IP")
         if real_ip:
             return real_ip.strip()
-        
+
         # Fallback to direct client IP
         if request.client:
             return request.client.host
-        
+
         return "unknown"
 
 
@@ -98,56 +160,121 @@ class RateLimiter:
 rate_limiter = RateLimiter()
 
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware for FastAPI"""
-    
-    # Exclude these paths from rate limiting
+def _token_subject(request: Request) -> Optional[str]:
+    """Read the user id from the access token cookie without touching the database."""
+    token = request.cookies.get("access_token")
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except Exception:
+        return None
+    subject = payload.get("sub")
+    return str(subject) if subject is not None else None
+
+
+async def _resolve_key(request: Request, policy: RateLimitPolicy) -> str:
+    """
+    Build the bucket key for a policy. ``user`` falls back to the client IP for
+    anonymous callers; ``spa`` uses an explicit ``spa_id`` path/query parameter
+    and otherwise behaves like ``user``.
+    """
+    if policy.key == "spa":
+        spa_id = request.path_params.get("spa_id") or request.query_params.get("spa_id")
+        if spa_id:
+            return f"spa:{spa_id}"
+    if policy.key in ("user", "spa"):
+        subject = _token_subject(request)
+        if subject:
+            return f"user:{subject}"
+    return f"ip:{await rate_limiter.get_client_ip(request)}"
+
+
+def rate_limit(policy_name: str, cost: Optional[int] = None):
+    """
+    Dependency enforcing a named policy on a route or router, e.g.
+    ``dependencies=[Depends(rate_limit("pdf_render"))]``.
+    ``cost`` overrides the policy's default weight for this endpoint.
+    """
+    if policy_name not in POLICIES:
+        raise ValueError(f"Unknown rate limit policy '{policy_name}'")
+
+    async def limiter(request: Request):
+        policy = POLICIES[policy_name]
+        key = await _resolve_key(request, policy)
+        allowed, remaining, retry_after = rate_limiter.consume(policy, key, cost)
+        if not allowed:
+            logger.warning(f"Rate limit '{policy.name}' exceeded for {key}, Path: {request.url.path}")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Rate limit exceeded for {policy.name}. Try again in {retry_after} seconds",
+                headers={
+                    "Retry-After": str(retry_after),
+                    "X-RateLimit-Policy": policy.name,
+                    "X-RateLimit-Limit": str(policy.burst),
+                    "X-RateLimit-Remaining": str(remaining),
+                },
+            )
+    return limiter
+
+
+class RateLimitMiddleware:
+    """Rate limiting middleware for FastAPI (default per-IP policy)"""
+
+    # Exclude these paths from rate limiting ("/" only matches the root itself)
     EXCLUDED_PATHS = [
         "/health",
-        "/",
+        "/metrics",
         "/docs",
         "/openapi.json",
         "/redoc",
     ]
-    
-    async def dispatch(self, request: Request, call_next):
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Skip rate limiting for excluded paths
-        if any(request.url.path.startswith(path) for path in self.EXCLUDED_PATHS):
-            return await call_next(request)
-        
-        # Get client IP
-        client_ip = await rate_limiter.get_client_ip(request)
+        path = scope["path"]
+        if path == "/" or any(path.startswith(excluded) for excluded in self.EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        policy = POLICIES["default"]
+        client_ip = await rate_limiter.get_client_ip(Request(scope))
 
         # Check rate limit
-        is_allowed, error_message = await rate_limiter.is_allowed(client_ip)
-        
+        is_allowed, remaining, retry_after = rate_limiter.consume(policy, f"ip:{client_ip}")
+
         if not is_allowed:
-            logger.warning(f"Rate limit exceeded for IP: {client_ip}, Path: {request.url.path}")
-            return JSONResponse(
+            logger.warning(f"Rate limit exceeded for IP: {client_ip}, Path: {path}")
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
                     "error": "Rate limit exceeded",
-                    "detail": error_message,
+                    "detail": f"Rate limit exceeded: {settings.RATE_LIMIT_PER_MINUTE} requests per minute",
                     "status_code": 429
                 },
                 headers={
-                    "Retry-After": "60",  # Retry after 60 seconds
-                    "X-RateLimit-Limit": str(settings.RATE_LIMIT_PER_MINUTE),
+                    "Retry-After": str(retry_after),
+                    "X-RateLimit-Limit": str(policy.burst),
                     "X-RateLimit-Remaining": "0",
                 }
             )
-        
+            await response(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # Add rate limit headers
+                headers = MutableHeaders(scope=message)
+                headers["X-RateLimit-Limit"] = str(policy.burst)
+                headers["X-RateLimit-Remaining"] = str(remaining)
+            await send(message)
+
         # Process request
-        response = await call_next(request)
-        
-        # Add rate limit headers
-        response.headers["X-RateLimit-Limit"] = str(settings.RATE_LIMIT_PER_MINUTE)
-        # Calculate remaining requests (simplified)
-        response.headers["X-RateLimit-Remaining"] = str(
-            max(0, settings.RATE_LIMIT_PER_MINUTE - len([
-                ts for ts in rate_limiter.requests.get(client_ip, [])
-                if ts > time.time() - 60
-            ]))
-        )
-        
-        return response
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,261 @@
+"""
+Response Cache
+Declarative caching of serialized GET responses with ETag and tag invalidation
+
+``@cached_response(tags=("spas",), ttl=60, stale_ttl=300)`` under a route
+decorator caches the exact JSON bytes FastAPI would send (after
+``response_model`` filtering), keyed by route template, path and query
+parameters and, with ``vary_on_role=True``, the caller's role. Dependencies
+(auth, DB session) still run on every request; only the endpoint body is
+skipped on a hit.
+
+- Fresh entries (younger than ``ttl``) are served directly.
+- Stale entries (up to ``ttl + stale_ttl``) are served while one background
+  task recomputes the entry with its own DB session.
+- ``If-None-Match`` matching the entry's ETag returns 304.
+- ``invalidate_tags("spas")`` from service mutators bumps the tag version;
+  entries built under an older version are ignored. With Redis the entries
+  and tag versions are shared by all workers, otherwise they are per process.
+"""
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import serialize_response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "respcache"
+
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_tag_versions: Dict[str, int] = {}
+_refreshing: set = set()
+
+
+async def _redis():
+    if not settings.RESPONSE_CACHE_REDIS_ENABLED:
+        return None
+    from config.redis import get_redis
+
+    try:
+        return await get_redis()
+    except Exception:
+        return None
+
+
+# =========================================================
+# Tags
+# =========================================================
+
+async def _current_versions(tags: Tuple[str, ...]) -> Dict[str, int]:
+    redis = await _redis()
+    if redis is not None:
+        try:
+            values = await redis.mget([f"{_REDIS_PREFIX}:tag:{tag}" for tag in tags])
+            return {tag: int(value or 0) for tag, value in zip(tags, values)}
+        except Exception as e:
+            logger.warning(f"Response cache tag lookup failed: {e}")
+    return {tag: _tag_versions.get(tag, 0) for tag in tags}
+
+
+async def invalidate_tags(*tags: str):
+    """Invalidate every cached response carrying any of ``tags``."""
+    for tag in tags:
+        _tag_versions[tag] = _tag_versions.get(tag, 0) + 1
+    redis = await _redis()
+    if redis is not None:
+        try:
+            for tag in tags:
+                await redis.incr(f"{_REDIS_PREFIX}:tag:{tag}")
+        except Exception as e:
+            logger.warning(f"Response cache invalidation failed for {tags}: {e}")
+
+
+# =========================================================
+# Entry storage
+# =========================================================
+
+async def _load_entry(key: str) -> Optional[Dict[str, Any]]:
+    redis = await _redis()
+    if redis is not None:
+        try:
+            cached = await redis.get(f"{_REDIS_PREFIX}:entry:{key}")
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+    entry = _entries.get(key)
+    if entry is not None:
+        _entries.move_to_end(key)
+    return entry
+
+
+async def _store_entry(key: str, entry: Dict[str, Any], expire_seconds: int):
+    _entries[key] = entry
+    _entries.move_to_end(key)
+    while len(_entries) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+    redis = await _redis()
+    if redis is not None:
+        try:
+            await redis.set(f"{_REDIS_PREFIX}:entry:{key}", json.dumps(entry), ex=expire_seconds)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+
+# =========================================================
+# Decorator
+# =========================================================
+
+def _role_of(kwargs: Dict[str, Any]) -> str:
+    from apps.users.models import User
+
+    for value in kwargs.values():
+        if isinstance(value, User):
+            role = value.role
+            return role.value if hasattr(role, "value") else str(role)
+    return "anonymous"
+
+
+def _cache_key(request: Request, role: Optional[str]) -> str:
+    route = request.scope.get("route")
+    route_path = getattr(route, "path", request.url.path)
+    params = sorted(request.path_params.items()) + sorted(request.query_params.multi_items())
+    raw = f"{request.method} {route_path}?{params!r}|{role or ''}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+async def _render(request: Request, content: Any) -> Tuple[bytes, int]:
+    """Serialize the endpoint result exactly as the matched APIRoute would."""
+    if isinstance(content, Response):
+        return content.body, content.status_code
+    route = request.scope.get("route")
+    serialized = await serialize_response(
+        field=getattr(route, "response_field", None),
+        response_content=content,
+        include=getattr(route, "response_model_include", None),
+        exclude=getattr(route, "response_model_exclude", None),
+        by_alias=getattr(route, "response_model_by_alias", True),
+        exclude_unset=getattr(route, "response_model_exclude_unset", False),
+        exclude_defaults=getattr(route, "response_model_exclude_defaults", False),
+        exclude_none=getattr(route, "response_model_exclude_none", False),
+    )
+    return JSONResponse(serialized).body, getattr(route, "status_code", None) or 200
+
+
+def _make_entry(body: bytes, status_code: int, versions: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "body": body.decode(),
+        "status": status_code,
+        "etag": f'"{hashlib.sha1(body).hexdigest()}"',
+        "created": time.time(),
+        "versions": versions,
+    }
+
+
+def _respond(request: Request, entry: Dict[str, Any]) -> Response:
+    # Clients always revalidate; unchanged data costs a 304 with no body
+    headers = {"ETag": entry["etag"], "Cache-Control": "private, max-age=0, must-revalidate"}
+    if request.headers.get("if-none-match") == entry["etag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=entry["body"].encode(),
+        status_code=entry["status"],
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+def cached_response(
+    tags: Iterable[str] = (),
+    ttl: int = 60,
+    stale_ttl: int = 300,
+    vary_on_role: bool = False,
+):
+    """Decorator for GET endpoints returning JSON-serializable data."""
+    tags = tuple(tags)
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        request_param = next(
+            (name for name, param in signature.parameters.items() if param.annotation is Request),
+            None,
+        )
+        injected = request_param is None
+        if injected:
+            request_param = "_cache_request"
+
+        async def compute(request: Request, kwargs: Dict[str, Any], key: str, versions: Dict[str, int]):
+            call_kwargs = {k: v for k, v in kwargs.items() if not (injected and k == request_param)}
+            content = await func(**call_kwargs)
+            body, status_code = await _render(request, content)
+            entry = _make_entry(body, status_code, versions)
+            if status_code == 200:
+                await _store_entry(key, entry, ttl + stale_ttl)
+            return entry
+
+        async def refresh(request: Request, kwargs: Dict[str, Any], key: str, versions: Dict[str, int]):
+            from config.database import async_session_maker
+
+            try:
+                async with async_session_maker() as db:
+                    fresh = {k: (db if isinstance(v, AsyncSession) else v) for k, v in kwargs.items()}
+                    await compute(request, fresh, key, versions)
+            except Exception as e:
+                logger.warning(f"Response cache refresh failed for {request.url.path}: {e}")
+            finally:
+                _refreshing.discard(key)
+
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            request: Request = kwargs[request_param]
+            if not settings.RESPONSE_CACHE_ENABLED or request.method != "GET":
+                if injected:
+                    kwargs.pop(request_param)
+                return await func(**kwargs)
+
+            route = metrics.route_label(request.scope)
+            key = _cache_key(request, _role_of(kwargs) if vary_on_role else None)
+            versions = await _current_versions(tags)
+            entry = await _load_entry(key)
+            if entry is not None and entry.get("versions") != versions:
+                entry = None
+
+            if entry is not None:
+                age = time.time() - entry["created"]
+                if age <= ttl:
+                    metrics.record_response_cache(route, "hit")
+                    return _respond(request, entry)
+                if age <= ttl + stale_ttl:
+                    if key not in _refreshing:
+                        _refreshing.add(key)
+                        asyncio.create_task(refresh(request, dict(kwargs), key, versions))
+                    metrics.record_response_cache(route, "stale")
+                    return _respond(request, entry)
+
+            metrics.record_response_cache(route, "miss")
+            entry = await compute(request, kwargs, key, versions)
+            return _respond(request, entry)
+
+        parameters = list(signature.parameters.values())
+        if injected:
+            parameters.append(
+                inspect.Parameter("_cache_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+            )
+        wrapper.__signature__ = signature.replace(parameters=parameters)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,153 @@
+"""
+Single-flight
+Concurrent identical calls share one in-flight coroutine
+
+``@single_flight("name")`` on an async function makes callers that arrive while
+an identical call (same arguments, ignoring the DB session) is running await
+that call's result instead of starting their own. With ``distributed=True`` and
+Redis available, a short Redis lock extends this across workers: the worker
+holding the lock computes and publishes the result, the others wait for it.
+Distributed results travel as JSON, so only use it for JSON-serializable
+return values.
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config.settings import settings
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+_POLL_INTERVAL = 0.05
+
+# Delete the lock only if we still own it
+_RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _call_key(name: str, signature: inspect.Signature, args, kwargs) -> str:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    parts = [
+        f"{param}={value!r}"
+        for param, value in bound.arguments.items()
+        if not isinstance(value, AsyncSession)
+    ]
+    return f"{name}({','.join(parts)})"
+
+
+async def _run_distributed(name: str, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    from config.redis import get_redis
+
+    try:
+        redis = await get_redis()
+    except Exception:
+        redis = None
+    if redis is None:
+        return await call()
+
+    lock_key = f"singleflight:lock:{key}"
+    lock_ms = int(settings.SINGLE_FLIGHT_LOCK_SECONDS * 1000)
+    token = uuid.uuid4().hex
+    try:
+        acquired = await redis.set(lock_key, token, nx=True, px=lock_ms)
+        owner = None if acquired else await redis.get(lock_key)
+    except Exception as e:
+        logger.warning(f"Single-flight lock unavailable for {name}: {e}")
+        return await call()
+
+    if acquired:
+        try:
+            result = await call()
+            try:
+                await redis.set(f"singleflight:result:{key}:{token}", json.dumps(result, default=str), px=lock_ms)
+            except Exception as e:
+                logger.warning(f"Single-flight result not published for {name}: {e}")
+            return result
+        finally:
+            try:
+                await redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+            except Exception:
+                pass
+
+    # Another worker is computing; wait for its result while its lock is held
+    if owner:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SINGLE_FLIGHT_LOCK_SECONDS
+        result_key = f"singleflight:result:{key}:{owner}"
+        try:
+            while loop.time() < deadline:
+                published = await redis.get(result_key)
+                if published is not None:
+                    metrics.record_single_flight(name, "remote")
+                    return json.loads(published)
+                if await redis.get(lock_key) != owner:
+                    # Owner finished without publishing (error) or the lock expired
+                    break
+                await asyncio.sleep(_POLL_INTERVAL)
+        except Exception as e:
+            logger.warning(f"Single-flight wait failed for {name}: {e}")
+    return await call()
+
+
+def single_flight(name: str, distributed: bool = False):
+    """Decorator: coalesce concurrent identical calls of an async function."""
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _call_key(name, signature, args, kwargs)
+
+            future = _inflight.get(key)
+            if future is not None:
+                metrics.record_single_flight(name, "coalesced")
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    # The leader was cancelled (e.g. client disconnect); run ourselves
+                    current = asyncio.current_task()
+                    if not future.cancelled() or (current is not None and current.cancelling()):
+                        raise
+                    return await func(*args, **kwargs)
+
+            future = asyncio.get_running_loop().create_future()
+            _inflight[key] = future
+            metrics.record_single_flight(name, "leader")
+            try:
+                if distributed and settings.SINGLE_FLIGHT_DISTRIBUTED:
+                    result = await _run_distributed(name, key, lambda: func(*args, **kwargs))
+                else:
+                    result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark retrieved so an unawaited follower-less future does not warn
+                future.exception()
+                raise
+            else:
+                future.set_result(result)
+                return result
+            finally:
+                if _inflight.get(key) is future:
+                    del _inflight[key]
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,149 @@
+"""
+SMTP Connection Pool
+Persistent authenticated SMTP connections shared by every email sent from a worker
+
+Opening an SMTP session (TCP + TLS + AUTH) costs far more than sending a
+message, so up to ``SMTP_POOL_SIZE`` connections are kept open and reused.
+A connection that has been idle longer than ``SMTP_POOL_IDLE_SECONDS`` is
+closed instead of reused (providers drop idle sessions). A send that fails
+because the connection died is retried once on a fresh connection.
+Sends are throttled per provider (SMTP host) by a token bucket of
+``SMTP_RATE_LIMIT_PER_MINUTE`` messages per worker.
+
+smtplib is blocking, so every network call runs in a thread.
+"""
+import asyncio
+import logging
+import smtplib
+import time
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# The session is gone; a new connection may succeed
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class ProviderRateLimiter:
+    """Token bucket per provider; ``acquire`` waits for a token instead of failing."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, provider: str):
+        if self.per_minute <= 0:
+            return
+        rate = self.per_minute / 60.0
+        burst = max(1.0, self.per_minute)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                tokens, updated_at = self.buckets.get(provider, (burst, now))
+                tokens = min(burst, tokens + (now - updated_at) * rate)
+                if tokens >= 1:
+                    self.buckets[provider] = (tokens - 1, now)
+                    return
+                self.buckets[provider] = (tokens, now)
+                await asyncio.sleep((1 - tokens) / rate)
+
+
+class SMTPConnectionPool:
+    def __init__(self, size: int, idle_seconds: float):
+        self.size = size
+        self.idle_seconds = idle_seconds
+        self._slots = asyncio.Semaphore(size)
+        # (connection, last used) - most recently used last
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._limiter = ProviderRateLimiter(settings.SMTP_RATE_LIMIT_PER_MINUTE)
+
+    @staticmethod
+    def _connect() -> smtplib.SMTP:
+        if settings.SMTP_USE_SSL:
+            conn = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
+        else:
+            conn = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
+        try:
+            conn.ehlo()
+            if settings.SMTP_USE_TLS and not settings.SMTP_USE_SSL:
+                conn.starttls()
+                conn.ehlo()
+            if settings.SMTP_USER and settings.SMTP_PASSWORD:
+                conn.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            _close(conn)
+            raise
+        logger.info("Opened SMTP connection to %s:%s", settings.SMTP_HOST, settings.SMTP_PORT)
+        return conn
+
+    def _take_idle(self) -> Tuple[Optional[smtplib.SMTP], List[smtplib.SMTP]]:
+        """Most recently used live connection, plus expired ones to close."""
+        now = time.monotonic()
+        expired = [conn for conn, used in self._idle if now - used > self.idle_seconds]
+        self._idle = [(conn, used) for conn, used in self._idle if now - used <= self.idle_seconds]
+        conn = self._idle.pop()[0] if self._idle else None
+        return conn, expired
+
+    async def send(self, from_addr: str, recipients: List[str], message: str):
+        await self._limiter.acquire(settings.SMTP_HOST)
+        async with self._slots:
+            conn, expired = self._take_idle()
+            for stale in expired:
+                await asyncio.to_thread(_close, stale)
+
+            for attempt in range(2):
+                if conn is None:
+                    conn = await asyncio.to_thread(self._connect)
+                try:
+                    await asyncio.to_thread(conn.sendmail, from_addr, recipients, message)
+                except _CONNECTION_ERRORS as e:
+                    await asyncio.to_thread(_close, conn)
+                    conn = None
+                    if attempt:
+                        raise
+                    logger.info("SMTP connection lost (%s); reconnecting", e)
+                    continue
+                except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+                    # The server answered; the session is still usable (sendmail sent RSET)
+                    self._idle.append((conn, time.monotonic()))
+                    raise
+                except Exception:
+                    await asyncio.to_thread(_close, conn)
+                    raise
+                self._idle.append((conn, time.monotonic()))
+                return
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            await asyncio.to_thread(_close, conn)
+
+
+def _close(conn: smtplib.SMTP):
+    try:
+        conn.quit()
+    except Exception:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool: Optional[SMTPConnectionPool] = None
+
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _pool
+    if _pool is None:
+        _pool = SMTPConnectionPool(settings.SMTP_POOL_SIZE, settings.SMTP_POOL_IDLE_SECONDS)
+    return _pool
+
+
+async def close_smtp_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
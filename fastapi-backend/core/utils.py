@@ -4,14 +4,16 @@ Utility Functions
 import asyncio
 import logging
 import ssl
+import time
 from datetime import datetime, timezone
 from typing import Iterable, Union, Optional, Tuple, List
-import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from urllib.parse import urlencode
+from urllib.parse import urlencode, urlparse
 import httpx
 from config.settings import settings
+from core import metrics
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
 
 logger = logging.getLogger(__name__)
 _sms_client: Optional[httpx.AsyncClient] = None
@@ -41,14 +43,17 @@ def validate_smtp_settings() -> Tuple[bool, Optional[str]]:
     return True, None
 
 
-def _send_email_sync(
+def build_email_message(
     subject: str,
     body: str,
     recipient_list: List[str],
     html_body: Optional[str] = None,
-) -> None:
+) -> Tuple[str, str]:
     """
-    Synchronous helper to send email via smtplib.
+    Build the MIME message for an email.
+
+    Returns:
+        Tuple of (envelope sender address, message text)
     """
     from_email = settings.SMTP_FROM_EMAIL or settings.SERVER_EMAIL
     from_name = "SPADocs"
@@ -68,38 +73,7 @@ def _send_email_sync(
     if html_body:
         msg.attach(MIMEText(html_body, 'html'))
 
-    logger.info(
-        "Attempting to send email to %s via %s:%s | SSL=%s TLS=%s | from=%s",
-        recipient_list,
-        settings.SMTP_HOST,
-        settings.SMTP_PORT,
-        settings.SMTP_USE_SSL,
-        settings.SMTP_USE_TLS,
-        from_email,
-    )
-    logger.info("Subject: %s", subject)
-    logger.info("Body type: %s", type(body))
-    logger.info("HTML type: %s", type(html_body))
-
-    if settings.SMTP_USE_SSL:
-        server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
-    else:
-        server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
-
-    try:
-        server.ehlo()
-        if settings.SMTP_USE_TLS and not settings.SMTP_USE_SSL:
-            server.starttls()
-            server.ehlo()
-        server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-        server.sendmail(from_email, recipient_list, msg.as_string())
-    finally:
-        try:
-            server.quit()
-        except Exception:
-            pass
-
-    logger.info("Email sent successfully to %s", recipient_list)
+    return from_email, msg.as_string()
 
 
 async def send_email(
@@ -138,14 +112,12 @@ async def send_email(
         logger.error("SMTP configuration error: %s", error_msg)
         raise ValueError(error_msg)
 
+    from core.smtp_pool import get_smtp_pool
+
     try:
-        await asyncio.to_thread(
-            _send_email_sync,
-            subject,
-            body,
-            recipient_list,
-            html_body,
-        )
+        from_email, message = build_email_message(subject, body, recipient_list, html_body)
+        await get_smtp_pool().send(from_email, recipient_list, message)
+        logger.info("Email sent successfully to %s", recipient_list)
     except Exception as exc:
         logger.exception("Failed to send email via SMTP: %s", exc)
         raise ValueError(f"Failed to send email: {str(exc)}")
@@ -319,7 +291,7 @@ def _sms_provider_accepted(response: httpx.Response) -> bool:
     return False
 
 
-async def _send_sms_request(phone_number: str, message: str) -> None:
+async def _send_sms_request(phone_number: str, message: str, max_retries: Optional[int] = None) -> None:
     """Send an SMS through the provider without blocking the FastAPI event loop."""
     masked_phone = _mask_phone_number(phone_number)
     mobile_param = str(settings.SMS_MOBILE_PARAM or "mobile").strip()
@@ -344,7 +316,7 @@ async def _send_sms_request(phone_number: str, message: str) -> None:
     if configured_method != "GET":
         logger.warning("Hilite SMS template requires GET; ignoring SMS_HTTP_METHOD=%s", configured_method)
 
-    retry_count = max(int(settings.SMS_MAX_RETRIES), 0)
+    retry_count = max(int(settings.SMS_MAX_RETRIES if max_retries is None else max_retries), 0)
     client = await get_sms_client()
 
     for attempt in range(retry_count + 1):
@@ -456,11 +428,30 @@ async def _send_sms_request(phone_number: str, message: str) -> None:
             )
 
 
-async def send_sms(phone_number: str, message: str) -> None:
+def sms_provider_name() -> str:
+    return urlparse(settings.SMS_API_URL).hostname or "sms"
+
+
+def get_sms_breaker() -> CircuitBreaker:
+    return get_breaker(
+        f"sms:{sms_provider_name()}",
+        settings.SMS_CIRCUIT_FAILURE_THRESHOLD,
+        settings.SMS_CIRCUIT_RESET_SECONDS,
+    )
+
+
+async def send_sms(
+    phone_number: str,
+    message: str,
+    max_retries: Optional[int] = None,
+    timeout: Optional[float] = None,
+) -> None:
     """
     Send an SMS for phone OTP login.
 
     The gateway URL/key can be added later in environment variables without changing routes.
+    Fails fast with ``CircuitOpenError`` while the provider's circuit breaker is open.
+    ``timeout`` bounds the whole send, retries included.
     """
     phone_number = str(phone_number).strip()
     message = str(message)
@@ -476,9 +467,29 @@ async def send_sms(phone_number: str, message: str) -> None:
         logger.info("SKIP_SMS is enabled. SMS not sent to %s.", _mask_phone_number(phone_number))
         return
 
+    provider = sms_provider_name()
+    breaker = get_sms_breaker()
+    try:
+        breaker.check()
+    except CircuitOpenError:
+        metrics.record_sms_provider(provider, "short_circuited")
+        raise
+
+    started = time.perf_counter()
     try:
-        await _send_sms_request(phone_number, message)
+        await asyncio.wait_for(_send_sms_request(phone_number, message, max_retries), timeout)
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
     except Exception as exc:
+        latency = time.perf_counter() - started
+        breaker.record_failure(exc)
+        metrics.record_sms_provider(provider, "failed", latency)
         logger.exception("Failed to send SMS to %s", _mask_phone_number(phone_number))
+        if isinstance(exc, asyncio.TimeoutError):
+            raise ValueError(f"Failed to send SMS: no provider answer within {timeout:g}s") from exc
         raise ValueError(f"Failed to send SMS: {str(exc)}") from exc
 
+    latency = time.perf_counter() - started
+    breaker.record_success(latency)
+    metrics.record_sms_provider(provider, "sent", latency)
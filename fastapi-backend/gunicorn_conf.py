@@ -0,0 +1,9 @@
+"""
+Gunicorn configuration hooks
+"""
+
+
+def child_exit(server, worker):
+    """Drop live Prometheus gauges (in-flight requests, pool checkouts) of exited workers."""
+    from core.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
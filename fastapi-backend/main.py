@@ -8,7 +8,7 @@ from pathlib import Path
 
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from fastapi import HTTPException as FastAPIHTTPException
 from fastapi.staticfiles import StaticFiles
@@ -47,7 +47,27 @@ from core.middleware import (
     ErrorHandlerMiddleware,
     PerformanceMiddleware,
 )
+from core.rate_limiter import RateLimitMiddleware
+from core.metrics import instrument_pool, render_metrics
+from core.query_tracker import instrument_engine
 from core.utils import close_sms_client
+from core.loop_monitor import start_loop_monitor, stop_loop_monitor
+from apps.analytics.services.counter_service import (
+    start_counter_reconciliation,
+    stop_counter_reconciliation,
+)
+from apps.certificates.services.certificate_service import schedule_certificate_statistics_refresh
+from apps.analytics.services.rollup_service import (
+    start_rollup_scheduler,
+    stop_rollup_scheduler,
+)
+from apps.notifications.services.event_buffer import start_event_buffer, stop_event_buffer
+from apps.notifications.services.email_outbox import start_email_outbox, stop_email_outbox
+from apps.notifications.services.sms_outbox import start_sms_outbox, stop_sms_outbox
+from apps.users.services.otp_store import start_otp_purge, stop_otp_purge
+from apps.notifications.services.unread_counter import start_unread_counters, stop_unread_counters
+from apps.notifications.services.retention import start_retention, stop_retention
+from core.file_cleanup import start_file_cleanup, stop_file_cleanup
 
 
 # =========================================================
@@ -73,6 +93,20 @@ async def lifespan(app: FastAPI):
         logger.info(
             "Database initialized successfully"
         )
+
+        start_loop_monitor()
+        start_counter_reconciliation()
+        start_rollup_scheduler()
+        start_event_buffer()
+        start_email_outbox()
+        start_sms_outbox()
+        start_otp_purge()
+        start_unread_counters()
+        start_retention()
+        start_file_cleanup()
+        # Warm the stale-while-revalidate statistics snapshot before the first admin asks
+        schedule_certificate_statistics_refresh(only_if_missing=True)
+
         logger.info(
             "SMTP startup configuration: host=%s port=%s ssl=%s tls=%s sender=%s skip_email=%s",
             settings.SMTP_HOST,
@@ -114,6 +148,17 @@ async def lifespan(app: FastAPI):
 
         try:
 
+            await stop_loop_monitor()
+            await stop_counter_reconciliation()
+            await stop_rollup_scheduler()
+            # Flush buffered audit rows before the pool closes
+            await stop_event_buffer()
+            await stop_email_outbox()
+            await stop_sms_outbox()
+            await stop_otp_purge()
+            await stop_unread_counters()
+            await stop_retention()
+            await stop_file_cleanup()
             await close_db_connection()
             await close_sms_client()
 
@@ -227,11 +272,17 @@ app.add_middleware(
 # MIDDLEWARES
 # =========================================================
 
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(PerformanceMiddleware)
 
 app.add_middleware(ErrorHandlerMiddleware)
 
 
+instrument_pool(engine)
+instrument_engine(engine)
+
+
 # =========================================================
 # EXCEPTION HANDLERS
 # =========================================================
@@ -337,6 +388,7 @@ async def http_exception_handler(
             ),
             "status_code": exc.status_code,
         },
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -467,52 +519,12 @@ async def health_check():
 @app.get("/metrics")
 async def metrics():
 
-    metrics_data = {
-        "status": "healthy",
-        "database": {
-            "connected": engine is not None,
-        },
-    }
-
-    try:
-
-        if engine and hasattr(engine, "pool"):
+    body, content_type = render_metrics()
 
-            pool = engine.pool
-
-            metrics_data["database"]["pool"] = {
-                "size": (
-                    pool.size()
-                    if hasattr(pool, "size")
-                    else None
-                ),
-
-                "checked_in": (
-                    pool.checkedin()
-                    if hasattr(pool, "checkedin")
-                    else None
-                ),
-
-                "checked_out": (
-                    pool.checkedout()
-                    if hasattr(pool, "checkedout")
-                    else None
-                ),
-
-                "overflow": (
-                    pool.overflow()
-                    if hasattr(pool, "overflow")
-                    else None
-                ),
-            }
-
-    except Exception as e:
-
-        logger.warning(
-            f"Could not get pool metrics: {e}"
-        )
-
-    return metrics_data
+    return Response(
+        content=body,
+        media_type=content_type,
+    )
 
 
 # =========================================================
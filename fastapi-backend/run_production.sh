@@ -8,6 +8,11 @@ HOST=${HOST:-0.0.0.0}
 PORT=${PORT:-8000}
 LOG_LEVEL=${LOG_LEVEL:-info}
 
+# Shared directory so /metrics aggregates samples from every worker
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/infodocs-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Starting FastAPI server with $WORKERS workers..."
 echo "Host: $HOST, Port: $PORT"
 
@@ -15,6 +20,7 @@ echo "Host: $HOST, Port: $PORT"
 if command -v gunicorn &> /dev/null; then
     echo "Using Gunicorn + Uvicorn Workers"
     exec gunicorn main:app \
+        --config gunicorn_conf.py \
         --workers $WORKERS \
         --worker-class uvicorn.workers.UvicornWorker \
         --bind $HOST:$PORT \
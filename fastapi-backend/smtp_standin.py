@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import random
+import time
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult, LoginPassword
+except ImportError:  # Load-testing tool only; not an app dependency
+    raise SystemExit("smtp_standin.py needs aiosmtpd: pip install aiosmtpd")
+
+# Local SMTP server standing in for the provider during load tests. It accepts
+# any login, counts messages and can add latency or fail a share of them.
+#   python smtp_standin.py --port 8025 --latency-ms 50 --fail-rate 0.05
+# then run the API with
+#   SMTP_HOST=127.0.0.1 SMTP_PORT=8025 SMTP_USE_SSL=false SMTP_USE_TLS=false SKIP_EMAIL=false
+
+
+class CountingHandler:
+    def __init__(self, latency_ms: float, fail_rate: float):
+        self.latency = latency_ms / 1000
+        self.fail_rate = fail_rate
+        self.accepted = 0
+        self.rejected = 0
+        self.sessions = 0
+        self.started = time.monotonic()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self.rejected += 1
+            return "451 4.3.0 Temporary failure (injected)"
+        self.accepted += 1
+        return "250 Message accepted"
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.accepted / elapsed if elapsed else 0
+        return (
+            f"accepted={self.accepted} rejected={self.rejected} ehlo={self.sessions} "
+            f"elapsed={elapsed:.0f}s rate={rate:.1f}/s"
+        )
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=isinstance(auth_data, LoginPassword))
+
+
+async def serve(args):
+    handler = CountingHandler(args.latency_ms, args.fail_rate)
+    controller = Controller(
+        handler,
+        hostname=args.host,
+        port=args.port,
+        authenticator=accept_any_login,
+        auth_require_tls=False,
+    )
+    controller.start()
+    print(f"SMTP stand-in listening on {args.host}:{args.port}")
+    try:
+        while True:
+            await asyncio.sleep(args.report_seconds)
+            print(handler.report())
+    finally:
+        controller.stop()
+        print(handler.report())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay before answering DATA")
+    parser.add_argument("--fail-rate", type=float, default=0, help="Share of messages answered with 451")
+    parser.add_argument("--report-seconds", type=float, default=10)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass